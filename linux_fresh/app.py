@@ -5,15 +5,39 @@ import subprocess
 import time
 import zipfile
 import shutil
+import tempfile
 import signal
+import sys
+import csv
+import datetime
+import io
 import json
-import urllib.request
-from flask import Flask, render_template, request, redirect, session, url_for, flash, send_file, jsonify
+import hashlib
+import hmac
+import secrets
+import functools
+import queue
+import threading
+from flask import Flask, render_template, request, redirect, session, url_for, flash, jsonify, Response, send_file, g, has_request_context, has_app_context
+from play_bell import DAYS, hari_to_mask, migrate_schema
+import audio_cache
+import backup_store
+import events
+import playlist
+import release_check
+import replication
+import sound_library
+import timesync
+import updater
+import zones
 
 # ================= CONFIG =================
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB = os.path.join(BASE_DIR, "bell.db")
-SOUND_DIR = os.path.join(BASE_DIR, "static/sounds")
+# BELL_DATA_DIR: lokasi bell.db dan static/sounds (default folder aplikasi),
+# mis. untuk menjalankan beberapa instance sekaligus saat uji replikasi
+DATA_DIR = os.environ.get("BELL_DATA_DIR", BASE_DIR)
+DB = os.path.join(DATA_DIR, "bell.db")
+SOUND_DIR = os.path.join(DATA_DIR, "static/sounds")
 
 # Windows support
 IS_WINDOWS = os.name == 'nt'
@@ -24,45 +48,25 @@ AUTO_LOGOUT = 300  # 5 menit (detik)
 # ================= AUDIO HELPER =================
 
 
-def play_sound_file(path):
+def play_sound_file(path, device=None):
     if not os.path.isfile(path):
         return False
 
-    audio_output = get_setting('audio_output', 'hw:1,0')
+    audio_output = device or get_setting('audio_output', 'hw:1,0')
     normalize_volume = get_setting('normalize_volume', '0') == '1'
     target_db = get_setting('target_db', '-14')
 
     try:
         play_path = path
 
-        # Normalize audio if enabled
+        # Pakai audio ter-normalisasi dari cache; jika belum ada, putar file
+        # asli sekarang dan isi cache di background
         if normalize_volume:
-            try:
-                # Create normalized temp file
-                normalized_path = os.path.join(
-                    BASE_DIR, "temp_normalized" + os.path.splitext(path)[1])
-
-                # Use ffmpeg to normalize audio (loudnorm filter for EBU R128)
-                ffmpeg_cmd = [
-                    "ffmpeg", "-y", "-i", path,
-                    "-af", f"loudnorm=I={target_db}:TP=-1.5:LRA=11",
-                    "-ar", "44100",
-                    normalized_path
-                ]
-
-                result = subprocess.run(
-                    ffmpeg_cmd,
-                    capture_output=True,
-                    timeout=30,
-                    creationflags=subprocess.CREATE_NO_WINDOW if IS_WINDOWS and hasattr(
-                        subprocess, 'CREATE_NO_WINDOW') else 0
-                )
-
-                if result.returncode == 0 and os.path.exists(normalized_path):
-                    play_path = normalized_path
-            except Exception as e:
-                print(f"Normalization failed, playing original: {e}")
-                play_path = path
+            cached = audio_cache.get_cached(path, target_db)
+            if cached:
+                play_path = cached
+            else:
+                audio_cache.warm([path], target_db)
 
         if IS_WINDOWS:
             # On Windows, use PowerShell for a reliable way to play both WAV and MP3
@@ -88,24 +92,173 @@ def play_sound_file(path):
 
 
 # ================= APP =================
-app = Flask(__name__)
+app = Flask(__name__, static_folder=os.path.join(DATA_DIR, "static"))
 app.secret_key = "bell-secret"
 
+
+# ================= REQUEST TIMING =================
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+    g.settings_loads = 0
+
+
+@app.teardown_appcontext
+def teardown_db(exc):
+    release_db(exc)
+
+
+@app.after_request
+def add_timing_header(response):
+    # Terlihat di DevTools (tab Network -> Timing) untuk memantau performa
+    if "request_start" in g:
+        elapsed_ms = (time.perf_counter() - g.request_start) * 1000
+        response.headers["Server-Timing"] = (
+            f'app;dur={elapsed_ms:.1f}, '
+            f'settings;desc="settings loads: {g.settings_loads}"')
+    return response
+
 # ================= DB HELPER =================
 
 
-def get_db():
+# Jumlah maksimum koneksi SQLite yang dipakai bersamaan oleh request
+DB_POOL_SIZE = int(os.environ.get("BELL_DB_POOL_SIZE", "4"))
+
+
+class PooledConnection(sqlite3.Connection):
+    """Koneksi milik pool: close() di dalam route tidak menutup file,
+    koneksi dikembalikan ke pool saat app context selesai.
+    Koneksi sementara (pool penuh) juga terikat ke request: close() di
+    route diabaikan dan baru benar-benar ditutup oleh release_db()."""
+    pooled = False
+    request_bound = False
+
+    def close(self):
+        if not self.pooled and not self.request_bound:
+            super().close()
+
+
+_db_pool = queue.LifoQueue()
+_db_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+
+
+def _connect():
     conn = sqlite3.connect(
         DB,
         timeout=10,
-        check_same_thread=False
+        check_same_thread=False,
+        factory=PooledConnection
     )
-    # Enable WAL mode for better concurrency
+    # Enable WAL mode for better concurrency (sekali per koneksi)
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA synchronous=NORMAL")
     return conn
 
 
+def get_db():
+    """Satu koneksi per request (diambil dari pool). Di luar app context
+    (init, background thread) dibuat koneksi biasa yang ditutup normal."""
+    if not has_app_context():
+        return _connect()
+
+    conn = g.get("_db")
+    if conn is None:
+        if _db_slots.acquire(timeout=10):
+            try:
+                conn = _db_pool.get_nowait()
+            except queue.Empty:
+                conn = _connect()
+            conn.pooled = True
+        else:
+            # Pool penuh terlalu lama: pakai koneksi sementara yang tetap
+            # hidup sampai request selesai
+            conn = _connect()
+            conn.request_bound = True
+        g._db = conn
+    return conn
+
+
+def release_db(exc=None):
+    conn = g.pop("_db", None)
+    if conn is None:
+        return
+    if not conn.pooled:
+        conn.request_bound = False
+        conn.close()
+        return
+    try:
+        if conn.in_transaction:
+            conn.rollback()  # perubahan yang tidak di-commit route dibuang
+        _db_pool.put(conn)
+    except sqlite3.Error:
+        conn.pooled = False
+        conn.close()
+    finally:
+        _db_slots.release()
+
+
+def reset_db_pool():
+    """Tutup semua koneksi idle (mis. setelah file bell.db diganti restore)."""
+    while True:
+        try:
+            conn = _db_pool.get_nowait()
+        except queue.Empty:
+            return
+        conn.pooled = False
+        conn.close()
+
+
+def snapshot_db(dest_path=None):
+    """Salinan konsisten bell.db (termasuk isi -wal) lewat SQLite online
+    backup API, tanpa menghentikan app/play_bell. Return path salinan.
+
+    Di mode WAL snapshot hanya memegang read transaction, jadi penulis
+    lain tidak diblok selama penyalinan.
+    """
+    if dest_path is None:
+        fd, dest_path = tempfile.mkstemp(prefix="bell_snapshot_", suffix=".db")
+        os.close(fd)
+    src = sqlite3.connect(DB, timeout=10)
+    dst = sqlite3.connect(dest_path)
+    try:
+        src.backup(dst)
+        # Salinan dijadikan satu file mandiri (tanpa -wal)
+        dst.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dst.close()
+        src.close()
+    return dest_path
+
+
+def restore_db_from(path):
+    """Ganti isi bell.db dengan database `path` dalam satu transaksi.
+
+    File bell.db tidak ditimpa, sehingga koneksi yang terbuka tetap valid
+    dan langsung melihat isi baru; PRAGMA data_version ikut berubah
+    sehingga play_bell --daemon memuat ulang jadwal.
+    """
+    src = sqlite3.connect(path)
+    try:
+        check = src.execute("PRAGMA integrity_check").fetchone()[0]
+        if check != "ok":
+            raise ValueError(f"bell.db di backup rusak: {check}")
+        live = _connect()
+        try:
+            page_size = live.execute("PRAGMA page_size").fetchone()[0]
+            if src.execute("PRAGMA page_size").fetchone()[0] != page_size:
+                # Backup ke database WAL mensyaratkan page_size yang sama
+                src.execute("PRAGMA journal_mode=DELETE")
+                src.execute(f"PRAGMA page_size={int(page_size)}")
+                src.execute("VACUUM")
+            src.backup(live)
+        finally:
+            live.close()
+    finally:
+        src.close()
+
+
 def init_db():
     conn = get_db()
     # Ensure tables exist
@@ -120,10 +273,21 @@ def init_db():
     defaults = [
         ('audio_output', 'hw:1,0'),
         ('time_offset', '0'),
-        ('ntp_server', 'pool.ntp.org'),
+        ('ntp_server', '0.pool.ntp.org, 1.pool.ntp.org, 2.pool.ntp.org'),
+        ('ntp_sync_interval', str(timesync.DEFAULT_INTERVAL)),
+        ('missed_bell_policy', 'latest'),
+        ('missed_bell_grace', '300'),
+        ('event_port', '5001'),
+        ('replication_role', 'standalone'),
+        ('replication_primary_url', ''),
+        ('replication_token', ''),
+        ('replication_interval', str(replication.DEFAULT_INTERVAL)),
         ('timezone_region', 'Asia/Jakarta'),
         ('normalize_volume', '0'),
         ('target_db', '-14'),
+        ('preload_audio', '0'),
+        ('playback_mode', 'sequential'),
+        ('backup_keep', str(backup_store.DEFAULT_KEEP)),
         ('github_zip_url', 'https://github.com/bijuri/Bell-otomatis/raw/main/release/bell_update_latest.zip'),
         ('github_api_url', 'https://raw.githubusercontent.com/bijuri/Bell-otomatis/main/release.json'),
         ('current_version', '1.5.0')
@@ -155,6 +319,24 @@ def init_db():
     except Exception as e:
         print(f"Migration error: {e}")
 
+    # Migration: bitmask hari (bell.hari_mask) + index untuk query player
+    try:
+        migrate_schema(conn)
+    except Exception as e:
+        print(f"Migration error: {e}")
+
+    # Riwayat sinkron waktu (offset + drift)
+    timesync.ensure_table(conn)
+
+    # Index library suara (tabel sounds), sinkron dengan isi SOUND_DIR
+    try:
+        sound_library.sync(conn)
+    except Exception as e:
+        print(f"Sound index error: {e}")
+
+    # Log perubahan (tabel changes + trigger) untuk replikasi controller -> node
+    replication.ensure_schema(conn)
+
     conn.commit()
     conn.close()
 
@@ -167,6 +349,13 @@ def get_active_profile():
     return row if row else (1, "Default")
 
 
+def time_sync_history():
+    conn = get_db()
+    rows = timesync.history(conn)
+    conn.close()
+    return rows
+
+
 def get_profiles():
     conn = get_db()
     rows = conn.execute("SELECT id, name, is_active FROM profiles").fetchall()
@@ -174,15 +363,39 @@ def get_profiles():
     return rows
 
 
+# ================= SETTINGS CACHE =================
+# Seluruh tabel settings dibaca sekali lalu disimpan di memori proses.
+# Route yang menulis settings wajib memanggil invalidate_settings().
+
+_settings_cache = None
+_settings_lock = threading.Lock()
+
+
+def load_settings():
+    global _settings_cache
+    with _settings_lock:
+        if _settings_cache is None:
+            conn = get_db()
+            _settings_cache = dict(
+                conn.execute("SELECT key, value FROM settings").fetchall())
+            conn.close()
+            if has_request_context():
+                g.settings_loads = g.get("settings_loads", 0) + 1
+        return _settings_cache
+
+
+def invalidate_settings():
+    global _settings_cache
+    with _settings_lock:
+        _settings_cache = None
+
+
 def get_setting(key, default=None):
-    conn = get_db()
-    row = conn.execute(
-        "SELECT value FROM settings WHERE key=?", (key,)).fetchone()
-    conn.close()
-    return row[0] if row else default
+    return load_settings().get(key, default)
 
 
-def get_audio_devices():
+def scan_audio_devices():
+    """Enumerasi device (blocking: aplay -L / PowerShell CIM)."""
     devices = []
     try:
         if IS_WINDOWS:
@@ -207,10 +420,71 @@ def get_audio_devices():
 
     return sorted(list(set(devices)))
 
+
+# ================= AUDIO DEVICE CACHE =================
+# Daftar device disimpan di memori dan diperbarui di background
+# (TTL, hotplug udev, atau tombol "Scan Ulang"), jadi render halaman
+# tidak pernah menunggu aplay -L.
+
+DEVICE_CACHE_TTL = 600  # detik
+
+_devices = {"list": [], "updated": 0.0}
+_devices_lock = threading.Lock()
+_devices_thread = None
+
+
+def refresh_audio_devices(wait=0):
+    """Mulai scan di background (jika belum berjalan). Tunggu maks `wait` detik."""
+    global _devices_thread
+    with _devices_lock:
+        if _devices_thread is None or not _devices_thread.is_alive():
+            def worker():
+                found = scan_audio_devices()
+                with _devices_lock:
+                    _devices["list"] = found
+                    _devices["updated"] = time.time()
+
+            _devices_thread = threading.Thread(target=worker, daemon=True)
+            _devices_thread.start()
+        thread = _devices_thread
+    if wait:
+        thread.join(wait)
+
+
+def get_audio_devices():
+    """Daftar device dari cache; memicu refresh background jika kedaluwarsa."""
+    with _devices_lock:
+        devices = list(_devices["list"])
+        stale = time.time() - _devices["updated"] > DEVICE_CACHE_TTL
+    if stale:
+        refresh_audio_devices()
+    return devices
+
+
+def watch_audio_hotplug():
+    """Refresh cache saat soundcard dicolok/dicabut (udevadm monitor, Linux)."""
+    if IS_WINDOWS or not shutil.which("udevadm"):
+        return
+
+    def worker():
+        try:
+            proc = subprocess.Popen(
+                ["udevadm", "monitor", "--udev", "--subsystem-match=sound"],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+            for line in proc.stdout:
+                if line.startswith("UDEV") and (" add " in line or " remove " in line):
+                    time.sleep(1)  # beri waktu ALSA mendaftarkan card
+                    refresh_audio_devices()
+        except Exception as e:
+            print(f"Hotplug watcher error: {e}")
+
+    threading.Thread(target=worker, daemon=True).start()
+
+
 # ================= SESSION TIMEOUT =================
 
 
-def check_timeout():
+def check_timeout(touch=True):
     if "login" not in session:
         return True
 
@@ -221,7 +495,9 @@ def check_timeout():
         session.clear()
         return True
 
-    session["last_active"] = now
+    # touch=False: polling latar belakang tidak memperpanjang sesi
+    if touch:
+        session["last_active"] = now
     return False
 
 # ================= LOGIN =================
@@ -257,19 +533,19 @@ def index():
 
     active_profile = get_active_profile()
     conn = get_db()
-    data = conn.execute(
-        "SELECT * FROM bell WHERE profile_id=? ORDER BY jam",
-        (active_profile[0],)
-    ).fetchall()
+    # d[6] = waktu bunyi terakhir dari ledger bell_fired (None jika belum)
+    data = conn.execute("""
+        SELECT b.id, b.jam, b.hari, b.suara, b.aktif, b.profile_id, f.last_fired
+        FROM bell b
+        LEFT JOIN (
+            SELECT bell_id, MAX(fired_at) AS last_fired
+            FROM bell_fired GROUP BY bell_id
+        ) f ON f.bell_id = b.id
+        WHERE b.profile_id=? ORDER BY b.jam
+    """, (active_profile[0],)).fetchall()
+    sounds = sound_library.list_sounds(conn)
     conn.close()
 
-    sounds = []
-    if os.path.isdir(SOUND_DIR):
-        sounds = sorted(
-            f for f in os.listdir(SOUND_DIR)
-            if f.lower().endswith((".wav", ".mp3"))
-        )
-
     return render_template(
         "index.html",
         data=data,
@@ -279,7 +555,10 @@ def index():
         devices=get_audio_devices(),
         active_profile=active_profile,
         profiles=get_profiles(),
-        time_offset=int(get_setting('time_offset', '0'))
+        time_offset=time_offset_setting(),
+        event_port=get_setting('event_port', '5001'),
+        day_note=get_day_plan(effective_today())[1],
+        replication_role=get_setting('replication_role', 'standalone')
     )
 
 # ================= ADD BELL =================
@@ -291,14 +570,15 @@ def add():
         return redirect(url_for("login"))
 
     jam = request.form.get("jam")
-    hari = ",".join(request.form.getlist("hari[]"))
+    hari_list = request.form.getlist("hari[]")
+    hari = ",".join(hari_list)
     suara = request.form.get("suara")
     profile_id = get_active_profile()[0]
 
     conn = get_db()
     conn.execute(
-        "INSERT INTO bell (jam,hari,suara,aktif,profile_id) VALUES (?,?,?,1,?)",
-        (jam, hari, suara, profile_id)
+        "INSERT INTO bell (jam,hari,suara,aktif,profile_id,hari_mask) VALUES (?,?,?,1,?,?)",
+        (jam, hari, suara, profile_id, hari_to_mask(hari_list))
     )
     conn.commit()
     conn.close()
@@ -326,12 +606,9 @@ def cek_sound():
     if check_timeout():
         return redirect(url_for("login"))
 
-    sounds = []
-    if os.path.isdir(SOUND_DIR):
-        sounds = sorted(
-            f for f in os.listdir(SOUND_DIR)
-            if f.lower().endswith((".wav", ".mp3"))
-        )
+    conn = get_db()
+    sounds = sound_library.list_sounds(conn)
+    conn.close()
 
     return render_template("ceksound.html", sounds=sounds)
 
@@ -346,6 +623,24 @@ def changelog():
 
     return render_template("changelog.html")
 
+# ================= EVENT STREAM =================
+
+
+@app.route("/events/token")
+def event_token():
+    """Token berumur pendek untuk membuka event stream scheduler langsung
+    (lihat events.py). Tidak memperpanjang sesi."""
+    if check_timeout(touch=False):
+        return api_error("Sesi berakhir, silakan login lagi", 401)
+    try:
+        port = int(get_setting('event_port', str(events.DEFAULT_PORT)))
+    except ValueError:
+        port = events.DEFAULT_PORT
+    conn = get_db()
+    secret = events.ensure_secret(conn)
+    conn.close()
+    return jsonify({"token": events.make_token(secret, AUTO_LOGOUT), "port": port})
+
 # ================= TOGGLE =================
 
 
@@ -389,24 +684,32 @@ def edit(id):
 
     if request.method == "POST":
         jam = request.form.get("jam")
-        hari = ",".join(request.form.getlist("hari[]"))
+        hari_list = request.form.getlist("hari[]")
+        hari = ",".join(hari_list)
         suara = request.form.get("suara")
+        try:
+            prioritas = int(request.form.get("prioritas", 0))
+        except ValueError:
+            prioritas = 0
+        bell_zones = zones.to_text(zones.parse(request.form.getlist("zones[]")))
         conn.execute(
-            "UPDATE bell SET jam=?, hari=?, suara=? WHERE id=?",
-            (jam, hari, suara, id)
+            "UPDATE bell SET jam=?, hari=?, suara=?, hari_mask=?, prioritas=?, zones=? WHERE id=?",
+            (jam, hari, suara, hari_to_mask(hari_list), prioritas, bell_zones, id)
         )
         conn.commit()
         conn.close()
         return redirect(url_for("index"))
 
     data = conn.execute(
-        "SELECT * FROM bell WHERE id=?",
+        "SELECT id, jam, hari, suara, aktif, profile_id, COALESCE(prioritas, 0), zones FROM bell WHERE id=?",
         (id,)
     ).fetchone()
+    sounds = sound_library.list_sounds(conn)
+    zone_list = zones.list_zones(conn)
     conn.close()
 
-    sounds = sorted(os.listdir(SOUND_DIR))
-    return render_template("edit.html", data=data, sounds=sounds)
+    return render_template("edit.html", data=data, sounds=sounds, zones=zone_list,
+                           bell_zones=zones.parse(data[7]) if data else [])
 
 # ================= EDIT JAM =================
 
@@ -438,7 +741,13 @@ def upload():
     f = request.files.get("sound")
     if f:
         os.makedirs(SOUND_DIR, exist_ok=True)
-        f.save(os.path.join(SOUND_DIR, f.filename))
+        path = os.path.join(SOUND_DIR, f.filename)
+        f.save(path)
+        conn = get_db()
+        sound_library.sync(conn, [f.filename])
+        conn.close()
+        if get_setting('normalize_volume', '0') == '1':
+            audio_cache.warm([path], get_setting('target_db', '-14'))
 
     return redirect(url_for("index"))
 
@@ -456,6 +765,10 @@ def delete_sound():
     if os.path.isfile(path):
         os.remove(path)
 
+    conn = get_db()
+    sound_library.sync(conn, [fn])
+    conn.close()
+
     return redirect(url_for("index"))
 
 # ================= EDIT HARI =================
@@ -471,8 +784,8 @@ def edit_hari(id):
 
     conn = get_db()
     conn.execute(
-        "UPDATE bell SET hari=? WHERE id=?",
-        (hari, id)
+        "UPDATE bell SET hari=?, hari_mask=? WHERE id=?",
+        (hari, hari_to_mask(hari_list), id)
     )
     conn.commit()
     conn.close()
@@ -480,6 +793,445 @@ def edit_hari(id):
     return redirect(url_for("index"))
 
 
+# ================= JSON API =================
+# Dipakai dashboard (index.html) untuk mengubah satu baris tanpa reload
+# halaman. GET /api/bells memakai ETag: polling yang datanya tidak berubah
+# cukup dijawab 304 tanpa body.
+
+BELL_COLUMNS = """
+    SELECT b.id, b.jam, b.hari, b.suara, b.aktif, b.profile_id,
+           COALESCE(b.prioritas, 0), f.last_fired, b.zones
+    FROM bell b
+    LEFT JOIN (
+        SELECT bell_id, MAX(fired_at) AS last_fired
+        FROM bell_fired GROUP BY bell_id
+    ) f ON f.bell_id = b.id
+"""
+
+
+def bell_to_dict(row):
+    return {
+        "id": row[0],
+        "jam": row[1],
+        "hari": [h for h in (row[2] or "").split(",") if h],
+        "suara": row[3],
+        "aktif": bool(row[4]),
+        "profile_id": row[5],
+        "prioritas": row[6],
+        "last_fired": row[7],
+        "zones": zones.parse(row[8]),
+    }
+
+
+def api_error(message, code=400):
+    return jsonify({"status": "error", "message": message}), code
+
+
+def api_login_required(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        touch = request.headers.get("X-Bell-Poll") != "1"
+        if check_timeout(touch):
+            return api_error("Sesi berakhir, silakan login lagi", 401)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def parse_jam(value):
+    """'7:5' / '07:05' -> '07:05'. ValueError jika bukan jam yang valid."""
+    try:
+        t = time.strptime(str(value).strip(), "%H:%M")
+    except ValueError:
+        raise ValueError(f"Format jam tidak valid: {value} (HH:MM)")
+    return f"{t.tm_hour:02d}:{t.tm_min:02d}"
+
+
+# Nama hari Indonesia juga diterima (mis. dari CSV yang diketik di Excel)
+HARI_ID = dict(zip(["Senin", "Selasa", "Rabu", "Kamis", "Jumat", "Sabtu", "Minggu"], DAYS))
+
+
+def parse_hari(value):
+    hari = value.replace(";", ",").split(",") if isinstance(value, str) else list(value or [])
+    hari = [h.strip().capitalize() for h in hari if h.strip()]
+    hari = [HARI_ID.get(h, h) for h in hari]
+    unknown = [h for h in hari if h not in DAYS]
+    if unknown:
+        raise ValueError(f"Hari tidak dikenal: {', '.join(unknown)}")
+    # Urutan tetap Senin..Minggu supaya tampilan konsisten
+    return sorted(set(hari), key=DAYS.index)
+
+
+def parse_zones(value):
+    """Daftar id zona dari form/JSON; ValueError jika ada zona yang tidak ada."""
+    ids = zones.parse(value)
+    conn = get_db()
+    known = zones.load(conn)
+    conn.close()
+    unknown = [str(i) for i in ids if i not in known]
+    if unknown:
+        raise ValueError(f"Zona tidak dikenal: {', '.join(unknown)}")
+    return ids
+
+
+@app.route("/api/bells")
+@api_login_required
+def api_bells():
+    conn = get_db()
+    profile = request.args.get("profile", type=int)
+    if profile is None:
+        row = conn.execute(
+            "SELECT id FROM profiles WHERE is_active=1").fetchone()
+        profile = row[0] if row else 1
+    rows = conn.execute(BELL_COLUMNS + " WHERE b.profile_id=? ORDER BY b.jam",
+                        (profile,)).fetchall()
+    conn.close()
+
+    response = jsonify({"profile_id": profile,
+                        "bells": [bell_to_dict(r) for r in rows]})
+    response.headers["Cache-Control"] = "no-cache"
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@app.route("/api/bells/<int:id>")
+@api_login_required
+def api_bell(id):
+    conn = get_db()
+    row = conn.execute(BELL_COLUMNS + " WHERE b.id=?", (id,)).fetchone()
+    conn.close()
+    if not row:
+        return api_error("Jadwal tidak ditemukan", 404)
+    return jsonify(bell_to_dict(row))
+
+
+@app.route("/api/bells/<int:id>/toggle", methods=["POST"])
+@api_login_required
+def api_toggle(id):
+    conn = get_db()
+    cur = conn.execute(
+        "UPDATE bell SET aktif = CASE aktif WHEN 1 THEN 0 ELSE 1 END WHERE id=?",
+        (id,)
+    )
+    conn.commit()
+    if not cur.rowcount:
+        conn.close()
+        return api_error("Jadwal tidak ditemukan", 404)
+    aktif = conn.execute("SELECT aktif FROM bell WHERE id=?", (id,)).fetchone()[0]
+    conn.close()
+    return jsonify({"id": id, "aktif": bool(aktif)})
+
+
+@app.route("/api/bells/<int:id>", methods=["PATCH"])
+@api_login_required
+def api_update_bell(id):
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return api_error("Body harus berupa JSON object")
+
+    # Hanya kolom yang dikirim yang di-UPDATE
+    fields = {}
+    try:
+        if "jam" in data:
+            fields["jam"] = parse_jam(data["jam"])
+        if "hari" in data:
+            hari = parse_hari(data["hari"])
+            fields["hari"] = ",".join(hari)
+            fields["hari_mask"] = hari_to_mask(hari)
+        if "suara" in data:
+            if not data["suara"]:
+                raise ValueError("Suara tidak boleh kosong")
+            fields["suara"] = os.path.basename(str(data["suara"]))
+        if "prioritas" in data:
+            fields["prioritas"] = int(data["prioritas"])
+        if "aktif" in data:
+            fields["aktif"] = 1 if data["aktif"] else 0
+        if "zones" in data:
+            fields["zones"] = zones.to_text(parse_zones(data["zones"]))
+    except (TypeError, ValueError) as e:
+        return api_error(str(e))
+    if not fields:
+        return api_error("Tidak ada kolom yang diubah")
+
+    conn = get_db()
+    cur = conn.execute(
+        "UPDATE bell SET " + ", ".join(f"{k}=?" for k in fields) + " WHERE id=?",
+        (*fields.values(), id)
+    )
+    conn.commit()
+    row = conn.execute(BELL_COLUMNS + " WHERE b.id=?", (id,)).fetchone() if cur.rowcount else None
+    conn.close()
+    if not row:
+        return api_error("Jadwal tidak ditemukan", 404)
+    return jsonify(bell_to_dict(row))
+
+
+@app.route("/api/bells/<int:id>", methods=["DELETE"])
+@api_login_required
+def api_delete_bell(id):
+    conn = get_db()
+    cur = conn.execute("DELETE FROM bell WHERE id=?", (id,))
+    conn.commit()
+    conn.close()
+    if not cur.rowcount:
+        return api_error("Jadwal tidak ditemukan", 404)
+    return jsonify({"id": id, "deleted": True})
+
+
+@app.route("/api/profiles")
+@api_login_required
+def api_profiles():
+    return jsonify([{"id": p[0], "name": p[1], "active": bool(p[2])}
+                    for p in get_profiles()])
+
+
+@app.route("/api/profiles", methods=["POST"])
+@api_login_required
+def api_add_profile():
+    data = request.get_json(silent=True) or {}
+    name = str(data.get("name", "")).strip()
+    if not name:
+        return api_error("Nama profil wajib diisi")
+    conn = get_db()
+    cur = conn.execute(
+        "INSERT INTO profiles (name, is_active) VALUES (?, 0)", (name,))
+    conn.commit()
+    conn.close()
+    return jsonify({"id": cur.lastrowid, "name": name, "active": False}), 201
+
+
+@app.route("/api/profiles/<int:id>/activate", methods=["POST"])
+@api_login_required
+def api_activate_profile(id):
+    conn = get_db()
+    if not conn.execute("SELECT 1 FROM profiles WHERE id=?", (id,)).fetchone():
+        conn.close()
+        return api_error("Profil tidak ditemukan", 404)
+    activate_profile(conn, id)
+    conn.close()
+    return jsonify({"id": id, "active": True})
+
+
+@app.route("/api/profiles/<int:id>", methods=["DELETE"])
+@api_login_required
+def api_delete_profile(id):
+    conn = get_db()
+    deleted = remove_profile(conn, id)
+    conn.close()
+    if not deleted:
+        return api_error("Profil terakhir tidak bisa dihapus", 409)
+    return jsonify({"id": id, "deleted": True})
+
+
+# ---------------- bulk: import/export, clone, shift ----------------
+# Setiap operasi satu transaksi (executemany / INSERT ... SELECT).
+
+MAX_IMPORT_ROWS = 5000
+EXPORT_FIELDS = ("jam", "hari", "suara", "aktif", "prioritas", "zones")
+
+
+def profile_name(conn, id):
+    row = conn.execute("SELECT name FROM profiles WHERE id=?", (id,)).fetchone()
+    return row[0] if row else None
+
+
+def parse_flag(value, default=1):
+    if value is None or value == "":
+        return default
+    if isinstance(value, bool):
+        return int(value)
+    return 0 if str(value).strip().lower() in ("0", "false", "tidak", "off", "mati") else 1
+
+
+def read_import_records():
+    """Baca jadwal dari upload file (field `file`), body JSON, atau body CSV.
+
+    Return list dict dengan key jam/hari/suara/aktif/prioritas/zones.
+    """
+    f = request.files.get("file")
+    if f:
+        raw, name = f.read(), f.filename.lower()
+    else:
+        raw, name = request.get_data(), ""
+    text = raw.decode("utf-8-sig")  # BOM dari Excel
+    is_json = name.endswith(".json") or (
+        not name.endswith(".csv") and text.lstrip()[:1] in ("[", "{"))
+
+    if is_json:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = data.get("bells", [])
+        if not isinstance(data, list):
+            raise ValueError("JSON harus berupa list jadwal atau {\"bells\": [...]}")
+        return data
+
+    reader = csv.DictReader(io.StringIO(text))
+    return [{(k or "").strip().lower(): v for k, v in row.items()} for row in reader]
+
+
+def parse_import(records):
+    """Validasi semua baris dulu. Return (rows, errors); rows siap executemany."""
+    rows, errors = [], []
+    if len(records) > MAX_IMPORT_ROWS:
+        return [], [f"Maksimal {MAX_IMPORT_ROWS} jadwal per impor"]
+    for n, rec in enumerate(records, start=1):
+        try:
+            if not isinstance(rec, dict):
+                raise ValueError("baris harus berupa object")
+            jam = parse_jam(rec.get("jam", ""))
+            hari = parse_hari(rec.get("hari") or "")
+            if not hari:
+                raise ValueError("hari kosong")
+            suara = os.path.basename(str(rec.get("suara") or "").strip())
+            if not suara:
+                raise ValueError("suara kosong")
+            prioritas = int(rec.get("prioritas") or 0)
+            # Id zona disimpan apa adanya (seperti clone/replikasi); zona
+            # yang tidak ada di node ini diabaikan saat bunyi
+            bell_zones = zones.to_text(zones.parse(rec.get("zones") or None))
+            rows.append((jam, ",".join(hari), suara, parse_flag(rec.get("aktif")),
+                         prioritas, hari_to_mask(hari), bell_zones))
+        except (TypeError, ValueError) as e:
+            errors.append(f"Baris {n}: {e}")
+    return rows, errors
+
+
+def shift_bell(jam, hari, minutes):
+    """Geser satu jadwal N menit; lewat tengah malam ikut menggeser hari."""
+    h, m = map(int, jam.split(":"))
+    days, minute = divmod(h * 60 + m + minutes, 24 * 60)
+    hari = [DAYS[(DAYS.index(d) + days) % 7] for d in parse_hari(hari)]
+    hari.sort(key=DAYS.index)
+    return f"{minute // 60:02d}:{minute % 60:02d}", hari
+
+
+@app.route("/api/profiles/<int:id>/export")
+@api_login_required
+def api_export_profile(id):
+    conn = get_db()
+    name = profile_name(conn, id)
+    rows = conn.execute(
+        "SELECT jam, hari, suara, aktif, COALESCE(prioritas, 0), zones FROM bell "
+        "WHERE profile_id=? ORDER BY jam, id", (id,)).fetchall()
+    conn.close()
+    if name is None:
+        return api_error("Profil tidak ditemukan", 404)
+
+    fmt = request.args.get("format", "csv")
+    filename = "jadwal_" + "".join(c if c.isalnum() else "_" for c in name)
+    if fmt == "json":
+        body = json.dumps({
+            "profile": name,
+            "bells": [dict(zip(EXPORT_FIELDS, r[:-1] + (zones.parse(r[-1]),))) for r in rows],
+        }, indent=1)
+        mimetype, filename = "application/json", filename + ".json"
+    else:
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(EXPORT_FIELDS)
+        writer.writerows(rows)
+        body, mimetype, filename = buf.getvalue(), "text/csv", filename + ".csv"
+
+    return Response(body, mimetype=mimetype, headers={
+        "Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@app.route("/api/profiles/<int:id>/import", methods=["POST"])
+@api_login_required
+def api_import_profile(id):
+    """?mode=append (default) atau replace (hapus jadwal lama dulu)."""
+    replace = request.args.get("mode", request.form.get("mode")) == "replace"
+    try:
+        rows, errors = parse_import(read_import_records())
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return api_error(f"File tidak bisa dibaca: {e}")
+    if errors:
+        # Tidak ada yang ditulis jika satu baris saja salah
+        return jsonify({"status": "error", "message": "Impor dibatalkan",
+                        "errors": errors[:50]}), 400
+    if not rows:
+        return api_error("Tidak ada jadwal di file")
+
+    conn = get_db()
+    if profile_name(conn, id) is None:
+        conn.close()
+        return api_error("Profil tidak ditemukan", 404)
+    try:
+        removed = 0
+        if replace:
+            removed = conn.execute(
+                "DELETE FROM bell WHERE profile_id=?", (id,)).rowcount
+        conn.executemany(
+            "INSERT INTO bell (jam, hari, suara, aktif, prioritas, hari_mask, zones, profile_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [r + (id,) for r in rows])
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        conn.close()
+        raise
+    known = set(sound_library.list_sounds(conn))
+    conn.close()
+
+    return jsonify({
+        "status": "ok",
+        "imported": len(rows),
+        "removed": removed,
+        "missing_sounds": sorted({r[2] for r in rows} - known),
+    })
+
+
+@app.route("/api/profiles/<int:id>/clone", methods=["POST"])
+@api_login_required
+def api_clone_profile(id):
+    data = request.get_json(silent=True) or {}
+    conn = get_db()
+    source = profile_name(conn, id)
+    if source is None:
+        conn.close()
+        return api_error("Profil tidak ditemukan", 404)
+    name = str(data.get("name") or "").strip() or f"{source} (salinan)"
+
+    new_id = conn.execute(
+        "INSERT INTO profiles (name, is_active, zones) "
+        "SELECT ?, 0, zones FROM profiles WHERE id=?", (name, id)).lastrowid
+    copied = conn.execute(
+        "INSERT INTO bell (jam, hari, suara, aktif, profile_id, hari_mask, prioritas, zones) "
+        "SELECT jam, hari, suara, aktif, ?, hari_mask, prioritas, zones FROM bell "
+        "WHERE profile_id=? ORDER BY id", (new_id, id)).rowcount
+    conn.commit()
+    conn.close()
+    return jsonify({"id": new_id, "name": name, "active": False, "bells": copied}), 201
+
+
+@app.route("/api/profiles/<int:id>/shift", methods=["POST"])
+@api_login_required
+def api_shift_profile(id):
+    data = request.get_json(silent=True) or {}
+    try:
+        minutes = int(data.get("minutes"))
+    except (TypeError, ValueError):
+        return api_error("minutes harus bilangan bulat")
+    if not minutes or abs(minutes) >= 24 * 60:
+        return api_error("minutes harus antara -1439 dan 1439 (bukan 0)")
+
+    conn = get_db()
+    if profile_name(conn, id) is None:
+        conn.close()
+        return api_error("Profil tidak ditemukan", 404)
+    updates = []
+    for bell_id, jam, hari in conn.execute(
+            "SELECT id, jam, hari FROM bell WHERE profile_id=?", (id,)).fetchall():
+        try:
+            new_jam, new_hari = shift_bell(jam, hari or "", minutes)
+        except ValueError:
+            continue  # jam rusak dibiarkan; scheduler juga melewatinya
+        updates.append((new_jam, ",".join(new_hari), hari_to_mask(new_hari), bell_id))
+    conn.executemany(
+        "UPDATE bell SET jam=?, hari=?, hari_mask=? WHERE id=?", updates)
+    conn.commit()
+    conn.close()
+    return jsonify({"status": "ok", "shifted": len(updates), "minutes": minutes})
+
+
 # ================= PENGATURAN PAGE =================
 
 
@@ -495,54 +1247,89 @@ def pengaturan_page():
         audio_output=get_setting('audio_output', 'hw:1,0'),
         normalize_volume=get_setting('normalize_volume', '0'),
         target_db=get_setting('target_db', '-14'),
-        time_offset=int(get_setting('time_offset', '0')),
+        preload_audio=get_setting('preload_audio', '0'),
+        playback_mode=get_setting('playback_mode', 'sequential'),
+        time_offset=time_offset_setting(),
         ntp_server=get_setting('ntp_server', 'pool.ntp.org'),
+        ntp_sync_interval=get_setting('ntp_sync_interval', str(timesync.DEFAULT_INTERVAL)),
+        time_sync_history=time_sync_history(),
+        time_sync_error=time_sync.last_error,
+        missed_bell_policy=get_setting('missed_bell_policy', 'latest'),
+        missed_bell_grace=get_setting('missed_bell_grace', '300'),
         timezone_region=get_setting('timezone_region', 'Asia/Jakarta'),
         github_zip_url=get_setting('github_zip_url', ''),
         github_api_url=get_setting('github_api_url', ''),
         current_version=get_setting('current_version', '1.5.0'),
-        devices=get_audio_devices()
+        devices=get_audio_devices(),
+        zones=get_zones(),
+        profile_zones=get_profile_zones(),
+        local_backups=backup_store.list_backups(),
+        calendar_rules=get_calendar_rules(),
+        replication_role=get_setting('replication_role', 'standalone'),
+        replication_primary_url=get_setting('replication_primary_url', ''),
+        replication_token=get_setting('replication_token', ''),
+        replication_interval=get_setting('replication_interval', str(replication.DEFAULT_INTERVAL)),
+        replication_status=replica_puller.snapshot()
     )
 
 
+@app.route("/rescan_devices")
+def rescan_devices():
+    if check_timeout():
+        return redirect(url_for("login"))
+
+    refresh_audio_devices(wait=5)
+    return redirect(url_for("pengaturan_page"))
+
+
+# ================= UPDATE CHECK =================
+# release.json dicek di background (lihat release_check); route hanya
+# membaca cache. BELL_RELEASE_URL bisa mengganti URL (mis. server lokal).
+
+# Klik "Cek Pembaruan" memicu conditional request jika cache lebih tua dari ini
+UPDATE_CHECK_MIN_AGE = 60
+
+
+def release_url():
+    return os.environ.get("BELL_RELEASE_URL") or get_setting('github_api_url')
+
+
+release_checker = release_check.ReleaseChecker(release_url)
+
+
 @app.route("/check_update")
 def check_update():
-    api_url = get_setting('github_api_url')
     current_v = get_setting('current_version', '0.0.0')
-
-    if not api_url:
+    url = release_url()
+    if not url:
         return jsonify({"status": "error", "message": "API URL belum dikonfigurasi"})
 
-    try:
-        with urllib.request.urlopen(api_url, timeout=10) as response:
-            data = json.loads(response.read().decode())
-            new_v = data.get("version", "0.0.0")
-
-            is_new = False
-            # Simple version comparison
-            cv_parts = [int(p) for p in current_v.split('.')]
-            nv_parts = [int(p) for p in new_v.split('.')]
-
-            for c, n in zip(cv_parts, nv_parts):
-                if n > c:
-                    is_new = True
-                    break
-                elif n < c:
-                    break
-            else:
-                if len(nv_parts) > len(cv_parts):
-                    is_new = True
-
-            return jsonify({
-                "status": "success",
-                "current_version": current_v,
-                "latest_version": new_v,
-                "update_available": is_new,
-                "download_url": data.get("download_url", ""),
-                "changelog": data.get("changelog", [])
-            })
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)})
+    release_checker.start()
+    cache = release_checker.snapshot()
+    if cache["data"] is None or cache["url"] != url:
+        if cache["error"]:
+            retry = max(0, int(cache["next_check"] - time.time()))
+            return jsonify({"status": "error",
+                            "message": f"{cache['error']} (coba lagi dalam {retry} detik)"})
+        release_checker.trigger()
+        return jsonify({"status": "pending"})
+
+    if time.time() - cache["checked"] > UPDATE_CHECK_MIN_AGE:
+        release_checker.trigger()
+
+    data = cache["data"]
+    new_v = data.get("version", "0.0.0")
+    return jsonify({
+        "status": "success",
+        "current_version": current_v,
+        "latest_version": new_v,
+        "update_available": release_check.is_newer(current_v, new_v),
+        "download_url": data.get("download_url", ""),
+        "manifest_url": data.get("manifest_url", ""),
+        "changelog": data.get("changelog", []),
+        "checked_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(cache["checked"])),
+        "last_error": cache["error"]
+    })
 
 
 # ================= SETTINGS =================
@@ -556,6 +1343,16 @@ def update_audio():
     audio_output = request.form.get("audio_output", "hw:1,0")
     normalize_volume = "1" if request.form.get("normalize_volume") else "0"
     target_db = request.form.get("target_db", "-14")
+    preload_audio = "1" if request.form.get("preload_audio") else "0"
+    playback_mode = request.form.get("playback_mode", "sequential")
+    if playback_mode not in ("sequential", "mixed"):
+        playback_mode = "sequential"
+
+    # Target baru (atau normalisasi baru diaktifkan): isi ulang cache
+    if normalize_volume == "1" and (
+            get_setting('normalize_volume', '0') != "1" or
+            get_setting('target_db', '-14') != target_db):
+        audio_cache.warm_library(target_db)
 
     conn = get_db()
     conn.execute(
@@ -564,8 +1361,13 @@ def update_audio():
         "UPDATE settings SET value=? WHERE key='normalize_volume'", (normalize_volume,))
     conn.execute(
         "UPDATE settings SET value=? WHERE key='target_db'", (target_db,))
+    conn.execute(
+        "INSERT OR REPLACE INTO settings (key, value) VALUES ('preload_audio', ?)", (preload_audio,))
+    conn.execute(
+        "INSERT OR REPLACE INTO settings (key, value) VALUES ('playback_mode', ?)", (playback_mode,))
     conn.commit()
     conn.close()
+    invalidate_settings()
     return redirect(url_for("pengaturan_page"))
 
 
@@ -574,9 +1376,30 @@ def update_time():
     if check_timeout():
         return redirect(url_for("login"))
 
-    time_offset = request.form.get("time_offset", "0")
+    try:
+        time_offset = f"{float(request.form.get('time_offset', '0')):.3f}"
+    except ValueError:
+        time_offset = "0"
     ntp_server = request.form.get("ntp_server", "pool.ntp.org")
     timezone_region = request.form.get("timezone_region", "Asia/Jakarta")
+    ntp_sync_interval = request.form.get("ntp_sync_interval", "3600")
+    if not ntp_sync_interval.isdigit():
+        ntp_sync_interval = "3600"
+    missed_bell_policy = request.form.get("missed_bell_policy", "latest")
+    if missed_bell_policy not in ("skip", "latest", "all"):
+        missed_bell_policy = "latest"
+    missed_bell_grace = request.form.get("missed_bell_grace", "300")
+    if not missed_bell_grace.isdigit():
+        missed_bell_grace = "300"
+
+    # Offset diisi manual: sinkron otomatis dimatikan (interval 0), kalau
+    # tidak nilai manual langsung ditimpa hasil NTP berikutnya
+    manual = abs(float(time_offset) - time_offset_setting()) >= timesync.MIN_CHANGE
+    if manual and int(ntp_sync_interval) > 0:
+        ntp_sync_interval = "0"
+        flash("Offset manual disimpan; sinkron otomatis dimatikan.", "success")
+    sync_changed = (ntp_server, timezone_region, ntp_sync_interval) != tuple(
+        str(v) for v in time_sync_config())
 
     conn = get_db()
     conn.execute(
@@ -585,8 +1408,17 @@ def update_time():
         "UPDATE settings SET value=? WHERE key='ntp_server'", (ntp_server,))
     conn.execute(
         "UPDATE settings SET value=? WHERE key='timezone_region'", (timezone_region,))
+    conn.execute(
+        "UPDATE settings SET value=? WHERE key='ntp_sync_interval'", (ntp_sync_interval,))
+    conn.execute(
+        "UPDATE settings SET value=? WHERE key='missed_bell_policy'", (missed_bell_policy,))
+    conn.execute(
+        "UPDATE settings SET value=? WHERE key='missed_bell_grace'", (missed_bell_grace,))
     conn.commit()
     conn.close()
+    invalidate_settings()
+    if sync_changed:
+        time_sync.trigger()  # server/interval baru langsung dipakai
     return redirect(url_for("pengaturan_page"))
 
 
@@ -595,55 +1427,54 @@ def sync_time():
     if check_timeout():
         return redirect(url_for("login"))
 
-    import json
-    import socket
-    import struct
-    from urllib.request import urlopen, Request
+    # Query NTP bisa beberapa detik; hasil muncul di riwayat sinkron
+    if time_sync.sync_async():
+        flash("Sinkron jam dimulai di background.", "success")
+    else:
+        flash("Sinkron jam sedang berjalan.", "error")
 
-    ntp_server = get_setting('ntp_server', 'pool.ntp.org')
-    timezone_region = get_setting('timezone_region', 'Asia/Jakarta')
+    return redirect(url_for("pengaturan_page"))
 
-    def get_ntp_time(host):
-        try:
-            addr = (host, 123)
-            msg = b'\x1b' + 47 * b'\0'
-            client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            client.settimeout(2)
-            client.sendto(msg, addr)
-            msg, _ = client.recvfrom(1024)
-            t = struct.unpack("!12I", msg)[10]
-            return t - 2208988800
-        except:
-            return None
-
-    remote_time = None
-
-    # Try NTP first
-    if ntp_server:
-        remote_time = get_ntp_time(ntp_server)
-
-    # Fallback to WorldTimeAPI if NTP fails or not set
-    if remote_time is None:
-        try:
-            url = f"http://worldtimeapi.org/api/timezone/{timezone_region}"
-            req = Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-            with urlopen(req, timeout=5) as response:
-                data = json.loads(response.read().decode())
-                remote_time = data['unixtime']
-        except Exception as e:
-            print(f"Sync error (API): {e}")
 
-    if remote_time is not None:
-        local_time = int(time.time())
-        offset = int(remote_time - local_time)
+# ================= TIME SYNC SERVICE =================
+# Sinkron NTP berkala di background (lihat timesync); hasilnya ditulis ke
+# settings.time_offset sehingga play_bell --daemon ikut memuat ulang.
 
-        conn = get_db()
-        conn.execute(
-            "UPDATE settings SET value=? WHERE key='time_offset'", (str(offset),))
+
+def time_offset_setting():
+    try:
+        return float(get_setting('time_offset', '0'))
+    except ValueError:
+        return 0.0
+
+
+def time_sync_config():
+    try:
+        interval = int(get_setting('ntp_sync_interval', str(timesync.DEFAULT_INTERVAL)))
+    except ValueError:
+        interval = timesync.DEFAULT_INTERVAL
+    return (get_setting('ntp_server', 'pool.ntp.org'),
+            get_setting('timezone_region', 'Asia/Jakarta'),
+            interval)
+
+
+def apply_time_sync(result, source):
+    """Simpan hasil sinkron. Dipanggil oleh sinkron berkala (hanya jika
+    ntp_sync_interval > 0) dan tombol Sinkron Sekarang."""
+    conn = get_db()
+    drift = timesync.record(conn, result, source)
+    if abs(result["offset"] - time_offset_setting()) >= timesync.MIN_CHANGE:
+        conn.execute("UPDATE settings SET value=? WHERE key='time_offset'",
+                     (f"{result['offset']:.3f}",))
         conn.commit()
-        conn.close()
+        invalidate_settings()
+    conn.close()
+    drift_text = f", drift {drift:+.1f} ppm" if drift is not None else ""
+    print(f"Time sync ({source}): offset {result['offset']:+.3f}s, "
+          f"delay {result['delay'] * 1000:.1f}ms{drift_text}")
 
-    return redirect(url_for("pengaturan_page"))
+
+time_sync = timesync.TimeSyncService(time_sync_config, apply_time_sync)
 
 
 # ================= PROFILES =================
@@ -671,9 +1502,7 @@ def switch_profile(id):
         return redirect(url_for("login"))
 
     conn = get_db()
-    conn.execute("UPDATE profiles SET is_active=0")
-    conn.execute("UPDATE profiles SET is_active=1 WHERE id=?", (id,))
-    conn.commit()
+    activate_profile(conn, id)
     conn.close()
 
     return redirect(url_for("pengaturan_page"))
@@ -685,28 +1514,257 @@ def delete_profile(id):
         return redirect(url_for("login"))
 
     conn = get_db()
+    remove_profile(conn, id)
+    conn.close()
+    return redirect(url_for("pengaturan_page"))
+
+
+def activate_profile(conn, id):
+    conn.execute("UPDATE profiles SET is_active=0")
+    conn.execute("UPDATE profiles SET is_active=1 WHERE id=?", (id,))
+    conn.commit()
+
+
+def remove_profile(conn, id):
+    """Hapus profil beserta bell-nya. False jika profil terakhir/tidak ada."""
     # Don't delete the active profile if it's the last one
     profile = conn.execute(
         "SELECT is_active FROM profiles WHERE id=?", (id,)).fetchone()
     count = conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
 
-    if count > 1:
-        if profile and profile[0] == 1:
-            # If deleting active, switch to another first
-            another = conn.execute(
-                "SELECT id FROM profiles WHERE id!=?", (id,)).fetchone()
-            conn.execute(
-                "UPDATE profiles SET is_active=1 WHERE id=?", (another[0],))
-
-        conn.execute("DELETE FROM profiles WHERE id=?", (id,))
-        # Also delete bells associated with this profile
-        conn.execute("DELETE FROM bell WHERE profile_id=?", (id,))
+    if not profile or count <= 1:
+        return False
+
+    if profile[0] == 1:
+        # If deleting active, switch to another first
+        another = conn.execute(
+            "SELECT id FROM profiles WHERE id!=?", (id,)).fetchone()
+        conn.execute(
+            "UPDATE profiles SET is_active=1 WHERE id=?", (another[0],))
+
+    conn.execute("DELETE FROM profiles WHERE id=?", (id,))
+    # Also delete bells and calendar overrides associated with this profile
+    conn.execute("DELETE FROM bell WHERE profile_id=?", (id,))
+    conn.execute("DELETE FROM calendar_exceptions WHERE profile_id=?", (id,))
+    conn.commit()
+    return True
+
+
+# ================= ZONA AUDIO =================
+# Satu zona = satu device ALSA. Bell/profil memilih zona (kolom zones);
+# bell multi-zona diputar bersamaan ke semua device (lihat zones.py).
+
+
+def get_zones():
+    conn = get_db()
+    rows = zones.list_zones(conn)
+    conn.close()
+    return rows
+
+
+def get_profile_zones():
+    """{profile_id: [id zona]} untuk form zona per profil."""
+    conn = get_db()
+    rows = conn.execute("SELECT id, zones FROM profiles").fetchall()
+    conn.close()
+    return {profile_id: zones.parse(value) for profile_id, value in rows}
+
+
+@app.route("/add_zone", methods=["POST"])
+def add_zone():
+    if check_timeout():
+        return redirect(url_for("login"))
+
+    name = request.form.get("name", "").strip()
+    device = request.form.get("device", "").strip()
+    if name and device:
+        conn = get_db()
+        conn.execute("INSERT INTO zones (name, device) VALUES (?, ?)", (name, device))
         conn.commit()
+        conn.close()
+    return redirect(url_for("pengaturan_page"))
+
 
+@app.route("/delete_zone/<int:id>", methods=["POST"])
+def delete_zone(id):
+    if check_timeout():
+        return redirect(url_for("login"))
+
+    conn = get_db()
+    conn.execute("DELETE FROM zones WHERE id=?", (id,))
+    # Lepas zona dari bell/profil; yang tidak punya zona lagi ikut audio_output
+    for table in ("bell", "profiles"):
+        rows = conn.execute(
+            f"SELECT id, zones FROM {table} WHERE zones IS NOT NULL").fetchall()
+        updates = [(zones.to_text([z for z in zones.parse(value) if z != id]), row_id)
+                   for row_id, value in rows if id in zones.parse(value)]
+        conn.executemany(f"UPDATE {table} SET zones=? WHERE id=?", updates)
+    conn.commit()
     conn.close()
     return redirect(url_for("pengaturan_page"))
 
 
+@app.route("/profile_zones/<int:id>", methods=["POST"])
+def profile_zones(id):
+    if check_timeout():
+        return redirect(url_for("login"))
+
+    try:
+        value = zones.to_text(parse_zones(request.form.getlist("zones[]")))
+    except ValueError:
+        return redirect(url_for("pengaturan_page"))
+    conn = get_db()
+    conn.execute("UPDATE profiles SET zones=? WHERE id=?", (value, id))
+    conn.commit()
+    conn.close()
+    return redirect(url_for("pengaturan_page"))
+
+
+@app.route("/test_zone/<int:id>")
+def test_zone(id):
+    if check_timeout():
+        return redirect(url_for("login"))
+
+    conn = get_db()
+    row = conn.execute("SELECT device FROM zones WHERE id=?", (id,)).fetchone()
+    sounds = sound_library.list_sounds(conn)
+    conn.close()
+    if not row or not sounds:
+        return "Zona atau file suara tidak ditemukan", 404
+    if not play_sound_file(os.path.join(SOUND_DIR, sounds[0]), row[0]):
+        return "Gagal memutar suara di zona ini", 404
+    return redirect(url_for("pengaturan_page"))
+
+
+# ================= KALENDER =================
+# Libur dan override profil per tanggal; scheduler membacanya lewat
+# playlist.Playlist (dikompilasi ulang otomatis setelah perubahan).
+
+
+def effective_today():
+    return (datetime.datetime.now()
+            + datetime.timedelta(seconds=time_offset_setting())).date()
+
+
+def get_calendar_rules():
+    """Aturan yang belum berakhir, urut tanggal mulai."""
+    conn = get_db()
+    rows = conn.execute("""
+        SELECT c.id, c.start_date, c.end_date, c.action, p.name, c.note
+        FROM calendar_exceptions c
+        LEFT JOIN profiles p ON p.id = c.profile_id
+        WHERE c.end_date >= ?
+        ORDER BY c.start_date, c.id
+    """, (effective_today().isoformat(),)).fetchall()
+    conn.close()
+    return rows
+
+
+def get_day_plan(date):
+    conn = get_db()
+    plan = playlist.day_plan(conn, date)
+    conn.close()
+    return plan
+
+
+@app.route("/add_exception", methods=["POST"])
+def add_exception():
+    if check_timeout():
+        return redirect(url_for("login"))
+
+    action = request.form.get("action", "skip")
+    note = request.form.get("note", "").strip() or None
+    profile_id = request.form.get("profile_id", type=int)
+    try:
+        start = datetime.date.fromisoformat(request.form.get("start_date", ""))
+        end = datetime.date.fromisoformat(
+            request.form.get("end_date") or start.isoformat())
+    except ValueError:
+        flash("Tanggal tidak valid", "error")
+        return redirect(url_for("pengaturan_page"))
+    if end < start:
+        start, end = end, start
+    if action not in playlist.ACTIONS or (action == "profile" and not profile_id):
+        flash("Jenis pengecualian tidak valid", "error")
+        return redirect(url_for("pengaturan_page"))
+
+    conn = get_db()
+    conn.execute(
+        "INSERT INTO calendar_exceptions (start_date, end_date, action, profile_id, note) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (start.isoformat(), end.isoformat(), action,
+         profile_id if action == "profile" else None, note))
+    conn.commit()
+    conn.close()
+    return redirect(url_for("pengaturan_page"))
+
+
+@app.route("/delete_exception/<int:id>", methods=["POST"])
+def delete_exception(id):
+    if check_timeout():
+        return redirect(url_for("login"))
+
+    conn = get_db()
+    conn.execute("DELETE FROM calendar_exceptions WHERE id=?", (id,))
+    conn.commit()
+    conn.close()
+    return redirect(url_for("pengaturan_page"))
+
+
+@app.route("/api/playlist")
+@api_login_required
+def api_playlist():
+    """Pratinjau playlist satu tanggal (?date=YYYY-MM-DD, default hari ini)."""
+    try:
+        date = datetime.date.fromisoformat(
+            request.args.get("date") or effective_today().isoformat())
+    except ValueError:
+        return api_error("Format tanggal harus YYYY-MM-DD")
+
+    conn = get_db()
+    profile_id, note = playlist.day_plan(conn, date)
+    entries, _ = playlist.compile_day(conn, date)
+    conn.close()
+    return jsonify({
+        "date": date.isoformat(),
+        "profile_id": profile_id,
+        "note": note,
+        "entries": [{"jam": fire_at.strftime("%H:%M"),
+                     "bells": [{"id": r[0], "suara": r[1], "prioritas": r[2],
+                                "zones": zones.parse(r[3])} for r in rows]}
+                    for fire_at, rows in entries],
+    })
+
+
+# ================= UPDATE SYSTEM =================
+
+
+def finish_update(version):
+    """Dipanggil setelah file update terpasang: catat versi lalu restart."""
+    if version:
+        conn = get_db()
+        conn.execute(
+            "UPDATE settings SET value=? WHERE key='current_version'", (version,))
+        conn.commit()
+        conn.close()
+        invalidate_settings()
+
+    # Self-restart logic
+    def restart():
+        time.sleep(2)
+        if not IS_WINDOWS and shutil.which("systemctl"):
+            # Scheduler juga memakai modul yang baru saja diganti
+            subprocess.run(["systemctl", "try-restart", "bell-player"],
+                           capture_output=True)
+        if os.environ.get("BELL_SERVER") == "gunicorn":
+            # Reload halus: master mengganti worker dengan kode baru
+            os.kill(os.getppid(), signal.SIGHUP)
+        else:
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    threading.Thread(target=restart).start()
+
+
 @app.route("/update_system", methods=["POST"])
 def update_system():
     if check_timeout():
@@ -714,58 +1772,164 @@ def update_system():
 
     file = request.files.get('update_zip')
     update_url = request.form.get('update_url')
+    manifest_url = request.form.get('manifest_url')
+    version = request.form.get('version') or None
 
-    update_path = os.path.join(BASE_DIR, "temp_update.zip")
-    extract_path = os.path.join(BASE_DIR, "temp_extract")
+    # Unduhan berjalan di background; progres lewat /update_status
+    if manifest_url or update_url:
+        started = updater.start(manifest_url=manifest_url, zip_url=update_url,
+                                version=version, on_done=finish_update)
+        if not started:
+            return jsonify({"status": "error", "message": "Update lain sedang berjalan"}), 409
+        return jsonify({"status": "started"})
+
+    if not file or not file.filename.endswith('.zip'):
+        return "File atau URL tidak valid", 400
 
+    update_path = os.path.join(BASE_DIR, "temp_update.zip")
     try:
-        if file and file.filename.endswith('.zip'):
-            file.save(update_path)
-        elif update_url:
-            print(f"Mengunduh update dari: {update_url}")
-            urllib.request.urlretrieve(update_url, update_path)
-        else:
-            return "File atau URL tidak valid", 400
+        file.save(update_path)
+        updater.apply_zip(update_path)
+        finish_update(None)
+        return "Update Berhasil! Sistem sedang restart..."
+    except Exception as e:
+        return f"Update Gagal: {e}", 500
+    finally:
+        if os.path.exists(update_path):
+            os.remove(update_path)
 
-        # Clear old extract path if exists
-        if os.path.exists(extract_path):
-            shutil.rmtree(extract_path)
-        os.makedirs(extract_path)
 
-        # Extract
-        with zipfile.ZipFile(update_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_path)
+@app.route("/update_status")
+def update_status():
+    # Polling progres: tidak memperpanjang sesi
+    if check_timeout(touch=False):
+        return api_error("Sesi berakhir, silakan login lagi", 401)
+    return jsonify(updater.status())
 
-        # Move files to base dir (excluding database to prevent data loss)
-        for root, dirs, files in os.walk(extract_path):
-            for filename in files:
-                if filename == 'bell.db':
-                    continue  # Protect existing database
 
-                rel_path = os.path.relpath(
-                    os.path.join(root, filename), extract_path)
-                dest_path = os.path.join(BASE_DIR, rel_path)
+# ================= BACKUP =================
+BACKUP_CHUNK = 64 * 1024
+# Batas waktu satu unduhan backup (detik). Timeout gunicorn hanya heartbeat
+# worker, tidak memutus request gthread yang lama (lihat gunicorn_conf.py)
+BACKUP_STREAM_TIMEOUT = int(os.environ.get("BELL_STREAM_TIMEOUT", "600"))
+# Audio sudah terkompresi; deflate hanya membuang CPU
+STORED_EXTS = (".mp3", ".wav")
 
-                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-                shutil.copy2(os.path.join(root, filename), dest_path)
 
-        # Cleanup
-        shutil.rmtree(extract_path)
-        if os.path.exists(update_path):
-            os.remove(update_path)
+class ZipStream:
+    """File-like tanpa seek untuk zipfile: data ditampung lalu diambil
+    per potongan oleh generator, sehingga ZIP tidak pernah utuh di memori."""
 
-        # Self-restart logic
-        def restart():
-            time.sleep(2)
-            os.kill(os.getpid(), signal.SIGTERM)
+    def __init__(self):
+        self._chunks = []
 
-        import threading
-        threading.Thread(target=restart).start()
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
 
-        return "Update Berhasil! Sistem sedang restart..."
+    def flush(self):
+        pass
 
-    except Exception as e:
-        return f"Update Gagal: {e}", 500
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def backup_entries(db_path=None, include_sounds=True):
+    """List (path, arcname) isi backup. `db_path` adalah snapshot bell.db
+    (lihat snapshot_db), bukan file live."""
+    entries = []
+    if db_path:
+        entries.append((db_path, "bell.db"))
+    if include_sounds and os.path.exists(SOUND_DIR):
+        for root, dirs, files in os.walk(SOUND_DIR):
+            # Cache normalisasi bisa dibuat ulang, tidak perlu di-backup
+            dirs[:] = [d for d in dirs if d != ".cache"]
+            for file in sorted(files):
+                file_path = os.path.join(root, file)
+                rel_path = os.path.join(
+                    "static/sounds", os.path.relpath(file_path, SOUND_DIR))
+                entries.append((file_path, rel_path))
+    return entries
+
+
+def iter_backup_zip(entries, manifest=None):
+    """Generator potongan bytes ZIP untuk `entries`, dibuat sambil jalan.
+    `manifest` (dict) ditulis sebagai manifest.json di awal arsip."""
+    out = ZipStream()
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        if manifest is not None:
+            zipf.writestr("manifest.json", json.dumps(manifest, indent=1))
+        for path, arcname in entries:
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            info.compress_type = (zipfile.ZIP_STORED
+                                  if path.lower().endswith(STORED_EXTS)
+                                  else zipfile.ZIP_DEFLATED)
+            with open(path, "rb") as src, zipf.open(info, "w", force_zip64=True) as dst:
+                for chunk in iter(lambda: src.read(BACKUP_CHUNK), b""):
+                    dst.write(chunk)
+                    data = out.drain()
+                    if data:
+                        yield data
+            data = out.drain()
+            if data:
+                yield data
+    # Central directory ditulis saat ZipFile ditutup
+    yield out.drain()
+
+
+def sound_hashes(conn):
+    """{nama: sha256} dari index suara (tabel sounds)."""
+    return dict(conn.execute("SELECT filename, sha256 FROM sounds"))
+
+
+def backup_to_store(reason):
+    """Backup inkremental ke backups/ (lihat backup_store), lalu retensi."""
+    conn = get_db()
+    sound_library.sync(conn)
+    snapshot = snapshot_db() if os.path.exists(DB) else None
+    try:
+        manifest = backup_store.create(conn, snapshot, reason=reason)
+    finally:
+        if snapshot:
+            os.remove(snapshot)
+        conn.close()
+    try:
+        keep = int(get_setting('backup_keep', str(backup_store.DEFAULT_KEEP)))
+    except ValueError:
+        keep = backup_store.DEFAULT_KEEP
+    backup_store.prune(keep)
+    return manifest
+
+
+def apply_restore(db_path, wanted_sounds, open_sound):
+    """Pulihkan database dari `db_path` (boleh None) dan suara yang berbeda
+    dari `wanted_sounds` ({nama: sha256}). Return jumlah suara yang ditulis."""
+    if db_path:
+        release_db()
+        restore_db_from(db_path)
+        reset_db_pool()
+        # Backup lama mungkin belum punya kolom/tabel terbaru
+        init_db()
+        # Riwayat changes ikut mundur: replica perlu snapshot penuh
+        conn = get_db()
+        replication.new_epoch(conn)
+        conn.close()
+        invalidate_settings()
+
+    written = []
+    if wanted_sounds:
+        conn = get_db()
+        written = backup_store.apply_sounds(
+            wanted_sounds, sound_hashes(conn), open_sound)
+        if written:
+            sound_library.sync(conn, names=written)
+            if get_setting('normalize_volume', '0') == '1':
+                audio_cache.warm([os.path.join(SOUND_DIR, n) for n in written],
+                                 get_setting('target_db', '-14'))
+        conn.close()
+    return len(written)
 
 
 @app.route("/backup_system", methods=["POST"])
@@ -773,33 +1937,50 @@ def backup_system():
     if check_timeout():
         return redirect(url_for("login"))
 
-    backup_db = request.form.get("backup_db")
-    backup_sounds = request.form.get("backup_sounds")
-
-    backup_filename = f"backup_bell_{int(time.time())}.zip"
-    backup_path = os.path.join(BASE_DIR, backup_filename)
-
+    snapshot = None
     try:
-        with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            if backup_db:
-                if os.path.exists(DB):
-                    zipf.write(DB, "bell.db")
-
-            if backup_sounds:
-                if os.path.exists(SOUND_DIR):
-                    for root, dirs, files in os.walk(SOUND_DIR):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            rel_path = os.path.join(
-                                "static/sounds", os.path.relpath(file_path, SOUND_DIR))
-                            zipf.write(file_path, rel_path)
-
-        # Send file and then delete it
-        # We use a wrapper or just trust flask behavior
-        # Note: send_file doesn't delete automatically, we can use a generator or cleanup after
-        return send_file(backup_path, as_attachment=True)
+        if request.form.get("backup_db") and os.path.exists(DB):
+            snapshot = snapshot_db()
     except Exception as e:
         return f"Backup Gagal: {e}", 500
+    include_sounds = bool(request.form.get("backup_sounds"))
+    backup_filename = f"backup_bell_{int(time.time())}.zip"
+    # Unduhan bisa lama: jangan tahan slot pool DB selama streaming
+    release_db()
+
+    def generate():
+        deadline = time.monotonic() + BACKUP_STREAM_TIMEOUT
+        try:
+            # Hash per file: restore hanya menulis suara yang berbeda.
+            # Koneksi sendiri, ditutup sebelum data ZIP dialirkan.
+            manifest = {"created": time.strftime("%Y-%m-%d %H:%M:%S"), "sounds": {}}
+            if include_sounds:
+                conn = _connect()
+                try:
+                    sound_library.sync(conn)
+                    manifest["sounds"] = sound_hashes(conn)
+                finally:
+                    conn.close()
+            entries = backup_entries(snapshot, include_sounds=include_sounds)
+            for chunk in iter_backup_zip(entries, manifest):
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"melebihi {BACKUP_STREAM_TIMEOUT} detik")
+                yield chunk
+        except Exception as e:
+            # Header sudah terkirim; client akan menerima ZIP terpotong
+            print(f"Backup stream gagal: {e}")
+            raise
+
+    response = Response(
+        generate(),
+        mimetype="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename={backup_filename}",
+            "Cache-Control": "no-store",
+        })
+    if snapshot:
+        response.call_on_close(lambda: os.remove(snapshot))
+    return response
 
 
 @app.route("/restore_backup", methods=["POST"])
@@ -813,72 +1994,262 @@ def restore_backup():
         return redirect(url_for("pengaturan_page"))
 
     restore_path = os.path.join(BASE_DIR, "temp_restore.zip")
-    extract_path = os.path.join(BASE_DIR, "temp_restore_extract")
+    db_path = None
 
     try:
         # Save uploaded file
         file.save(restore_path)
 
-        # Auto-backup current database before restore
-        auto_backup_path = os.path.join(
-            BASE_DIR, f"auto_backup_before_restore_{int(time.time())}.zip")
-        with zipfile.ZipFile(auto_backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            if os.path.exists(DB):
-                zipf.write(DB, "bell.db")
-            if os.path.exists(SOUND_DIR):
-                for root, dirs, files in os.walk(SOUND_DIR):
-                    for f in files:
-                        file_path = os.path.join(root, f)
-                        rel_path = os.path.join(
-                            "static/sounds", os.path.relpath(file_path, SOUND_DIR))
-                        zipf.write(file_path, rel_path)
-
-        # Clear old extract path if exists
-        if os.path.exists(extract_path):
-            shutil.rmtree(extract_path)
-        os.makedirs(extract_path)
-
-        # Extract backup
+        # Auto-backup (inkremental) data saat ini sebelum restore
+        backup_to_store("pre-restore")
+
         with zipfile.ZipFile(restore_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_path)
-
-        # Restore database
-        backup_db_path = os.path.join(extract_path, "bell.db")
-        if os.path.exists(backup_db_path):
-            shutil.copy2(backup_db_path, DB)
-
-        # Restore sounds
-        backup_sounds_path = os.path.join(extract_path, "static", "sounds")
-        if os.path.exists(backup_sounds_path):
-            os.makedirs(SOUND_DIR, exist_ok=True)
-            for f in os.listdir(backup_sounds_path):
-                src = os.path.join(backup_sounds_path, f)
-                dst = os.path.join(SOUND_DIR, f)
-                if os.path.isfile(src):
-                    shutil.copy2(src, dst)
-
-        # Cleanup
-        shutil.rmtree(extract_path)
-        os.remove(restore_path)
-
-        flash("Restore berhasil! Data telah dipulihkan dari backup.", "success")
+            names = set(zip_ref.namelist())
+
+            # Database: hanya bell.db yang diekstrak (ke file sementara)
+            if "bell.db" in names:
+                fd, db_path = tempfile.mkstemp(prefix="bell_restore_", suffix=".db")
+                with os.fdopen(fd, "wb") as out, zip_ref.open("bell.db") as src:
+                    shutil.copyfileobj(src, out, 1024 * 1024)
+
+            prefix = "static/sounds/"
+            members = {n[len(prefix):]: n for n in names
+                       if n.startswith(prefix) and not n.endswith("/")}
+            try:
+                wanted = json.loads(zip_ref.read("manifest.json"))["sounds"]
+            except (KeyError, ValueError):
+                # Backup lama tanpa manifest: hash dihitung dari isi ZIP
+                wanted = {}
+                for name, member in members.items():
+                    with zip_ref.open(member) as src:
+                        h = hashlib.sha256()
+                        for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                            h.update(chunk)
+                    wanted[name] = h.hexdigest()
+            wanted = {n: sha for n, sha in wanted.items() if n in members}
+
+            written = apply_restore(
+                db_path, wanted, lambda name: zip_ref.open(members[name]))
+
+        flash(f"Restore berhasil! Data telah dipulihkan dari backup "
+              f"({written} file suara diperbarui).", "success")
         return redirect(url_for("pengaturan_page"))
 
     except Exception as e:
-        # Cleanup on error
-        if os.path.exists(extract_path):
-            shutil.rmtree(extract_path)
+        flash(f"Restore Gagal: {e}", "error")
+        return redirect(url_for("pengaturan_page"))
+    finally:
+        if db_path and os.path.exists(db_path):
+            os.remove(db_path)
         if os.path.exists(restore_path):
             os.remove(restore_path)
+
+
+@app.route("/backup_local", methods=["POST"])
+def backup_local():
+    if check_timeout():
+        return redirect(url_for("login"))
+
+    try:
+        manifest = backup_to_store("manual")
+        flash(f"Backup {manifest['id']} tersimpan di perangkat.", "success")
+    except Exception as e:
+        flash(f"Backup Gagal: {e}", "error")
+    return redirect(url_for("pengaturan_page"))
+
+
+@app.route("/restore_local/<backup_id>", methods=["POST"])
+def restore_local(backup_id):
+    if check_timeout():
+        return redirect(url_for("login"))
+
+    db_path = None
+    try:
+        manifest = backup_store.load(backup_id)
+        backup_to_store("pre-restore")
+
+        if manifest.get("db"):
+            # Salin dulu: restore_db_from bisa mengubah file sumber (VACUUM)
+            fd, db_path = tempfile.mkstemp(prefix="bell_restore_", suffix=".db")
+            os.close(fd)
+            shutil.copyfile(backup_store.object_path(manifest["db"]), db_path)
+
+        wanted = {n: s["sha256"] for n, s in manifest.get("sounds", {}).items()}
+        written = apply_restore(
+            db_path, wanted,
+            lambda name: open(backup_store.object_path(wanted[name]), "rb"))
+        flash(f"Restore dari backup {backup_id} berhasil "
+              f"({written} file suara diperbarui).", "success")
+    except Exception as e:
         flash(f"Restore Gagal: {e}", "error")
-        return redirect(url_for("pengaturan_page"))
+    finally:
+        if db_path and os.path.exists(db_path):
+            os.remove(db_path)
+    return redirect(url_for("pengaturan_page"))
+
+
+@app.route("/delete_local/<backup_id>", methods=["POST"])
+def delete_local(backup_id):
+    if check_timeout():
+        return redirect(url_for("login"))
+
+    try:
+        backup_store.delete(backup_id)
+        flash(f"Backup {backup_id} dihapus.", "success")
+    except Exception as e:
+        flash(f"Gagal menghapus backup: {e}", "error")
+    return redirect(url_for("pengaturan_page"))
+
+
+# ================= REPLICATION =================
+# Mode primary: melayani perubahan untuk node lain. Mode replica: menarik
+# jadwal dari controller di background (lihat replication.py).
+
+
+def replication_config():
+    try:
+        interval = max(5, int(get_setting('replication_interval',
+                                          str(replication.DEFAULT_INTERVAL))))
+    except ValueError:
+        interval = replication.DEFAULT_INTERVAL
+    return (get_setting('replication_role', 'standalone'),
+            get_setting('replication_primary_url', ''),
+            get_setting('replication_token', ''),
+            interval)
+
+
+def replication_authorized():
+    """Request dari replica: node ini primary dan token Bearer cocok."""
+    if get_setting('replication_role', 'standalone') != 'primary':
+        return False
+    token = get_setting('replication_token', '')
+    header = request.headers.get("Authorization", "")
+    return bool(token) and hmac.compare_digest(header, f"Bearer {token}")
+
+
+def on_replicated(summary):
+    invalidate_settings()
+    if summary["sounds"] and get_setting('normalize_volume', '0') == '1':
+        audio_cache.warm([os.path.join(SOUND_DIR, n) for n in summary["sounds"]],
+                         get_setting('target_db', '-14'))
+
+
+replica_puller = replication.ReplicaPuller(
+    replication_config, get_db, on_applied=on_replicated)
+
+
+@app.route("/api/replication/changes")
+def replication_changes():
+    if not replication_authorized():
+        return api_error("Tidak diizinkan", 403)
+    since = request.args.get("since", 0, type=int)
+    conn = get_db()
+    data = replication.changes_since(conn, since, request.args.get("epoch"))
+    conn.close()
+    return jsonify(data)
+
+
+@app.route("/api/replication/sounds/<sha>")
+def replication_sound(sha):
+    if not replication_authorized():
+        return api_error("Tidak diizinkan", 403)
+    if len(sha) != 64 or any(c not in "0123456789abcdef" for c in sha):
+        return api_error("Hash tidak valid")
+    conn = get_db()
+    path = replication.sound_path(conn, sha)
+    conn.close()
+    if not path:
+        return api_error("Suara tidak ditemukan", 404)
+    return send_file(path, mimetype="application/octet-stream")
+
+
+@app.route("/update_replication", methods=["POST"])
+def update_replication():
+    if check_timeout():
+        return redirect(url_for("login"))
+
+    role = request.form.get("replication_role", "standalone")
+    if role not in replication.ROLES:
+        role = "standalone"
+    primary_url = request.form.get("replication_primary_url", "").strip().rstrip("/")
+    token = request.form.get("replication_token", "").strip()
+    if role == "primary" and not token:
+        token = secrets.token_urlsafe(24)
+    interval = request.form.get("replication_interval", "30")
+    if not interval.isdigit():
+        interval = str(replication.DEFAULT_INTERVAL)
+
+    conn = get_db()
+    for key, value in (('replication_role', role),
+                       ('replication_primary_url', primary_url),
+                       ('replication_token', token),
+                       ('replication_interval', interval)):
+        conn.execute(
+            "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
+    conn.commit()
+    conn.close()
+    invalidate_settings()
+    replica_puller.trigger()
+    return redirect(url_for("pengaturan_page"))
+
+
+@app.route("/replication_sync")
+def replication_sync():
+    if check_timeout():
+        return redirect(url_for("login"))
+
+    replica_puller.trigger()
+    flash("Sinkron dari controller dimulai di background.", "success")
+    return redirect(url_for("pengaturan_page"))
+
+
+# ================= BACKGROUND SERVICES =================
+
+_services_started = False
+_services_lock = threading.Lock()
+
+
+def start_background_services():
+    """Sekali per proses (dev server, waitress, atau worker gunicorn)."""
+    global _services_started
+    with _services_lock:
+        if _services_started:
+            return
+        _services_started = True
+    refresh_audio_devices()
+    watch_audio_hotplug()
+    release_checker.start()
+    time_sync.start()
+    replica_puller.start()
 
 
 # ================= RUN =================
+SERVE_THREADS = int(os.environ.get("BELL_THREADS", "8"))
+
+
+def serve(host="0.0.0.0", port=int(os.environ.get("BELL_PORT", "5000"))):
+    """Tanpa gunicorn (Windows / instalasi lama): waitress jika terpasang,
+    jika tidak server bawaan Flask dengan thread per request."""
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        print("waitress tidak terpasang, memakai server bawaan Flask "
+              "(untuk produksi pakai: python3 -m gunicorn -c gunicorn_conf.py app:app)")
+        app.run(host=host, port=port, threaded=True)
+        return
+    waitress_serve(app, host=host, port=port, threads=SERVE_THREADS)
+
+
 if __name__ == "__main__":
+    # Update yang terputus di tengah penukaran file: kembalikan versi lama
+    if updater.recover():
+        print("Update tidak selesai, file lama dikembalikan. Restart...")
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
     try:
         init_db()
-        app.run(host="0.0.0.0", port=5000)
+        start_background_services()
+        serve()
     except Exception as e:
         with open(os.path.join(BASE_DIR, "crash.log"), "a") as f:
             f.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] CRASH: {e}\n")
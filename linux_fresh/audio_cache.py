@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Cache audio ter-normalisasi (loudnorm) untuk app.py dan play_bell.py.
+
+File hasil normalisasi disimpan di static/sounds/.cache/<sha>_<target_db>.wav
+sehingga tombol tes maupun scheduler bisa langsung memutarnya tanpa
+menjalankan ffmpeg lagi. Ukuran cache (termasuk PCM mentah milik
+pcm_player di .cache/pcm/) dibatasi dengan eviksi LRU (berdasarkan mtime
+yang diperbarui setiap kali file dipakai).
+"""
+import hashlib
+import os
+import subprocess
+import threading
+
+# ================= CONFIG =================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.environ.get("BELL_DATA_DIR", BASE_DIR)
+SOUND_DIR = os.path.join(DATA_DIR, "static/sounds")
+CACHE_DIR = os.path.join(SOUND_DIR, ".cache")
+PCM_DIR = os.path.join(CACHE_DIR, "pcm")  # lihat pcm_player.decode
+CACHE_MAX_BYTES = 512 * 1024 * 1024  # 512 MB
+
+IS_WINDOWS = os.name == 'nt'
+SOUND_EXTS = (".wav", ".mp3")
+
+_hash_memo = {}
+_pending = set()
+_lock = threading.Lock()
+
+# ================= HASH =================
+
+
+def file_hash(path):
+    """SHA-256 isi file (16 hex pertama), di-memo per (path, mtime, size)."""
+    st = os.stat(path)
+    memo_key = (path, st.st_mtime_ns, st.st_size)
+    digest = _hash_memo.get(memo_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        digest = h.hexdigest()[:16]
+        _hash_memo[memo_key] = digest
+    return digest
+
+
+def cache_path(path, target_db):
+    return os.path.join(CACHE_DIR, f"{file_hash(path)}_{target_db}.wav")
+
+# ================= CACHE =================
+
+
+def get_cached(path, target_db):
+    """Path file ter-normalisasi jika sudah ada di cache, selain itu None."""
+    try:
+        cached = cache_path(path, target_db)
+        if os.path.isfile(cached):
+            os.utime(cached)  # tandai baru dipakai (LRU)
+            return cached
+    except OSError:
+        pass
+    return None
+
+
+def normalize(path, target_db):
+    """Normalisasi `path` ke cache (blocking). Return path cache atau None."""
+    try:
+        cached = cache_path(path, target_db)
+    except OSError as e:
+        print(f"Normalize cache error: {e}")
+        return None
+    if os.path.isfile(cached):
+        return cached
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Tulis ke file sementara unik lalu rename (aman untuk proses paralel)
+    tmp_path = f"{cached}.{os.getpid()}.{threading.get_ident()}.tmp"
+    ffmpeg_cmd = [
+        "ffmpeg", "-y", "-i", path,
+        "-af", f"loudnorm=I={target_db}:TP=-1.5:LRA=11",
+        "-ar", "44100",
+        "-f", "wav", tmp_path
+    ]
+    try:
+        result = subprocess.run(
+            ffmpeg_cmd,
+            capture_output=True,
+            timeout=120,
+            creationflags=subprocess.CREATE_NO_WINDOW if IS_WINDOWS and hasattr(
+                subprocess, 'CREATE_NO_WINDOW') else 0
+        )
+        if result.returncode != 0 or not os.path.exists(tmp_path):
+            print(f"Normalization failed for {path}: "
+                  f"{result.stderr.decode(errors='ignore')[-200:]}")
+            return None
+        os.replace(tmp_path, cached)
+    except Exception as e:
+        print(f"Normalization failed for {path}: {e}")
+        return None
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    evict()
+    return cached
+
+
+def warm(paths, target_db):
+    """Isi cache untuk `paths` di background thread (tidak memblokir)."""
+    todo = []
+    with _lock:
+        for path in paths:
+            key = (path, str(target_db))
+            if key not in _pending and os.path.isfile(path):
+                _pending.add(key)
+                todo.append(path)
+    if not todo:
+        return None
+
+    def worker():
+        for path in todo:
+            try:
+                normalize(path, target_db)
+            finally:
+                with _lock:
+                    _pending.discard((path, str(target_db)))
+
+    t = threading.Thread(target=worker, daemon=True)
+    t.start()
+    return t
+
+
+def warm_library(target_db):
+    """Isi cache untuk seluruh file suara di SOUND_DIR."""
+    if not os.path.isdir(SOUND_DIR):
+        return None
+    paths = [
+        os.path.join(SOUND_DIR, f) for f in sorted(os.listdir(SOUND_DIR))
+        if f.lower().endswith(SOUND_EXTS)
+    ]
+    return warm(paths, target_db)
+
+
+def evict(max_bytes=CACHE_MAX_BYTES):
+    """Hapus file cache (wav ter-normalisasi dan PCM mentah) yang paling lama
+    tidak dipakai sampai total <= max_bytes."""
+    entries = []
+    total = 0
+    for folder, ext in ((CACHE_DIR, ".wav"), (PCM_DIR, ".s16le")):
+        if not os.path.isdir(folder):
+            continue
+        for name in os.listdir(folder):
+            if not name.endswith(ext):
+                continue
+            p = os.path.join(folder, name)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+            total += st.st_size
+
+    for _, size, p in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(p)
+            total -= size
+        except OSError:
+            pass
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""Backup inkremental (content-addressed) untuk app.py.
+
+    backups/objects/<2 hex>/<sha256>   isi file (suara dan snapshot bell.db)
+    backups/manifests/<id>.json        daftar file + hash per backup
+
+File yang isinya tidak berubah hanya dirujuk oleh manifest baru dan tidak
+disalin lagi. Jadi backup setelah jadwal berubah cukup menyimpan satu
+snapshot database. Restore hanya menulis suara yang hash-nya berbeda.
+"""
+import datetime
+import glob
+import hashlib
+import json
+import os
+import tempfile
+
+import sound_library
+
+# ================= CONFIG =================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.path.join(sound_library.DATA_DIR, "backups")
+OBJECT_DIR = os.path.join(STORE_DIR, "objects")
+MANIFEST_DIR = os.path.join(STORE_DIR, "manifests")
+SOUND_DIR = sound_library.SOUND_DIR
+
+# Backup dengan alasan ini ikut retensi; backup manual disimpan sampai dihapus
+AUTO_REASONS = ("auto", "pre-restore")
+DEFAULT_KEEP = 7
+COPY_CHUNK = 1024 * 1024
+
+# ================= OBJECTS =================
+
+
+def object_path(sha):
+    return os.path.join(OBJECT_DIR, sha[:2], sha)
+
+
+def _write_temp(src, directory):
+    """Salin file object `src` ke file sementara di `directory`.
+    Return (path sementara, sha256 isinya)."""
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+    h = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: src.read(COPY_CHUNK), b""):
+                h.update(chunk)
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return tmp, h.hexdigest()
+
+
+def copy_atomic(src, dest, expected=None):
+    """Salin file object `src` ke `dest` lewat file sementara + os.replace,
+    sehingga `dest` tidak pernah setengah tertulis. Return sha256 isinya.
+    Jika `expected` diberikan dan hash berbeda, `dest` tidak disentuh."""
+    tmp, sha = _write_temp(src, os.path.dirname(dest))
+    if expected and sha != expected:
+        os.remove(tmp)
+        raise ValueError(f"Hash tidak cocok untuk {os.path.basename(dest)}")
+    os.chmod(tmp, 0o644)  # mkstemp membuat 0600; file suara dibaca web server & player
+    os.replace(tmp, dest)
+    return sha
+
+
+def put_file(path, sha=None):
+    """Simpan `path` ke store jika belum ada. `sha` (mis. dari tabel sounds)
+    dipakai untuk melewati file yang sudah tersimpan. Return sha256."""
+    if sha and os.path.exists(object_path(sha)):
+        return sha
+
+    # Hash dihitung ulang saat menyalin: nama object selalu sesuai isinya
+    with open(path, "rb") as src:
+        tmp, real_sha = _write_temp(src, STORE_DIR)
+    dest = object_path(real_sha)
+    if os.path.exists(dest):
+        os.remove(tmp)
+    else:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(tmp, dest)
+    return real_sha
+
+# ================= MANIFESTS =================
+
+
+def _manifest_path(backup_id):
+    # id dari form/URL: jangan biarkan keluar dari MANIFEST_DIR
+    if not backup_id or os.path.basename(backup_id) != backup_id:
+        raise ValueError(f"ID backup tidak valid: {backup_id}")
+    return os.path.join(MANIFEST_DIR, backup_id + ".json")
+
+
+def create(conn, db_snapshot=None, reason="manual"):
+    """Buat backup dari snapshot bell.db + semua suara di index `sounds`.
+
+    Index sebaiknya di-sync dulu (sound_library.sync) agar hash terbaru.
+    Return manifest (dict).
+    """
+    os.makedirs(MANIFEST_DIR, exist_ok=True)
+    sounds = {}
+    for name, sha, size in conn.execute(
+            "SELECT filename, sha256, size FROM sounds ORDER BY filename"):
+        path = os.path.join(SOUND_DIR, name)
+        if os.path.isfile(path):
+            sounds[name] = {"sha256": put_file(path, sha), "size": size}
+
+    now = datetime.datetime.now()
+    backup_id = now.strftime("%Y%m%d-%H%M%S")
+    suffix = 1
+    while os.path.exists(_manifest_path(backup_id)):
+        suffix += 1
+        backup_id = f"{now.strftime('%Y%m%d-%H%M%S')}-{suffix}"
+
+    manifest = {
+        "id": backup_id,
+        "created": now.strftime("%Y-%m-%d %H:%M:%S"),
+        "reason": reason,
+        "db": put_file(db_snapshot) if db_snapshot else None,
+        "sounds": sounds,
+    }
+    tmp = _manifest_path(backup_id) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, _manifest_path(backup_id))
+    return manifest
+
+
+def load(backup_id):
+    with open(_manifest_path(backup_id)) as f:
+        return json.load(f)
+
+
+def list_backups():
+    """Semua manifest, terbaru dulu."""
+    backups = []
+    for path in glob.glob(os.path.join(MANIFEST_DIR, "*.json")):
+        try:
+            with open(path) as f:
+                backups.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    backups.sort(key=lambda m: (m.get("created", ""), m.get("id", "")),
+                 reverse=True)
+    return backups
+
+
+def delete(backup_id):
+    os.remove(_manifest_path(backup_id))
+    gc()
+
+
+def gc():
+    """Hapus object yang tidak lagi dirujuk manifest mana pun. Return jumlahnya."""
+    referenced = set()
+    for manifest in list_backups():
+        referenced.add(manifest.get("db"))
+        referenced.update(s["sha256"] for s in manifest.get("sounds", {}).values())
+
+    removed = 0
+    for path in glob.glob(os.path.join(OBJECT_DIR, "*", "*")):
+        if os.path.basename(path) not in referenced:
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def prune(keep=DEFAULT_KEEP):
+    """Retensi: simpan `keep` backup otomatis terbaru, lalu gc().
+
+    ZIP lama auto_backup_before_restore_*.zip (sebelum ada store ini) juga
+    dibatasi `keep` file terbaru.
+    """
+    auto = [m for m in list_backups() if m.get("reason") in AUTO_REASONS]
+    for manifest in auto[keep:]:
+        os.remove(_manifest_path(manifest["id"]))
+
+    legacy = sorted(glob.glob(os.path.join(
+        BASE_DIR, "auto_backup_before_restore_*.zip")), reverse=True)
+    for path in legacy[keep:]:
+        os.remove(path)
+
+    return gc()
+
+# ================= RESTORE =================
+
+
+def apply_sounds(wanted, current, open_source):
+    """Tulis suara dari `wanted` ({nama: sha256}) yang berbeda dengan
+    `current` ({nama: sha256}, isi index saat ini).
+
+    `open_source(nama)` mengembalikan file object isi suara dari backup.
+    Suara yang tidak ada di backup dibiarkan. Return nama yang ditulis.
+    """
+    written = []
+    os.makedirs(SOUND_DIR, exist_ok=True)
+    for name, sha in sorted(wanted.items()):
+        if os.path.basename(name) != name:
+            continue
+        dest = os.path.join(SOUND_DIR, name)
+        if sha and current.get(name) == sha and os.path.isfile(dest):
+            continue
+        with open_source(name) as src:
+            copy_atomic(src, dest)
+        written.append(name)
+    return written
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Benchmark pencarian bell per tick pada database sintetis.
+
+Membandingkan:
+  1. query lama  : WHERE jam=? lalu split(",") kolom hari di Python
+  2. query mask  : WHERE jam=? AND (hari_mask & ?) != 0 (pakai index)
+  3. index memori: build_index() + next_fire() (index mingguan, hanya di sini)
+  4. playlist    : playlist.Playlist milik mode daemon (per tanggal)
+
+Pemakaian: python3 bench_lookup.py [jumlah_bell] [jumlah_iterasi]
+"""
+import bisect
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+import playlist
+from play_bell import DAYS, migrate_schema
+
+PROFILES = ["Default", "Ujian", "Ramadhan", "Pramuka", "Semester"]
+MINUTES_PER_WEEK = 7 * 24 * 60
+
+
+def build_index(schedule):
+    """Index jadwal: menit-dalam-minggu (Senin 00:00 = 0) -> [(id, suara, prioritas)].
+
+    Mengembalikan (keys, slots) dengan keys terurut sehingga pencarian
+    bell berikutnya cukup memakai bisect.
+    """
+    slots = {}
+    for bell_id, jam, hari_mask, suara, prioritas in schedule:
+        try:
+            t = datetime.datetime.strptime(jam, "%H:%M")
+        except (TypeError, ValueError):
+            continue
+        minute = t.hour * 60 + t.minute
+        for weekday in range(7):
+            if not (hari_mask or 0) & (1 << weekday):
+                continue
+            key = weekday * 1440 + minute
+            slots.setdefault(key, []).append((bell_id, suara, prioritas))
+    return sorted(slots), slots
+
+
+def next_fire(index, now):
+    """Cari menit bell terdekat setelah `now`. Return (fire_at, rows) atau None."""
+    keys, slots = index
+    if not keys:
+        return None
+
+    now_key = now.weekday() * 1440 + now.hour * 60 + now.minute
+    pos = bisect.bisect_right(keys, now_key)
+    key = keys[pos % len(keys)]
+    delta = (key - now_key) % MINUTES_PER_WEEK or MINUTES_PER_WEEK
+
+    fire_at = now.replace(second=0, microsecond=0) + \
+        datetime.timedelta(minutes=delta)
+    return fire_at, slots[key]
+
+
+def build_db(path, n_bells):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE profiles (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, is_active INTEGER DEFAULT 0)")
+    conn.execute(
+        "CREATE TABLE bell (id INTEGER PRIMARY KEY AUTOINCREMENT, jam TEXT, hari TEXT, suara TEXT, aktif INTEGER, profile_id INTEGER)")
+    conn.executemany(
+        "INSERT INTO profiles (name, is_active) VALUES (?, ?)",
+        [(name, 1 if i == 0 else 0) for i, name in enumerate(PROFILES)]
+    )
+
+    rnd = random.Random(1996)
+    rows = []
+    for _ in range(n_bells):
+        jam = f"{rnd.randrange(6, 17):02d}:{rnd.randrange(60):02d}"
+        hari = ",".join(d for d in DAYS if rnd.random() < 0.7) or "Monday"
+        rows.append((jam, hari, "bell.mp3", int(rnd.random() < 0.9),
+                     rnd.randrange(1, len(PROFILES) + 1)))
+    conn.executemany(
+        "INSERT INTO bell (jam,hari,suara,aktif,profile_id) VALUES (?,?,?,?,?)", rows)
+    conn.commit()
+    migrate_schema(conn)
+    return conn
+
+
+def bench(label, fn, ticks):
+    start = time.perf_counter()
+    for now in ticks:
+        fn(now)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<14} {elapsed / len(ticks) * 1e6:9.1f} us/tick")
+
+
+def main():
+    n_bells = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    n_ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = build_db(os.path.join(tmp, "bench.db"), n_bells)
+
+        rnd = random.Random(7)
+        base = datetime.datetime(2026, 1, 5)  # Senin
+        ticks = [base + datetime.timedelta(minutes=rnd.randrange(7 * 1440))
+                 for _ in range(n_ticks)]
+
+        def legacy(now):
+            rows = conn.execute("""
+                SELECT b.id, b.hari, b.suara
+                FROM bell b
+                JOIN profiles p ON b.profile_id = p.id
+                WHERE b.jam=? AND b.aktif=1 AND p.is_active=1
+            """, (now.strftime("%H:%M"),)).fetchall()
+            hari_en = now.strftime("%A")
+            return [r for r in rows if hari_en in r[1].split(",")]
+
+        def masked(now):
+            return conn.execute("""
+                SELECT b.id, b.suara
+                FROM bell b
+                WHERE b.profile_id IN (SELECT id FROM profiles WHERE is_active=1)
+                  AND b.aktif=1 AND b.jam=? AND (b.hari_mask & ?) != 0
+            """, (now.strftime("%H:%M"), 1 << now.weekday())).fetchall()
+
+        schedule = conn.execute("""
+            SELECT b.id, b.jam, b.hari_mask, b.suara, COALESCE(b.prioritas, 0)
+            FROM bell b
+            WHERE b.profile_id IN (SELECT id FROM profiles WHERE is_active=1)
+              AND b.aktif=1
+        """).fetchall()
+        index = build_index(schedule)
+
+        # Pastikan hasil kedua query identik sebelum diukur
+        for now in ticks[:200]:
+            assert sorted(r[0] for r in legacy(now)) == sorted(
+                r[0] for r in masked(now))
+
+        print(f"{n_bells} bells, {len(schedule)} aktif di profil aktif, "
+              f"{n_ticks} ticks")
+        plan = conn.execute("""
+            EXPLAIN QUERY PLAN
+            SELECT b.id FROM bell b
+            WHERE b.profile_id IN (SELECT id FROM profiles WHERE is_active=1)
+              AND b.aktif=1 AND b.jam=? AND (b.hari_mask & ?) != 0
+        """, ("07:00", 1)).fetchall()
+        for row in plan:
+            print(f"  plan: {row[-1]}")
+
+        bench("query lama", legacy, ticks)
+        bench("query mask", masked, ticks)
+        bench("index memori", lambda now: next_fire(index, now), ticks)
+
+        start = time.perf_counter()
+        build_index(schedule)
+        print(f"build_index    {(time.perf_counter() - start) * 1e3:9.1f} ms (sekali per perubahan)")
+
+        days = playlist.Playlist()
+        start = time.perf_counter()
+        days.compile(conn, base.date(),
+                     base.date() + datetime.timedelta(days=7 + playlist.LOOKAHEAD_DAYS))
+        elapsed = time.perf_counter() - start
+        bench("playlist", days.next_fire, ticks)
+        print(f"compile        {elapsed * 1e3:9.1f} ms ({len(days.days)} hari, sekali per perubahan)")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
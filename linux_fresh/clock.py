@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Sumber waktu untuk scheduler play_bell.py --daemon.
+
+Scheduler tidak memanggil datetime.now()/time.sleep() langsung, tetapi
+lewat objek clock (wall, monotonic, sleep). Produksi memakai SystemClock;
+ManualClock dipakai harness simulasi untuk memajukan waktu secara instan
+dan meniru lompatan jam dinding (step NTP, offset baru, suspend).
+
+ClockAnchor mengikat jam dinding terkoreksi (wall + time_offset) ke jam
+monotonic. Setiap check() membandingkan prediksi monotonic dengan jam
+dinding; selisih besar berarti jam melompat.
+"""
+import datetime
+import time
+
+# Selisih jam dinding vs prediksi monotonic yang dianggap lompatan (detik)
+JUMP_THRESHOLD = 2.0
+
+
+class SystemClock:
+    def wall(self):
+        return datetime.datetime.now()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class SimulationEnd(Exception):
+    """Dilempar ManualClock.sleep() setelah melewati batas `until`."""
+
+
+class ManualClock:
+    """Clock tiruan: sleep() memajukan waktu tanpa menunggu.
+
+    step(detik) menggeser jam dinding saja (monotonic tetap), seperti
+    systemd-timesyncd yang men-step jam. `events` adalah list
+    (wall_datetime, callable) yang dijalankan saat waktu melewatinya.
+    """
+
+    def __init__(self, start, until=None, events=None):
+        self._wall = start
+        self._mono = 0.0
+        self.until = until
+        self.events = sorted(events or [], key=lambda e: e[0])
+        self.slept = []
+
+    def wall(self):
+        return self._wall
+
+    def monotonic(self):
+        return self._mono
+
+    def step(self, seconds):
+        self._wall += datetime.timedelta(seconds=seconds)
+
+    def sleep(self, seconds):
+        # sleep mengikuti jam monotonic; step() di tengahnya hanya menggeser jam dinding
+        remaining = max(seconds, 0)
+        self.slept.append(remaining)
+        while self.events and (self.events[0][0] - self._wall).total_seconds() <= remaining:
+            when, action = self.events.pop(0)
+            gap = max((when - self._wall).total_seconds(), 0)
+            self._advance(gap)
+            remaining -= gap
+            action(self)
+        self._advance(remaining)
+        if self.until is not None and self._wall >= self.until:
+            raise SimulationEnd()
+
+    def _advance(self, seconds):
+        self._wall += datetime.timedelta(seconds=seconds)
+        self._mono += seconds
+
+
+class ClockAnchor:
+    """Jam dinding terkoreksi yang diturunkan dari jam monotonic."""
+
+    def __init__(self, clock, offset=0.0):
+        self.clock = clock
+        self.rebase(offset)
+
+    def rebase(self, offset):
+        self.offset = offset
+        self._mono = self.clock.monotonic()
+        self._wall = self.clock.wall() + datetime.timedelta(seconds=offset)
+
+    def now(self):
+        elapsed = self.clock.monotonic() - self._mono
+        return self._wall + datetime.timedelta(seconds=elapsed)
+
+    def check(self, offset):
+        """Bandingkan jam dinding (+ `offset`) dengan prediksi monotonic,
+        lalu rebase. Return selisihnya dalam detik (+ = jam maju)."""
+        predicted = self.now()
+        actual = self.clock.wall() + datetime.timedelta(seconds=offset)
+        jump = (actual - predicted).total_seconds()
+        # Selalu rebase: slew kecil (adjtime) tidak menumpuk jadi lompatan palsu
+        self.rebase(offset)
+        return jump
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""Server-sent events (SSE) dari scheduler play_bell.py --daemon.
+
+Satu thread dengan `selectors` melayani semua viewer: socket non-blocking,
+setiap klien hanya punya buffer keluaran. Dashboard mengambil token
+berumur pendek dari app.py (/events/token, butuh login PIN) lalu membuka
+
+    new EventSource("http://<host>:<event_port>/events?token=<token>")
+
+langsung ke hub ini, tanpa menahan thread web server. Token ditandatangani
+HMAC dengan setting `event_secret` yang dibaca app.py dan scheduler dari
+bell.db. Stream diputus saat token kedaluwarsa; dashboard lalu meminta
+token baru (gagal jika sesinya sudah berakhir). CORS hanya diizinkan untuk
+halaman dari host yang sama (port dashboard berbeda).
+
+dan menerima event:
+
+  status   jadwal berikutnya, offset efektif, jam server (setiap perubahan
+           dan setiap HEARTBEAT detik)
+  fired    bell masuk antrian putar
+  playing  player mulai memutar
+  skipped  bell tidak dibunyikan (sudah bunyi / terlewat)
+  error    kegagalan DB, audio, atau player
+
+Klien baru langsung menerima status terakhir dan RECENT event terakhir
+(atau hanya yang setelah Last-Event-ID saat reconnect). Klien yang terlalu
+lambat membaca (buffer > MAX_BUFFER) diputus; EventSource akan reconnect.
+"""
+import collections
+import datetime
+import hashlib
+import hmac
+import json
+import secrets
+import selectors
+import socket
+import threading
+import time
+import urllib.parse
+
+# ================= CONFIG =================
+DEFAULT_PORT = 5001
+MAX_CLIENTS = 64
+MAX_BUFFER = 256 * 1024  # byte antrian keluaran per klien
+MAX_REQUEST = 8192
+REQUEST_TIMEOUT = 10  # detik untuk mengirim header request
+HEARTBEAT = 15
+RECENT = 20
+RETRY_MS = 3000
+
+# ================= TOKEN =================
+
+
+def ensure_secret(conn):
+    """Kunci HMAC token event stream (setting event_secret), dibuat jika belum ada."""
+    row = conn.execute("SELECT value FROM settings WHERE key='event_secret'").fetchone()
+    if row and row[0]:
+        return row[0]
+    secret = secrets.token_hex(32)
+    conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('event_secret', ?)",
+                 (secret,))
+    conn.commit()
+    return secret
+
+
+def _sign(secret, expires):
+    return hmac.new(secret.encode(), str(expires).encode(), hashlib.sha256).hexdigest()
+
+
+def make_token(secret, ttl):
+    """Token '<expires>.<hmac>' yang berlaku `ttl` detik."""
+    expires = int(time.time() + ttl)
+    return f"{expires}.{_sign(secret, expires)}"
+
+
+def check_token(secret, token):
+    """Return waktu kedaluwarsa (unix) jika token sah dan belum lewat, selain itu None."""
+    expires, _, sig = (token or "").partition(".")
+    if not secret or not expires.isdigit():
+        return None
+    if not hmac.compare_digest(sig, _sign(secret, int(expires))):
+        return None
+    return int(expires) if int(expires) > time.time() else None
+
+# ================= FORMAT =================
+
+
+def format_event(event_id, event, data):
+    payload = json.dumps(data, default=str, separators=(",", ":"))
+    return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n".encode()
+
+
+def _http_response(status, headers, body=b""):
+    lines = [f"HTTP/1.1 {status}"] + [f"{k}: {v}" for k, v in headers]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode() + body
+
+
+class _Client:
+    __slots__ = ("sock", "inbuf", "outbuf", "streaming", "opened", "expires")
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.inbuf = b""
+        self.outbuf = bytearray()
+        self.streaming = False
+        self.opened = time.monotonic()
+        self.expires = None  # unix, dari token
+
+# ================= HUB =================
+
+
+class EventHub:
+    """Server SSE berbasis selector. publish() aman dipanggil dari thread mana pun.
+
+    `secret` (lihat ensure_secret) boleh diganti kapan saja, mis. setelah
+    bell.db di-restore."""
+
+    def __init__(self, host="0.0.0.0", port=DEFAULT_PORT, log=print, secret=None):
+        self.host = host
+        self.port = port
+        self.log = log
+        self.secret = secret
+        self._sel = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._pending = collections.deque()
+        self._recent = collections.deque(maxlen=RECENT)
+        self._status = None
+        self._next_id = 1
+        self._clients = {}
+        self._listener = None
+        self._thread = None
+        # socketpair membangunkan select() saat ada event baru
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+
+    # ---------------- API ----------------
+
+    def start(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(16)
+        sock.setblocking(False)
+        self.port = sock.getsockname()[1]
+        self._listener = sock
+        self._sel.register(sock, selectors.EVENT_READ, "accept")
+        self._sel.register(self._wake_r, selectors.EVENT_READ, "wake")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def publish(self, event, **data):
+        """Kirim event ke semua viewer. Event "status" juga disimpan untuk klien baru."""
+        data.setdefault("ts", datetime.datetime.now().isoformat(timespec="milliseconds"))
+        with self._lock:
+            message = format_event(self._next_id, event, data)
+            if event == "status":
+                self._status = (self._next_id, message)
+            else:
+                self._recent.append((self._next_id, message))
+            self._next_id += 1
+            self._pending.append(message)
+        try:
+            self._wake_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass  # buffer wake penuh: loop memang sudah akan bangun
+
+    def client_count(self):
+        with self._lock:
+            return sum(1 for c in self._clients.values() if c.streaming)
+
+    # ---------------- loop ----------------
+
+    def _run(self):
+        last_beat = time.monotonic()
+        while True:
+            for key, mask in self._sel.select(timeout=1.0):
+                if key.data == "accept":
+                    self._accept()
+                elif key.data == "wake":
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                else:
+                    client = key.data
+                    if mask & selectors.EVENT_READ:
+                        self._read(client)
+                    if mask & selectors.EVENT_WRITE and client.sock.fileno() != -1:
+                        self._flush(client)
+
+            with self._lock:
+                messages = list(self._pending)
+                self._pending.clear()
+            for message in messages:
+                self._broadcast(message)
+
+            now = time.monotonic()
+            if now - last_beat >= HEARTBEAT:
+                # Komentar SSE: menjaga koneksi tetap hidup melewati proxy/NAT
+                self._broadcast(b": ping\n\n")
+                last_beat = now
+            wall = time.time()
+            for client in list(self._clients.values()):
+                if not client.streaming and now - client.opened > REQUEST_TIMEOUT:
+                    self._drop(client)
+                elif client.streaming and client.expires is not None and wall >= client.expires:
+                    self._drop(client)  # token habis: EventSource reconnect, token dicek ulang
+
+    def _accept(self):
+        try:
+            sock, _ = self._listener.accept()
+        except (BlockingIOError, OSError):
+            return
+        if len(self._clients) >= MAX_CLIENTS:
+            sock.close()
+            return
+        sock.setblocking(False)
+        client = _Client(sock)
+        with self._lock:
+            self._clients[sock.fileno()] = client
+        self._sel.register(sock, selectors.EVENT_READ, client)
+
+    def _read(self, client):
+        try:
+            data = client.sock.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(client)
+            return
+        if client.streaming:
+            return  # klien SSE tidak mengirim apa-apa lagi; abaikan
+        client.inbuf += data
+        if b"\r\n\r\n" not in client.inbuf:
+            if len(client.inbuf) > MAX_REQUEST:
+                self._drop(client)
+            return
+        self._handle_request(client)
+
+    def _handle_request(self, client):
+        head = client.inbuf.split(b"\r\n\r\n", 1)[0].decode("latin-1")
+        lines = head.split("\r\n")
+        parts = lines[0].split()
+        headers = {}
+        for line in lines[1:]:
+            k, _, v = line.partition(":")
+            headers[k.strip().lower()] = v.strip()
+
+        cors = []
+        origin = headers.get("origin")
+        host = headers.get("host", "").rsplit(":", 1)[0].strip("[]")
+        if origin and urllib.parse.urlsplit(origin).hostname == host:
+            # Dashboard di host yang sama (port app.py) boleh membaca stream
+            cors = [("Access-Control-Allow-Origin", origin), ("Vary", "Origin")]
+
+        if len(parts) < 2 or parts[0] != "GET" or parts[1].split("?")[0] != "/events":
+            self._reject(client, "404 Not Found", b"Not found\n", cors)
+            return
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(parts[1]).query)
+        client.expires = check_token(self.secret, query.get("token", [""])[0])
+        if client.expires is None:
+            self._reject(client, "401 Unauthorized", b"Token tidak sah\n", cors)
+            return
+
+        try:
+            last_id = int(headers.get("last-event-id", "0"))
+        except ValueError:
+            last_id = 0
+
+        client.outbuf += _http_response("200 OK", cors + [
+            ("Content-Type", "text/event-stream"),
+            ("Cache-Control", "no-cache"),
+            ("Connection", "keep-alive"),
+            ("X-Accel-Buffering", "no"),
+        ])
+        client.outbuf += f"retry: {RETRY_MS}\n\n".encode()
+        with self._lock:
+            if self._status:
+                client.outbuf += self._status[1]
+            for event_id, message in self._recent:
+                if event_id > last_id:
+                    client.outbuf += message
+            client.streaming = True
+        self._flush(client)
+
+    def _reject(self, client, status, body, cors):
+        client.outbuf += _http_response(
+            status, cors + [("Content-Type", "text/plain"), ("Content-Length", len(body)),
+                            ("Connection", "close")], body)
+        client.streaming = None  # tutup setelah terkirim
+        self._flush(client)
+
+    def _broadcast(self, message):
+        for client in list(self._clients.values()):
+            if client.streaming:
+                client.outbuf += message
+                if len(client.outbuf) > MAX_BUFFER:
+                    self._drop(client)
+                else:
+                    self._flush(client)
+
+    def _flush(self, client):
+        try:
+            while client.outbuf:
+                sent = client.sock.send(client.outbuf)
+                del client.outbuf[:sent]
+        except BlockingIOError:
+            pass
+        except OSError:
+            self._drop(client)
+            return
+
+        if not client.outbuf and client.streaming is None:
+            self._drop(client)
+            return
+        events = selectors.EVENT_READ
+        if client.outbuf:
+            events |= selectors.EVENT_WRITE
+        try:
+            self._sel.modify(client.sock, events, client)
+        except (KeyError, ValueError):
+            pass
+
+    def _drop(self, client):
+        with self._lock:
+            self._clients.pop(client.sock.fileno(), None)
+        try:
+            self._sel.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        client.sock.close()
@@ -0,0 +1,55 @@
+"""Konfigurasi gunicorn untuk app.py (mode produksi).
+
+    python3 -m gunicorn -c gunicorn_conf.py app:app
+
+Dipakai oleh bell.service (lihat install.sh). Reload halus: kirim SIGHUP ke
+proses master (`systemctl reload bell`); worker lama menyelesaikan request
+yang sedang berjalan sebelum diganti.
+
+Environment:
+  BELL_BIND     alamat listen (default 0.0.0.0:5000)
+  BELL_WORKERS  jumlah proses worker (default 1)
+  BELL_THREADS  thread per worker (default 8)
+  BELL_TIMEOUT  detik sebelum worker yang macet di-restart (default 120)
+
+`timeout` pada worker gthread hanyalah heartbeat proses worker: thread
+yang melayani request lama (mis. unduhan backup) tidak diputus
+olehnya. Batas per request dipasang di route yang bisa berjalan lama:
+/backup_system (BELL_STREAM_TIMEOUT, app.py), dan unduhan update berjalan
+di thread updater dengan timeout socket sendiri. Event stream dashboard
+tidak melewati gunicorn: browser terhubung langsung ke hub SSE scheduler
+(events.py), app.py hanya menerbitkan token lewat /events/token.
+
+Cache settings/device dan service background (NTP, cek update, hotplug)
+hidup per proses, jadi BELL_WORKERS sebaiknya tetap 1 dan konkurensi
+ditambah lewat BELL_THREADS.
+"""
+import os
+
+bind = os.environ.get("BELL_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("BELL_WORKERS", "1"))
+worker_class = "gthread"
+threads = int(os.environ.get("BELL_THREADS", "8"))
+timeout = int(os.environ.get("BELL_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+accesslog = None
+errorlog = "-"
+loglevel = "info"
+
+
+def on_starting(server):
+    # Update yang terputus di tengah penukaran file: kembalikan versi lama
+    # sebelum worker mengimport modul aplikasi
+    import updater
+    if updater.recover():
+        server.log.warning("Update tidak selesai, file lama dikembalikan")
+    os.environ["BELL_SERVER"] = "gunicorn"
+
+
+def post_worker_init(worker):
+    import app
+    app.init_db()
+    app.start_background_services()
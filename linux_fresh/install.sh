@@ -11,9 +11,9 @@ echo "Step 1: Mengunduh dependensi sistem..."
 sudo apt update
 sudo apt install -y python3 python3-pip sqlite3 mpg123 alsa-utils ffmpeg
 
-# 2. Install Flask
+# 2. Install Flask + gunicorn (server produksi)
 echo "Step 2: Menginstall library Python..."
-pip3 install flask --break-system-packages 2>/dev/null || pip3 install flask
+pip3 install flask gunicorn --break-system-packages 2>/dev/null || pip3 install flask gunicorn
 
 # 3. Setup Permissions
 echo "Step 3: Mengatur hak akses..."
@@ -44,16 +44,13 @@ else
     echo "Database bell.db sudah ada, melewati pembuatan."
 fi
 
-# 5. Setup Auto-start (Cron)
-echo "Step 5: Mendaftarkan jadwal ke crontab..."
+# 5. Create Systemd Service (Linux only)
+echo "Step 5: Mencoba membuat service systemd (bell.service & bell-player.service)..."
 PWD=$(pwd)
-(crontab -l 2>/dev/null | grep -v "play_bell.py" ; echo "* * * * * python3 $PWD/play_bell.py >> $PWD/bell.log 2>&1") | crontab -
-
-# 6. Create Systemd Service (Linux only)
-echo "Step 6: Mencoba membuat service systemd (bell.service)..."
 if [ -d /etc/systemd/system ]; then
     CURRENT_USER=$(whoami)
     SERVICE_FILE="/etc/systemd/system/bell.service"
+    PLAYER_FILE="/etc/systemd/system/bell-player.service"
     
     sudo bash -c "cat > $SERVICE_FILE" <<EOF
 [Unit]
@@ -63,19 +60,50 @@ After=network.target
 [Service]
 User=$CURRENT_USER
 WorkingDirectory=$PWD
-ExecStart=/usr/bin/python3 $PWD/app.py
+# Jumlah worker/thread dan timeout: lihat gunicorn_conf.py
+Environment=BELL_WORKERS=1 BELL_THREADS=8 BELL_TIMEOUT=120
+ExecStart=/usr/bin/python3 -m gunicorn -c $PWD/gunicorn_conf.py app:app
+# Reload halus (systemctl reload bell): worker diganti setelah request selesai
+ExecReload=/bin/kill -s HUP \$MAINPID
+KillMode=mixed
+TimeoutStopSec=35
+Restart=always
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+    # Scheduler resident: tidur sampai menit bell berikutnya (pengganti cron)
+    sudo bash -c "cat > $PLAYER_FILE" <<EOF
+[Unit]
+Description=Bell Otomatis Scheduler
+After=sound.target bell.service
+
+[Service]
+User=$CURRENT_USER
+WorkingDirectory=$PWD
+ExecStart=/usr/bin/python3 $PWD/play_bell.py --daemon
 Restart=always
+RestartSec=2
 
 [Install]
 WantedBy=multi-user.target
 EOF
     
     sudo systemctl daemon-reload
-    sudo systemctl enable bell
-    sudo systemctl start bell
-    echo "Service 'bell.service' berhasil dibuat dan dijalankan."
+    sudo systemctl enable bell bell-player
+    sudo systemctl start bell bell-player
+    echo "Service 'bell.service' dan 'bell-player.service' berhasil dibuat dan dijalankan."
+
+    # 6. Hapus jadwal cron lama (sudah digantikan bell-player.service)
+    echo "Step 6: Menghapus jadwal cron lama play_bell.py..."
+    (crontab -l 2>/dev/null | grep -v "play_bell.py") | crontab -
 else
     echo "Systemd tidak ditemukan, melewati pembuatan service."
+
+    # 6. Fallback: Auto-start via Cron (satu proses per menit)
+    echo "Step 6: Mendaftarkan jadwal ke crontab..."
+    (crontab -l 2>/dev/null | grep -v "play_bell.py" ; echo "* * * * * python3 $PWD/play_bell.py >> $PWD/bell.log 2>&1") | crontab -
 fi
 
 # 7. Set Permissions (Fix Permission Issues for Service/www)
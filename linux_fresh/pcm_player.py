@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""Preload PCM untuk mode daemon play_bell.py.
+
+Suara yang dipakai profil aktif di-decode sekali (ffmpeg) menjadi PCM mentah
+s16le 44.1 kHz stereo di static/sounds/.cache/pcm/, lalu di-mmap. Saat jam
+bunyi, buffer langsung ditulis ke satu proses `aplay` yang sudah dibuka
+beberapa detik sebelumnya, sehingga tidak ada decode/buka device lagi.
+
+Untuk bell multi-zona, SinkPool menulis buffer yang sama ke beberapa sink.
+Chunk pertama ditulis ke semua sink berturut-turut dari satu thread (pipe
+aplay masih kosong, jadi tidak pernah blocking), baru sisanya dialirkan
+oleh satu thread per device. Awal bunyi antar zona hanya selisih waktu
+beberapa write() ke pipe, bukan jadwal thread. Device "file:/path/out.raw"
+menulis PCM ke file alih-alih aplay (untuk pengujian tanpa soundcard;
+"null" memakai ALSA null device).
+"""
+import mmap
+import os
+import subprocess
+import threading
+import time
+
+import audio_cache
+
+# ================= CONFIG =================
+RATE = 44100
+CHANNELS = 2
+SAMPLE_BYTES = 2  # S16_LE
+FRAME_BYTES = CHANNELS * SAMPLE_BYTES
+CHUNK_BYTES = FRAME_BYTES * (RATE // 10)  # 100 ms per write
+
+PCM_DIR = audio_cache.PCM_DIR
+
+# ================= DECODE =================
+
+
+def decode(path):
+    """Decode `path` ke file PCM mentah di cache. Return path PCM atau None.
+
+    File PCM ikut eviksi LRU audio_cache.evict(); buffer yang sudah di-mmap
+    tetap valid walau filenya dihapus."""
+    os.makedirs(PCM_DIR, exist_ok=True)
+    pcm_path = os.path.join(PCM_DIR, f"{audio_cache.file_hash(path)}.s16le")
+    if os.path.isfile(pcm_path):
+        os.utime(pcm_path)  # tandai baru dipakai (LRU)
+        return pcm_path
+
+    tmp_path = f"{pcm_path}.{os.getpid()}.tmp"
+    cmd = [
+        "ffmpeg", "-y", "-i", path,
+        "-f", "s16le", "-acodec", "pcm_s16le",
+        "-ac", str(CHANNELS), "-ar", str(RATE),
+        tmp_path
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=120)
+        if result.returncode != 0:
+            return None
+        os.replace(tmp_path, pcm_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    audio_cache.evict()
+    return pcm_path
+
+
+def mix(paths):
+    """Campur beberapa file (ffmpeg amix) menjadi PCM mentah di memori.
+    Return bytes atau None jika ffmpeg gagal."""
+    n = len(paths)
+    cmd = ["ffmpeg", "-loglevel", "error"]
+    for path in paths:
+        cmd += ["-i", path]
+    # amix membagi volume dengan jumlah input; volume=n mengembalikannya
+    cmd += ["-filter_complex", f"amix=inputs={n}:duration=longest:dropout_transition=0,volume={n}",
+            "-f", "s16le", "-acodec", "pcm_s16le",
+            "-ac", str(CHANNELS), "-ar", str(RATE), "-"]
+    result = subprocess.run(cmd, capture_output=True, timeout=120)
+    if result.returncode != 0:
+        return None
+    return result.stdout
+
+
+def load(pcm_path):
+    """mmap file PCM (read-only) dan minta kernel memuatnya ke page cache."""
+    with open(pcm_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(buf, "madvise") and hasattr(mmap, "MADV_WILLNEED"):
+        buf.madvise(mmap.MADV_WILLNEED)
+    return buf
+
+# ================= BANK =================
+
+
+class PcmBank:
+    """Kumpulan buffer PCM ter-mmap, dikunci per path file sumber."""
+
+    def __init__(self):
+        self._buffers = {}  # path -> ((mtime, size), buffer)
+
+    def preload(self, paths, prune=True):
+        """Pastikan semua `paths` sudah ter-decode. Jika `prune`, buffer lain
+        yang tidak lagi dipakai dilepas. Return daftar path yang gagal."""
+        wanted = set(paths)
+        errors = []
+        for path in wanted:
+            try:
+                st = os.stat(path)
+                stamp = (st.st_mtime_ns, st.st_size)
+                current = self._buffers.get(path)
+                if current and current[0] == stamp:
+                    continue
+                pcm_path = decode(path)
+                if pcm_path is None:
+                    errors.append(path)
+                    continue
+                self._drop(path)
+                self._buffers[path] = (stamp, load(pcm_path))
+            except Exception:
+                errors.append(path)
+
+        if prune:
+            for path in list(self._buffers):
+                if path not in wanted:
+                    self._drop(path)
+        return errors
+
+    def get(self, path):
+        entry = self._buffers.get(path)
+        return entry[1] if entry else None
+
+    def _drop(self, path):
+        entry = self._buffers.pop(path, None)
+        if entry and hasattr(entry[1], "close"):
+            try:
+                entry[1].close()
+            except BufferError:
+                pass  # masih diputar; dilepas oleh GC setelah selesai
+
+# ================= SINK =================
+
+
+class AplaySink:
+    """Satu proses `aplay` long-lived yang menerima PCM mentah lewat stdin."""
+
+    def __init__(self, device):
+        self.device = device
+        self.proc = None
+        self.lock = threading.Lock()
+
+    def is_open(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def open(self):
+        if self.is_open():
+            return
+        self.proc = subprocess.Popen(
+            ["aplay", "-q", "-D", self.device, "-t", "raw", "-f", "S16_LE",
+             "-r", str(RATE), "-c", str(CHANNELS)],
+            stdin=subprocess.PIPE
+        )
+
+    def prime(self, buf):
+        """Tulis chunk pertama `buf` saja (tidak blocking pada pipe kosong).
+        Return jumlah byte yang ditulis; sisanya lewat write(buf, start=...)."""
+        with self.lock:
+            self.open()
+            self.proc.stdin.write(memoryview(buf)[:CHUNK_BYTES])
+            self.proc.stdin.flush()
+            return min(len(buf), CHUNK_BYTES)
+
+    def write(self, buf, on_first_write=None, start=0):
+        """Tulis `buf` mulai byte `start` (blocking, real-time).
+        `on_first_write` dipanggil dengan time.monotonic() tepat setelah
+        chunk pertama ditulis."""
+        with self.lock:
+            self.open()
+            view = memoryview(buf)
+            for pos in range(start, len(view), CHUNK_BYTES):
+                self.proc.stdin.write(view[pos:pos + CHUNK_BYTES])
+                if pos == start:
+                    self.proc.stdin.flush()
+                    if on_first_write:
+                        on_first_write(time.monotonic())
+            self.proc.stdin.flush()
+
+    def close(self):
+        """Tutup stdin (aplay menghabiskan sisa buffer) lalu lepas device."""
+        with self.lock:
+            if self.proc is None:
+                return
+            try:
+                self.proc.stdin.close()
+                self.proc.wait(timeout=10)
+            except Exception:
+                self.proc.kill()
+            self.proc = None
+
+
+class FileSink:
+    """Sink uji: PCM mentah ditulis ke file (tanpa pacing real-time).
+    open() membuat/mengosongkan file; setiap pemutaran menimpa isinya."""
+
+    def __init__(self, device):
+        self.device = device
+        self.path = device[len("file:"):]
+        self.out = None
+        self.lock = threading.Lock()
+
+    def is_open(self):
+        return self.out is not None
+
+    def open(self):
+        if self.out is None:
+            self.out = open(self.path, "wb")
+
+    def prime(self, buf):
+        with self.lock:
+            self.open()
+            self.out.write(memoryview(buf)[:CHUNK_BYTES])
+            self.out.flush()
+            return min(len(buf), CHUNK_BYTES)
+
+    def write(self, buf, on_first_write=None, start=0):
+        with self.lock:
+            self.open()
+            view = memoryview(buf)
+            for pos in range(start, len(view), CHUNK_BYTES):
+                self.out.write(view[pos:pos + CHUNK_BYTES])
+                if pos == start:
+                    self.out.flush()
+                    if on_first_write:
+                        on_first_write(time.monotonic())
+            self.out.close()
+            self.out = None
+
+    def close(self):
+        with self.lock:
+            if self.out is not None:
+                self.out.close()
+                self.out = None
+
+
+def make_sink(device):
+    if device.startswith("file:"):
+        return FileSink(device)
+    return AplaySink(device)
+
+# ================= FAN-OUT =================
+
+
+class SinkPool:
+    """Satu sink long-lived per device; write() memutar ke beberapa device
+    sekaligus dengan awal yang diselaraskan."""
+
+    def __init__(self, factory=make_sink):
+        self.factory = factory
+        self.sinks = {}
+
+    def get(self, device):
+        sink = self.sinks.get(device)
+        if sink is None:
+            sink = self.sinks[device] = self.factory(device)
+        return sink
+
+    def open(self, devices):
+        """Buka semua device lebih awal. Return {device: exception} yang gagal."""
+        errors = {}
+        for device in devices:
+            try:
+                self.get(device).open()
+            except Exception as e:
+                errors[device] = e
+        return errors
+
+    def write(self, targets, on_first_write=None):
+        """Putar `targets` [(device, buffer), ...] bersamaan (blocking sampai
+        semua selesai). `on_first_write` dipanggil sekali setelah semua zona
+        mulai. Return (starts {device: time.monotonic() awal bunyi},
+        errors {device: exception})."""
+        starts, errors = {}, {}
+        if len(targets) == 1:
+            device, buf = targets[0]
+
+            def started(at):
+                starts[device] = at
+                if on_first_write:
+                    on_first_write(at)
+            try:
+                self.get(device).write(buf, started)
+            except Exception as e:
+                errors[device] = e
+            return starts, errors
+
+        # Fase 1: buka semua device (biasanya sudah dibuka lebih awal), lalu
+        # chunk pertama ke semua device berturut-turut
+        errors.update(self.open(device for device, _ in targets))
+        primed = []
+        for device, buf in targets:
+            if device in errors:
+                continue
+            try:
+                sent = self.get(device).prime(buf)
+            except Exception as e:
+                errors[device] = e
+                continue
+            starts[device] = time.monotonic()
+            primed.append((device, buf, sent))
+        if on_first_write and starts:
+            on_first_write(min(starts.values()))
+
+        # Fase 2: sisa buffer per device, paralel (device lambat tidak
+        # menahan device lain)
+        def play(device, buf, sent):
+            try:
+                self.get(device).write(buf, start=sent)
+            except Exception as e:
+                errors[device] = e
+
+        threads = [threading.Thread(target=play, args=item, daemon=True)
+                   for item in primed]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return starts, errors
+
+    def close(self):
+        """Lepas semua device (aplay menghabiskan sisa buffer dulu)."""
+        for sink in self.sinks.values():
+            sink.close()
+        self.sinks.clear()
@@ -2,28 +2,51 @@
 import sqlite3
 import datetime
 import os
-import subprocess
+import shutil
 import sys
-import time
+
+import audio_cache
+from clock import ClockAnchor, SystemClock, JUMP_THRESHOLD
+import events
+import pcm_player
+import playback
+import playlist
+import sound_library
+import zones
 
 # ================= CONFIG =================
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB = os.path.join(BASE_DIR, "bell.db")
-SOUND_DIR = os.path.join(BASE_DIR, "static/sounds")
+DATA_DIR = os.environ.get("BELL_DATA_DIR", BASE_DIR)
+DB = os.path.join(DATA_DIR, "bell.db")
+SOUND_DIR = os.path.join(DATA_DIR, "static/sounds")
 
 # OS detection
 IS_WINDOWS = os.name == 'nt'
 
 if IS_WINDOWS:
-    LOCK_DIR = os.path.join(BASE_DIR, "locks")
+    LEGACY_LOCK_DIR = os.path.join(BASE_DIR, "locks")
     LOG_FILE = os.path.join(BASE_DIR, "bell.log")
 else:
-    LOCK_DIR = "/tmp/bell_lock"
+    LEGACY_LOCK_DIR = "/tmp/bell_lock"
     LOG_FILE = "/tmp/bell.log"
     AUDIO_HW = "hw:1,0"
 
-# ================= INIT =================
-os.makedirs(LOCK_DIR, exist_ok=True)
+# Mode daemon: cek perubahan DB (PRAGMA data_version) setiap N detik
+POLL_INTERVAL = 5
+
+# Riwayat bunyi (bell_fired) disimpan N hari; bunyi terakhir tiap bell selalu dipertahankan
+FIRED_RETENTION_DAYS = 30
+
+# Bell yang terlambat <= N detik tetap dibunyikan seperti biasa; yang lebih
+# lama (jam melompat maju, suspend) mengikuti missed_bell_policy
+LATE_TOLERANCE = 10
+MISSED_POLICIES = ("skip", "latest", "all")
+
+# Event "status" dikirim ulang minimal tiap N detik walau jadwal tidak berubah
+STATUS_REFRESH = 60
+
+DAYS = ["Monday", "Tuesday", "Wednesday",
+        "Thursday", "Friday", "Saturday", "Sunday"]
 
 # waktu sekarang (will be adjusted by offset once DB is ready)
 
@@ -44,7 +67,55 @@ def log(msg):
         print(f"LOG ERROR: {e}", file=sys.stderr)
 
 
-# Script started
+# Hub SSE (events.EventHub), hanya aktif di mode daemon
+event_hub = None
+
+
+def notify(event, **data):
+    if event_hub is not None:
+        event_hub.publish(event, **data)
+
+
+def start_event_hub(conn):
+    """Jalankan server SSE di port BELL_EVENT_PORT / setting event_port (0 = mati)."""
+    global event_hub
+    try:
+        port = int(os.environ.get("BELL_EVENT_PORT")
+                   or get_setting(conn.cursor(), 'event_port', str(events.DEFAULT_PORT)))
+    except (ValueError, sqlite3.Error) as e:
+        log(f"Event stream config error: {e}")
+        port = events.DEFAULT_PORT
+    if port <= 0:
+        return None
+    try:
+        secret = events.ensure_secret(conn)
+    except sqlite3.Error as e:
+        log(f"Event stream disabled: {e}")
+        return None
+    hub = events.EventHub(port=port, log=log, secret=secret)
+    try:
+        hub.start()
+    except OSError as e:
+        log(f"Event stream disabled: {e}")
+        return None
+    event_hub = hub
+    log(f"Event stream listening on port {hub.port}")
+    return hub
+
+
+def publish_status(now, upcoming, settings, jump=0.0, note=None):
+    next_bell = None
+    if upcoming is not None:
+        fire_at, rows = upcoming
+        next_bell = {
+            "at": fire_at.isoformat(),
+            "bells": [r[0] for r in rows],
+            "sounds": [r[1] for r in rows],
+        }
+    notify("status", now=now.isoformat(timespec="milliseconds"),
+           offset=settings['time_offset'], next=next_bell,
+           jump=round(jump, 3), policy=settings['missed_bell_policy'], note=note)
+
 
 # ================= DB HELPER =================
 
@@ -54,97 +125,479 @@ def get_setting(cursor, key, default=None):
     row = cursor.fetchone()
     return row[0] if row else default
 
+
+def hari_to_mask(hari):
+    """Ubah daftar hari ('Monday,Friday' atau list) menjadi bitmask.
+
+    Bit 0 = Monday ... bit 6 = Sunday, sama dengan datetime.weekday().
+    """
+    if isinstance(hari, str):
+        hari = hari.split(",")
+    mask = 0
+    for h in hari or []:
+        h = h.strip()
+        if h in DAYS:
+            mask |= 1 << DAYS.index(h)
+    return mask
+
+
+def migrate_schema(conn):
+    """Migrasi tabel bell (hari_mask, prioritas, zones, index), tabel ledger
+    bell_fired, tabel calendar_exceptions dan tabel zones."""
+    cols = [row[1] for row in conn.execute("PRAGMA table_info(bell)")]
+    if "hari_mask" not in cols:
+        conn.execute("ALTER TABLE bell ADD COLUMN hari_mask INTEGER DEFAULT 0")
+        rows = conn.execute("SELECT id, hari FROM bell").fetchall()
+        conn.executemany(
+            "UPDATE bell SET hari_mask=? WHERE id=?",
+            [(hari_to_mask(hari), bell_id) for bell_id, hari in rows]
+        )
+    if "prioritas" not in cols:
+        # Makin besar makin didahulukan saat beberapa bell bunyi bersamaan
+        conn.execute("ALTER TABLE bell ADD COLUMN prioritas INTEGER DEFAULT 0")
+    # Zona tujuan ("1,3"); NULL = ikut profil, lalu audio_output (lihat zones.py)
+    if "zones" not in cols:
+        conn.execute("ALTER TABLE bell ADD COLUMN zones TEXT")
+    if "zones" not in [row[1] for row in conn.execute("PRAGMA table_info(profiles)")]:
+        conn.execute("ALTER TABLE profiles ADD COLUMN zones TEXT")
+    zones.ensure_table(conn)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_bell_profile_aktif_jam "
+        "ON bell (profile_id, aktif, jam)")
+
+    # Ledger bunyi: satu baris per (bell, menit) -> dedup cukup satu INSERT
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bell_fired (
+            bell_id INTEGER NOT NULL,
+            menit TEXT NOT NULL,
+            fired_at TEXT NOT NULL,
+            PRIMARY KEY (bell_id, menit)
+        ) WITHOUT ROWID
+    """)
+    # Libur / override profil per tanggal (lihat playlist.py)
+    playlist.ensure_table(conn)
+    conn.commit()
+
+
+def load_settings(cursor):
+    return {
+        'audio_output': get_setting(cursor, 'audio_output', 'hw:1,0'),
+        'time_offset': float(get_setting(cursor, 'time_offset', '0')),
+        'normalize_volume': get_setting(cursor, 'normalize_volume', '0') == '1',
+        'target_db': get_setting(cursor, 'target_db', '-14'),
+        'preload_audio': get_setting(cursor, 'preload_audio', '0') == '1' and not IS_WINDOWS,
+        'playback_mode': get_setting(cursor, 'playback_mode', 'sequential'),
+        'missed_bell_policy': get_setting(cursor, 'missed_bell_policy', 'latest'),
+        'missed_bell_grace': int(get_setting(cursor, 'missed_bell_grace', '300')),
+        'zones': zones.load(cursor),
+    }
+
+
+def load_schedule(conn):
+    """Baca pengaturan dan seluruh jadwal aktif milik profil yang aktif."""
+    cursor = conn.cursor()
+    settings = load_settings(cursor)
+
+    cursor.execute("""
+        SELECT b.id, b.jam, b.hari_mask, b.suara, COALESCE(b.prioritas, 0)
+        FROM bell b
+        WHERE b.profile_id IN (SELECT id FROM profiles WHERE is_active=1)
+          AND b.aktif=1
+        ORDER BY b.jam
+    """)
+    return settings, cursor.fetchall()
+
 # ================= AUDIO HELPER =================
 
 
-def play_sound(path, audio_output):
-    if not os.path.isfile(path):
-        log(f"File not found: {path}")
-        return False
+def resolve_sound(suara, settings):
+    """Path file yang diputar: versi ter-normalisasi dari cache jika aktif."""
+    path = os.path.join(SOUND_DIR, suara)
+    if settings['normalize_volume'] and os.path.isfile(path):
+        cached = audio_cache.get_cached(path, settings['target_db'])
+        if cached:
+            return cached
+        log(f"Normalized cache miss for {suara}, playing original")
+    return path
 
+
+def check_sounds(conn, schedule):
+    """Pastikan semua suara yang dipakai jadwal ada dan bisa di-decode."""
+    names = {row[3] for row in schedule}
     try:
-        if IS_WINDOWS:
-            cmd = [
-                "powershell", "-c",
-                f"$m = New-Object System.Windows.Media.MediaPlayer; "
-                f"$m.Open('{path}'); "
-                f"$m.Play(); "
-                f"while($m.Position -lt $m.NaturalDuration.TimeSpan) {{ Start-Sleep -ms 100 }}"
-            ]
-            subprocess.Popen(cmd, creationflags=subprocess.CREATE_NO_WINDOW if hasattr(
-                subprocess, 'CREATE_NO_WINDOW') else 0)
-        else:
-            if path.lower().endswith(".wav"):
-                subprocess.Popen(["aplay", "-D", audio_output, path])
-            else:
-                subprocess.Popen(["mpg123", "-a", audio_output, path])
-        return True
+        sound_library.sync(conn, names)
+        for name, reason in sound_library.check_referenced(conn, names):
+            log(f"WARNING: suara '{name}' bermasalah ({reason})")
     except Exception as e:
-        log(f"Error playing sound: {e}")
-        return False
+        log(f"Sound check error: {e}")
 
 
-# ================= DB =================
-try:
-    conn = sqlite3.connect(DB)
-    cursor = conn.cursor()
+# ================= SCHEDULE =================
 
-    # Fetch settings
-    audio_output = get_setting(cursor, 'audio_output', 'hw:1,0')
-    time_offset = int(get_setting(cursor, 'time_offset', '0'))
 
-    # Calculate effective time after getting offset
-    now = get_effective_now(time_offset)
-    jam = now.strftime("%H:%M")
-    hari_en = now.strftime("%A")
-    menit_id = now.strftime("%Y%m%d_%H%M")
+def select_missed(due, now, policy, grace):
+    """Pilih bell terlewat yang tetap dibunyikan.
 
-    log(f"Effective time: {hari_en} {jam} (offset: {time_offset}s)")
+    Bell yang terlambat <= LATE_TOLERANCE detik selalu dibunyikan. Sisanya:
+      skip   : tidak dibunyikan
+      latest : hanya slot terakhir, jika masih dalam `grace` detik
+      all    : semua slot yang masih dalam `grace` detik, urut waktu
+    Return (dibunyikan, dilewati), masing-masing list (fire_at, rows).
+    """
+    if policy not in MISSED_POLICIES:
+        policy = "latest"
+    play, skipped = [], []
+    late = []
+    for fire_at, rows in due:
+        lateness = (now - fire_at).total_seconds()
+        if lateness <= LATE_TOLERANCE:
+            play.append((fire_at, rows))
+        elif lateness <= grace and policy != "skip":
+            late.append((fire_at, rows))
+        else:
+            skipped.append((fire_at, rows))
 
-    cursor.execute("""
-        SELECT b.id, b.hari, b.suara
-        FROM bell b
-        JOIN profiles p ON b.profile_id = p.id
-        WHERE b.jam=? AND b.aktif=1 AND p.is_active=1
-    """, (jam,))
-    rows = cursor.fetchall()
+    if policy == "latest" and late:
+        skipped.extend(late[:-1])
+        late = late[-1:]
+    skipped.sort(key=lambda item: item[0])
+    return sorted(late + play, key=lambda item: item[0]), skipped
+
+
+def data_version(conn):
+    # Berubah setiap kali koneksi lain (app.py) melakukan commit
+    return conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+# ================= FIRE LEDGER =================
+
+
+def claim_fire(conn, bell_id, menit_id, fired_at):
+    """Catat bunyi bell di ledger. False jika menit ini sudah pernah bunyi."""
+    cur = conn.execute(
+        "INSERT OR IGNORE INTO bell_fired (bell_id, menit, fired_at) VALUES (?, ?, ?)",
+        (bell_id, menit_id, fired_at.strftime("%Y-%m-%d %H:%M:%S"))
+    )
+    conn.commit()
+    return cur.rowcount == 1
+
+
+def compact_ledger(conn, today, days=FIRED_RETENTION_DAYS):
+    """Hapus riwayat lebih lama dari `days` hari (kecuali bunyi terakhir tiap
+    bell) dan riwayat milik bell yang sudah dihapus."""
+    cutoff = (today - datetime.timedelta(days=days)).strftime("%Y%m%d")
+    cur = conn.execute("""
+        DELETE FROM bell_fired
+        WHERE menit < ?
+          AND (bell_id, menit) NOT IN (
+              SELECT bell_id, MAX(menit) FROM bell_fired GROUP BY bell_id)
+    """, (cutoff,))
+    removed = cur.rowcount
+    cur = conn.execute(
+        "DELETE FROM bell_fired WHERE bell_id NOT IN (SELECT id FROM bell)")
+    removed += cur.rowcount
+    conn.commit()
+    if removed:
+        log(f"Fire ledger compacted: {removed} rows removed (retention {days} days)")
+
+
+def cleanup_legacy_locks():
+    # Lock file per-bell dari versi lama (sudah digantikan tabel bell_fired)
+    if os.path.isdir(LEGACY_LOCK_DIR):
+        shutil.rmtree(LEGACY_LOCK_DIR, ignore_errors=True)
+        log(f"Removed legacy lock directory {LEGACY_LOCK_DIR}")
+
+
+def ring(conn, rows, when, settings, queue, bank=None, sink=None, now=None):
+    """Masukkan bell untuk menit `when` ke antrian (satu kali per bell per menit).
+
+    `bank`/`sink` (preload PCM) ikut disimpan di setiap Job. `now` adalah
+    waktu bunyi yang dicatat di ledger dan event; daemon mengisinya dari
+    jam scheduler (ClockAnchor), default jam sistem + time_offset."""
+    menit_id = when.strftime("%Y%m%d_%H%M")
+    if now is None:
+        now = get_effective_now(settings['time_offset'])
+    jobs = []
+
+    for bell_id, suara, prioritas, bell_zones in rows:
+        # skip jika sudah bunyi
+        try:
+            if not claim_fire(conn, bell_id, menit_id, now):
+                log(f"Bell {bell_id} already played this minute.")
+                notify("skipped", bells=[bell_id], reason="already_played",
+                       scheduled=when.strftime("%H:%M"))
+                continue
+        except sqlite3.Error as e:
+            log(f"Cannot write fire ledger: {e}")
+            notify("error", source="db", bells=[bell_id], message=str(e))
+            continue
+
+        jobs.append(playback.Job(
+            bell_id=bell_id,
+            path=resolve_sound(suara, settings),
+            priority=prioritas,
+            devices=zones.devices(bell_zones, settings['zones'], settings['audio_output']),
+            when=when,
+            offset=settings['time_offset'],
+            bank=bank,
+            sink=sink,
+        ))
+
+    queue.submit(jobs)
+    if jobs:
+        notify("fired", bells=[job.bell_id for job in jobs],
+               sounds=[os.path.basename(job.path) for job in jobs],
+               scheduled=when.strftime("%H:%M"), offset=settings['time_offset'],
+               at=now.isoformat(sep=" ", timespec="seconds"))
+    return jobs
+
+# ================= RUN (CRON) =================
+
+
+def run_once():
+    conn = sqlite3.connect(DB, timeout=10)
+    jam = None
+    try:
+        migrate_schema(conn)
+        cursor = conn.cursor()
+
+        # Fetch settings
+        settings = load_settings(cursor)
+        time_offset = settings['time_offset']
+
+        # Calculate effective time after getting offset
+        now = get_effective_now(time_offset)
+        jam = now.strftime("%H:%M")
+        hari_en = now.strftime("%A")
+
+        log(f"Effective time: {hari_en} {jam} (offset: {time_offset}s)")
+
+        # Libur / override profil dari calendar_exceptions
+        profile_id, note = playlist.day_plan(conn, now.date())
+        if note:
+            log(f"Calendar: {note}")
+
+        # Filter hari langsung di SQL memakai bitmask + index
+        cursor.execute("""
+            SELECT b.id, b.suara, COALESCE(b.prioritas, 0),
+                   COALESCE(NULLIF(b.zones, ''), p.zones)
+            FROM bell b
+            LEFT JOIN profiles p ON p.id = b.profile_id
+            WHERE b.profile_id=? AND b.aktif=1 AND b.jam=? AND (b.hari_mask & ?) != 0
+        """, (profile_id, jam, 1 << now.weekday()))
+        rows = cursor.fetchall() if profile_id is not None else []
+    except Exception as e:
+        log(f"DB error: {e}")
+        rows = []
+
+    # Kompaksi ledger sekali sehari
+    if jam == "00:00":
+        try:
+            compact_ledger(conn, now.date())
+        except sqlite3.Error as e:
+            log(f"Ledger compaction error: {e}")
+
+    if not rows:
+        log("No bells scheduled for this time.")
+        conn.close()
+        return
+
+    # Tunggu semua bell selesai diputar (proses player di-reap, bukan
+    # fire-and-forget) sebelum proses cron ini keluar
+    queue = playback.PlaybackQueue(log, mode=settings['playback_mode'])
+    ring(conn, rows, now, settings, queue)
     conn.close()
-except Exception as e:
-    log(f"DB error: {e}")
-    rows = []
-    audio_output = 'hw:1,0'
-    # Fallback to system time if DB fails
-    now = datetime.datetime.now()
-    jam = now.strftime("%H:%M")
-    hari_en = now.strftime("%A")
-    menit_id = now.strftime("%Y%m%d_%H%M")
-
-if not rows:
-    log("No bells scheduled for this time.")
-    exit(0)
-
-# ================= PLAY =================
-for bell_id, hari_db, suara in rows:
-    # cek hari
-    if hari_en not in hari_db.split(","):
-        log(f"Bell {bell_id} skipped (hari {hari_en} not in {hari_db})")
-        continue
-
-    lock_file = os.path.join(LOCK_DIR, f"bell_{bell_id}_{menit_id}.lock")
-
-    # skip jika sudah bunyi
-    if os.path.exists(lock_file):
-        log(f"Bell {bell_id} already played this minute.")
-        continue
-
-    # buat lock
+    queue.join()
+
+# ================= RUN (DAEMON) =================
+
+
+def run_daemon(clock=None, queue=None):
+    """Scheduler resident: tidur tepat sampai menit bell berikutnya.
+
+    Playlist harian (playlist.Playlist) dikompilasi sekali per tanggal dan
+    dibuang hanya jika PRAGMA data_version berubah, yaitu setelah app.py
+    menyimpan perubahan (/add, /edit, /toggle, kalender, ...). Saat jam
+    bunyi scheduler hanya membaca entri berikutnya dari playlist.
+
+    Waktu tunggu dihitung dari jam monotonic yang di-anchor ke jam dinding
+    terkoreksi (lihat clock.ClockAnchor). `handled` menandai sampai kapan
+    jadwal sudah diproses: jam mundur tidak membunyikan ulang bell sebelum
+    titik itu, dan slot yang terlompati (jam maju, suspend) diputuskan oleh
+    missed_bell_policy. `clock`/`queue` bisa diganti untuk simulasi.
+    """
+    log("Scheduler daemon started")
+    clock = clock or SystemClock()
+    conn = sqlite3.connect(DB, timeout=10)
+    bank = pcm_player.PcmBank()
+    sink = pcm_player.SinkPool()
+    queue = queue or playback.PlaybackQueue(log, notify=notify)
     try:
-        with open(lock_file, "w") as f:
-            f.write("played")
+        migrate_schema(conn)
     except Exception as e:
-        log(f"Cannot create lock file: {e}")
-        continue
+        log(f"Migration error: {e}")
+    cleanup_legacy_locks()
+    if event_hub is None:
+        start_event_hub(conn)
+    plan = playlist.Playlist()
+    reported = set()  # bell dengan jam tidak valid yang sudah di-log
+    prepared = False
+    plan_day = None
+    version = None
+    compacted_on = None
+    anchor = None
+    handled = None
+    status_key = None
+    status_at = 0.0
+
+    while True:
+        try:
+            current = data_version(conn)
+            if current != version:
+                settings, schedule = load_schedule(conn)
+                time_offset = settings['time_offset']
+                plan.clear()
+                reported = set()
+                if event_hub is not None:
+                    # Kunci token bisa berubah (restore bell.db)
+                    event_hub.secret = events.ensure_secret(conn)
+                prepared = False
+                version = current
+                log(f"Schedule changed: {len(schedule)} bells in active profile, "
+                    f"playlist recompiled (offset: {time_offset}s)")
+                queue.mode = settings['playback_mode']
+                check_sounds(conn, schedule)
+        except Exception as e:
+            log(f"DB error: {e}")
+            notify("error", source="db", message=str(e))
+            version = None
+            clock.sleep(POLL_INTERVAL)
+            continue
+
+        if anchor is None:
+            anchor = ClockAnchor(clock, time_offset)
+            handled = anchor.now()
+        jump = anchor.check(time_offset)
+        now = anchor.now()
+        if abs(jump) >= JUMP_THRESHOLD:
+            log(f"Clock jump detected: {jump:+.1f}s (offset: {time_offset}s)")
+
+        # Kompilasi playlist (hanya tanggal yang belum ada di cache)
+        try:
+            first = max(min(handled, now), now - datetime.timedelta(days=7)).date()
+            compiled = plan.compile(
+                conn, first, now.date() + datetime.timedelta(days=playlist.LOOKAHEAD_DAYS))
+        except sqlite3.Error as e:
+            log(f"Playlist compile error: {e}")
+            notify("error", source="db", message=str(e))
+            clock.sleep(POLL_INTERVAL)
+            continue
+        for bell_id, jam in sorted(plan.invalid - reported):
+            log(f"Bell {bell_id} skipped (jam tidak valid: {jam})")
+        reported |= plan.invalid
+        if now.date() in compiled or now.date() != plan_day:
+            plan_day = now.date()
+            note = plan.note(now.date())
+            log(f"Playlist {now.date()}: {len(plan.entries(now.date()))} slots"
+                + (f" ({note})" if note else ""))
+        if compiled or not prepared:
+            sounds = {row[3] for row in schedule} | plan.sounds()
+            if settings['normalize_volume']:
+                # Siapkan audio ter-normalisasi sebelum jam bunyi
+                audio_cache.warm({os.path.join(SOUND_DIR, name) for name in sounds},
+                                 settings['target_db'])
+            if settings['preload_audio']:
+                failed = bank.preload({resolve_sound(name, settings) for name in sounds})
+                for path in failed:
+                    log(f"Preload failed for {path}")
+            prepared = True
+
+        if compacted_on != now.date():
+            try:
+                compact_ledger(conn, now.date())
+                compacted_on = now.date()
+            except sqlite3.Error as e:
+                log(f"Ledger compaction error: {e}")
+
+        # Slot yang terlewat sejak `handled` (jam maju / proses tertunda)
+        if now > handled:
+            play, skipped = select_missed(
+                plan.due_between(handled, now), now,
+                settings['missed_bell_policy'], settings['missed_bell_grace'])
+            for fire_at, rows in skipped:
+                log(f"Missed bell(s) {', '.join(str(r[0]) for r in rows)} at "
+                    f"{fire_at.strftime('%A %H:%M')} skipped "
+                    f"(policy: {settings['missed_bell_policy']})")
+                notify("skipped", bells=[r[0] for r in rows], reason="missed",
+                       scheduled=fire_at.strftime("%H:%M"),
+                       policy=settings['missed_bell_policy'])
+            for fire_at, rows in play:
+                late = (now - fire_at).total_seconds()
+                log(f"Effective time: {fire_at.strftime('%A %H:%M')} "
+                    f"(offset: {time_offset}s, late: {late * 1000:.0f}ms)")
+                ring(conn, rows, fire_at, settings, queue, now=anchor.now())
+            handled = now
+        elif jump <= -JUMP_THRESHOLD:
+            log(f"Clock moved back; bells up to {handled.strftime('%H:%M:%S')} "
+                f"will not ring again")
+
+        # Jam mundur: tetap cari dari `handled` supaya menit yang sama tidak diulang
+        upcoming = plan.next_fire(max(now, handled))
+        note = plan.note(now.date())
+        key = (upcoming and (upcoming[0], tuple(r[0] for r in upcoming[1])), time_offset, note)
+        if (key != status_key or abs(jump) >= JUMP_THRESHOLD
+                or clock.monotonic() - status_at >= STATUS_REFRESH):
+            publish_status(now, upcoming, settings, jump, note)
+            status_key, status_at = key, clock.monotonic()
+        if upcoming is None:
+            clock.sleep(POLL_INTERVAL)
+            continue
+
+        fire_at, rows = upcoming
+        wait = (fire_at - now).total_seconds()
+        if wait > POLL_INTERVAL:
+            # Bangun berkala untuk mendeteksi perubahan jadwal/offset/jam
+            clock.sleep(POLL_INTERVAL)
+            continue
+
+        if settings['preload_audio']:
+            # Buka aplay (semua zona) sebelum jam bunyi agar byte pertama
+            # langsung keluar. Hanya untuk bell yang buffer PCM-nya siap:
+            # bell lain diputar player biasa yang butuh device-nya bebas.
+            paths = {row[0]: resolve_sound(row[1], settings) for row in rows}
+            bank.preload(set(paths.values()), prune=False)
+            devices = {device for row in rows if bank.get(paths[row[0]]) is not None
+                       for device in zones.devices(
+                           row[3], settings['zones'], settings['audio_output'])}
+            for device, e in sink.open(sorted(devices)).items():
+                log(f"Cannot open audio sink {device}: {e}")
+                notify("error", source="audio", device=device, message=str(e))
+
+        clock.sleep(max(wait, 0))
+
+        # Jam melompat selama tidur: biarkan loop menentukan ulang
+        # (slot ini menjadi "terlewat" atau belum waktunya)
+        jump = anchor.check(time_offset)
+        if abs(jump) >= JUMP_THRESHOLD:
+            log(f"Clock jump detected: {jump:+.1f}s (offset: {time_offset}s)")
+            continue
+
+        late_ms = (anchor.now() - fire_at).total_seconds() * 1000
+        log(f"Effective time: {fire_at.strftime('%A %H:%M')} "
+            f"(offset: {time_offset}s, late: {late_ms:.0f}ms)")
+        if settings['preload_audio']:
+            ring(conn, rows, fire_at, settings, queue, bank, sink, now=anchor.now())
+        else:
+            ring(conn, rows, fire_at, settings, queue, now=anchor.now())
+        handled = max(handled, fire_at)
+
 
-    sound_path = os.path.join(SOUND_DIR, suara)
-    log(f"Playing sound {sound_path} using {audio_output}")
-    play_sound(sound_path, audio_output)
+if __name__ == "__main__":
+    if "--daemon" in sys.argv[1:]:
+        try:
+            run_daemon()
+        except KeyboardInterrupt:
+            log("Scheduler daemon stopped")
+    else:
+        cleanup_legacy_locks()
+        run_once()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""Antrian pemutaran bell untuk play_bell.py.
+
+Semua bell yang jatuh tempo dimasukkan ke satu antrian berprioritas dan
+diputar oleh satu worker thread, sehingga dua bell pada menit yang sama
+tidak lagi berebut device (hw:x,y "device busy"). Dua mode:
+
+  sequential : bell diputar satu per satu (prioritas tertinggi dulu);
+               proses player ditunggu (wait) sampai selesai.
+  mixed      : semua bell dalam satu batch di-mix oleh ffmpeg (amix)
+               menjadi satu stream ke aplay.
+
+Job.devices berisi satu atau lebih device (zona, lihat zones.py). Bell
+multi-zona di-decode sekali lalu buffer yang sama diputar ke semua device
+bersamaan lewat pcm_player.SinkPool; pada mode mixed setiap device menerima
+campuran bell yang menuju ke device itu.
+"""
+import collections
+import datetime
+import heapq
+import itertools
+import os
+import subprocess
+import threading
+
+import pcm_player
+
+IS_WINDOWS = os.name == 'nt'
+
+MODES = ("sequential", "mixed")
+
+# devices: tuple device tujuan (zona); offset: time_offset (detik) yang
+# dipakai saat job dijadwalkan; bank/sink: PcmBank/SinkPool untuk job ini
+# (None = tanpa preload). Dibawa per job supaya scheduler tidak mengubah
+# state yang sedang dibaca worker.
+Job = collections.namedtuple(
+    "Job", "bell_id path priority devices when offset bank sink",
+    defaults=(None, None))
+
+# ================= PLAYER PROCESS =================
+
+
+def start_player(path, device):
+    """Jalankan player eksternal untuk `path` dan kembalikan Popen-nya."""
+    if IS_WINDOWS:
+        cmd = [
+            "powershell", "-c",
+            f"$m = New-Object System.Windows.Media.MediaPlayer; "
+            f"$m.Open('{path}'); "
+            f"$m.Play(); "
+            f"while($m.Position -lt $m.NaturalDuration.TimeSpan) {{ Start-Sleep -ms 100 }}"
+        ]
+        return subprocess.Popen(cmd, creationflags=subprocess.CREATE_NO_WINDOW if hasattr(
+            subprocess, 'CREATE_NO_WINDOW') else 0)
+    if path.lower().endswith(".wav"):
+        return subprocess.Popen(["aplay", "-q", "-D", device, path])
+    return subprocess.Popen(["mpg123", "-q", "-a", device, path])
+
+
+def start_mixer(paths, device):
+    """ffmpeg amix -> aplay. Return (ffmpeg, aplay) Popen."""
+    n = len(paths)
+    cmd = ["ffmpeg", "-loglevel", "error"]
+    for path in paths:
+        cmd += ["-i", path]
+    # amix membagi volume dengan jumlah input; volume=n mengembalikannya
+    cmd += ["-filter_complex", f"amix=inputs={n}:duration=longest:dropout_transition=0,volume={n}",
+            "-f", "wav", "-"]
+    mixer = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    player = subprocess.Popen(
+        ["aplay", "-q", "-D", device], stdin=mixer.stdout)
+    mixer.stdout.close()  # aplay memegang ujung baca pipe
+    return mixer, player
+
+# ================= QUEUE =================
+
+
+class PlaybackQueue:
+    """Antrian berprioritas dengan satu worker thread.
+
+    Job.bank/Job.sink (opsional, lihat pcm_player; `sink` sebuah SinkPool)
+    dipakai untuk memutar buffer PCM yang sudah di-preload. `notify(event, **data)`
+    (opsional) menerima event playing/finished/error untuk dashboard.
+    """
+
+    def __init__(self, log, mode="sequential", notify=None):
+        self.log = log
+        self.notify = notify or (lambda event, **data: None)
+        self.mode = mode if mode in MODES else "sequential"
+        self._heap = []
+        self._seq = itertools.count()
+        self._busy = False
+        self._cond = threading.Condition()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, jobs):
+        """Masukkan satu batch job (mis. semua bell pada menit yang sama)."""
+        with self._cond:
+            for job in jobs:
+                heapq.heappush(
+                    self._heap, (-job.priority, next(self._seq), job))
+            self._cond.notify_all()
+
+    def join(self, timeout=None):
+        """Tunggu sampai antrian kosong dan tidak ada yang sedang diputar."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._heap and not self._busy, timeout)
+
+    def pending(self):
+        with self._cond:
+            return len(self._heap) + (1 if self._busy else 0)
+
+    # ---------------- worker ----------------
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._heap)
+                if self.mode == "mixed" and not IS_WINDOWS:
+                    batch = [heapq.heappop(self._heap)[2]
+                             for _ in range(len(self._heap))]
+                else:
+                    batch = [heapq.heappop(self._heap)[2]]
+                self._busy = True
+            sink = batch[0].sink
+
+            try:
+                if len(batch) > 1:
+                    self._play_mixed(batch)
+                else:
+                    self._play_one(batch[0])
+            except Exception as e:
+                self.log(f"Playback error: {e}")
+                self.notify("error", source="playback", message=str(e),
+                            bells=[job.bell_id for job in batch])
+            finally:
+                with self._cond:
+                    self._busy = False
+                    idle = not self._heap
+                    self._cond.notify_all()
+                if idle and sink is not None:
+                    sink.close()  # lepas device setelah antrian habis
+
+    def _log_latency(self, job):
+        now = datetime.datetime.now() + datetime.timedelta(seconds=job.offset)
+        late = (now - job.when).total_seconds() * 1000
+        self.log(f"Bell {job.bell_id} latency: {late:.1f}ms (scheduled -> start)")
+
+    def _missing(self, job):
+        """True (dan log + event error) jika file suara job tidak ada."""
+        if os.path.isfile(job.path):
+            return False
+        self.log(f"File not found: {job.path}")
+        self.notify("error", source="playback", bells=[job.bell_id],
+                    message=f"File tidak ditemukan: {os.path.basename(job.path)}")
+        return True
+
+    def _play_one(self, job):
+        if self._missing(job):
+            return
+
+        buf = job.bank.get(job.path) if job.bank is not None else None
+        if buf is None and len(job.devices) > 1 and not IS_WINDOWS:
+            # Multi-zona tanpa preload: decode sekali (cache) lalu fan-out
+            buf = self._decode(job.path)
+        if buf is not None and (job.sink is not None or len(job.devices) > 1):
+            self.log(f"Playing preloaded {job.path} using {', '.join(job.devices)} "
+                     f"(priority {job.priority})")
+            self._fan_out([job], [(device, buf) for device in job.devices])
+            return
+
+        if job.sink is not None:
+            job.sink.close()  # device dipakai player biasa (preload gagal)
+        self.log(f"Playing sound {job.path} using {', '.join(job.devices)} "
+                 f"(priority {job.priority})")
+        # Tanpa PCM (ffmpeg tidak ada): satu player per device. Windows selalu
+        # memakai output default, jadi cukup satu player.
+        devices = job.devices[:1] if IS_WINDOWS else job.devices
+        procs = [(device, start_player(job.path, device)) for device in devices]
+        self._log_latency(job)
+        self._notify_playing([job], job.devices)
+        failed = False
+        for device, proc in procs:
+            code = proc.wait()
+            if code != 0:
+                failed = True
+                self.log(f"Bell {job.bell_id} player exited with code {code} ({device})")
+                self.notify("error", source="player", bells=[job.bell_id], device=device,
+                            message=f"Player keluar dengan kode {code}")
+        if not failed:
+            self.notify("finished", bells=[job.bell_id])
+
+    def _play_mixed(self, batch):
+        batch = [job for job in batch if not self._missing(job)]
+        if not batch:
+            return
+        if len(batch) == 1:
+            return self._play_one(batch[0])
+
+        devices = list(dict.fromkeys(d for job in batch for d in job.devices))
+        ids = ", ".join(str(job.bell_id) for job in batch)
+        if len(devices) > 1:
+            # Setiap device menerima campuran bell yang menuju ke sana
+            self.log(f"Mixing bells {ids} using {', '.join(devices)}")
+            mixes, targets = {}, []
+            for device in devices:
+                paths = tuple(job.path for job in batch if device in job.devices)
+                if paths not in mixes:
+                    mixes[paths] = self._decode(paths[0]) if len(paths) == 1 \
+                        else pcm_player.mix(list(paths))
+                if mixes[paths] is None:
+                    self.log(f"Mixer failed for {device} (bells {ids})")
+                    self.notify("error", source="mixer", device=device,
+                                bells=[job.bell_id for job in batch if device in job.devices],
+                                message="Gagal mencampur suara")
+                    continue
+                targets.append((device, mixes[paths]))
+            if targets:
+                self._fan_out(batch, targets)
+            return
+
+        if batch[0].sink is not None:
+            batch[0].sink.close()  # device dipakai aplay milik mixer
+        self.log(f"Mixing bells {ids} using {devices[0]}")
+        mixer, player = start_mixer([job.path for job in batch], devices[0])
+        for job in batch:
+            self._log_latency(job)
+        self._notify_playing(batch, devices)
+        code = player.wait()
+        mixer.wait()
+        bells = [job.bell_id for job in batch]
+        if code != 0 or mixer.returncode != 0:
+            self.log(f"Mixer exited with code {mixer.returncode}/{code} (bells {ids})")
+            self.notify("error", source="mixer", bells=bells,
+                        message=f"Mixer keluar dengan kode {mixer.returncode}/{code}")
+        else:
+            self.notify("finished", bells=bells)
+
+    def _decode(self, path):
+        try:
+            pcm_path = pcm_player.decode(path)
+            return pcm_player.load(pcm_path) if pcm_path else None
+        except Exception as e:
+            self.log(f"Cannot decode {path}: {e}")
+            return None
+
+    def _fan_out(self, batch, targets):
+        """Putar [(device, buffer), ...] bersamaan lewat SinkPool."""
+        shared = batch[0].sink
+        pool = shared if shared is not None else pcm_player.SinkPool()
+        bells = [job.bell_id for job in batch]
+
+        def first_write(_):
+            for job in batch:
+                self._log_latency(job)
+            self._notify_playing(batch, [device for device, _ in targets])
+
+        try:
+            starts, errors = pool.write(targets, on_first_write=first_write)
+        finally:
+            if pool is not shared:
+                pool.close()
+        if len(starts) > 1:
+            skew = (max(starts.values()) - min(starts.values())) * 1000
+            self.log(f"Zones {', '.join(starts)} start skew: {skew:.1f}ms")
+        for device, error in errors.items():
+            self.log(f"Playback error on {device}: {error}")
+            self.notify("error", source="audio", bells=bells, device=device,
+                        message=str(error))
+        if starts:
+            self.notify("finished", bells=bells)
+
+    def _notify_playing(self, batch, devices):
+        self.notify("playing", device=", ".join(devices), devices=list(devices),
+                    bells=[job.bell_id for job in batch],
+                    sounds=[os.path.basename(job.path) for job in batch],
+                    scheduled=batch[0].when.strftime("%H:%M"))
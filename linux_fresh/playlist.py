@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Kalender pengecualian dan playlist harian untuk scheduler.
+
+Tabel calendar_exceptions berisi rentang tanggal (inklusif):
+
+  skip     tidak ada bell sama sekali (libur nasional, cuti bersama)
+  profile  pakai profil tertentu, bukan profil aktif (Ujian, Ramadhan)
+
+Aturan untuk satu tanggal: skip menang; jika tidak ada, override profil
+dengan rentang terpendek (paling spesifik) yang dipakai, id terbesar jika
+sama panjang; jika tidak ada juga, profil yang aktif.
+
+Playlist mengompilasi aturan itu sekali per tanggal menjadi list
+(fire_at, rows) yang sudah urut. Scheduler hanya membaca entri berikutnya
+(bisect); aturan kalender tidak dievaluasi lagi saat jam bunyi. Cache
+dibuang setiap kali isi database berubah (PRAGMA data_version).
+"""
+import bisect
+import datetime
+
+# Berapa hari ke depan dicari saat menentukan bell berikutnya
+LOOKAHEAD_DAYS = 14
+ACTIONS = ("skip", "profile")
+
+# ================= SCHEMA =================
+
+
+def ensure_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS calendar_exceptions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            action TEXT NOT NULL,
+            profile_id INTEGER,
+            note TEXT
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_calendar_range "
+        "ON calendar_exceptions (start_date, end_date)")
+
+# ================= RULES =================
+
+
+def day_plan(conn, date):
+    """Return (profile_id atau None jika libur, keterangan atau None)."""
+    day = date.isoformat()
+    rules = conn.execute("""
+        SELECT c.action, c.profile_id, c.note, p.name
+        FROM calendar_exceptions c
+        LEFT JOIN profiles p ON p.id = c.profile_id
+        WHERE c.start_date <= ? AND c.end_date >= ?
+        ORDER BY c.action = 'skip' DESC,
+                 julianday(c.end_date) - julianday(c.start_date), c.id DESC
+    """, (day, day)).fetchall()
+
+    for action, profile_id, note, name in rules:
+        if action == "skip":
+            return None, note or "Libur"
+        if action == "profile" and name is not None:
+            return profile_id, note or f"Profil {name}"
+
+    row = conn.execute("SELECT id FROM profiles WHERE is_active=1").fetchone()
+    return (row[0] if row else 1), None
+
+
+def compile_day(conn, date, invalid=None):
+    """Return (entries, keterangan) untuk satu tanggal.
+
+    entries = [(fire_at, [(bell_id, suara, prioritas, zones), ...]), ...]
+    urut waktu; zones = zona bell, atau zona profil jika bell tidak punya.
+    Bell dengan jam tidak valid dilewati dan (bell_id, jam)-nya ditambahkan
+    ke set `invalid` jika diberikan.
+    """
+    profile_id, note = day_plan(conn, date)
+    if profile_id is None:
+        return [], note
+
+    slots = {}
+    rows = conn.execute("""
+        SELECT b.id, b.jam, b.suara, COALESCE(b.prioritas, 0),
+               COALESCE(NULLIF(b.zones, ''), p.zones)
+        FROM bell b
+        LEFT JOIN profiles p ON p.id = b.profile_id
+        WHERE b.profile_id=? AND b.aktif=1 AND (b.hari_mask & ?) != 0
+        ORDER BY b.jam, b.id
+    """, (profile_id, 1 << date.weekday()))
+    for bell_id, jam, suara, prioritas, bell_zones in rows:
+        try:
+            t = datetime.datetime.strptime(jam, "%H:%M")
+        except (TypeError, ValueError):
+            if invalid is not None:
+                invalid.add((bell_id, jam))
+            continue
+        fire_at = datetime.datetime.combine(date, t.time())
+        slots.setdefault(fire_at, []).append((bell_id, suara, prioritas, bell_zones))
+    return sorted(slots.items()), note
+
+# ================= PLAYLIST =================
+
+
+class Playlist:
+    """Cache playlist per tanggal. Hanya compile() yang menyentuh database."""
+
+    def __init__(self):
+        self.days = {}
+        self.invalid = set()  # (bell_id, jam) yang dilewati compile_day
+
+    def clear(self):
+        self.days.clear()
+        self.invalid.clear()
+
+    def compile(self, conn, first, last):
+        """Pastikan tanggal first..last (inklusif) sudah dikompilasi.
+        Return list tanggal yang baru dikompilasi."""
+        compiled = []
+        day = first
+        while day <= last:
+            if day not in self.days:
+                entries, note = compile_day(conn, day, self.invalid)
+                self.days[day] = ([e[0] for e in entries], entries, note)
+                compiled.append(day)
+            day += datetime.timedelta(days=1)
+        # Buang tanggal yang sudah lewat
+        for old in [d for d in self.days if d < first]:
+            del self.days[old]
+        return compiled
+
+    def entries(self, date):
+        return self.days.get(date, ([], [], None))[1]
+
+    def note(self, date):
+        """Keterangan kalender (libur / override profil) atau None."""
+        return self.days.get(date, ([], [], None))[2]
+
+    def next_fire(self, now):
+        """Entri pertama dengan fire_at > now. Return (fire_at, rows) atau None."""
+        day = now.date()
+        for _ in range(LOOKAHEAD_DAYS + 1):
+            if day not in self.days:
+                return None  # belum dikompilasi: scheduler mengompilasi di iterasi berikutnya
+            keys, entries, _ = self.days[day]
+            pos = bisect.bisect_right(keys, now)
+            if pos < len(keys):
+                return entries[pos]
+            day += datetime.timedelta(days=1)
+        return None
+
+    def due_between(self, start, end):
+        """Semua (fire_at, rows) dengan start < fire_at <= end, urut waktu."""
+        start = max(start, end - datetime.timedelta(days=7))
+        due = []
+        day = start.date()
+        while day <= end.date():
+            keys, entries, _ = self.days.get(day, ([], [], None))
+            lo = bisect.bisect_right(keys, start)
+            hi = bisect.bisect_right(keys, end)
+            due.extend(entries[lo:hi])
+            day += datetime.timedelta(days=1)
+        return due
+
+    def sounds(self):
+        return {row[1] for _, entries, _ in self.days.values()
+                for _, rows in entries for row in rows}
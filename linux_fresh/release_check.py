@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Cek rilis baru (release.json) di background untuk app.py.
+
+Respons terakhir disimpan di memori beserta ETag/Last-Modified-nya.
+Pengecekan berikutnya mengirim If-None-Match/If-Modified-Since, sehingga
+server cukup menjawab 304 tanpa body. Jika gagal, jeda sebelum percobaan
+berikutnya digandakan (exponential backoff) sampai MAX_BACKOFF. Route
+/check_update hanya membaca cache dan tidak pernah menunggu jaringan.
+"""
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# ================= CONFIG =================
+CHECK_INTERVAL = 6 * 3600  # detik antar pengecekan normal
+MIN_BACKOFF = 60
+MAX_BACKOFF = 6 * 3600
+TIMEOUT = 10
+
+# ================= VERSION =================
+
+
+def version_tuple(version):
+    parts = []
+    for p in str(version).strip().lstrip("vV").split("."):
+        digits = "".join(ch for ch in p if ch.isdigit())
+        parts.append(int(digits) if digits else 0)
+    return tuple(parts)
+
+
+def is_newer(current, latest):
+    """True jika `latest` lebih baru dari `current` (mis. "1.10.0" > "1.9.2")."""
+    cur, new = version_tuple(current), version_tuple(latest)
+    width = max(len(cur), len(new))
+    return new + (0,) * (width - len(new)) > cur + (0,) * (width - len(cur))
+
+# ================= CHECKER =================
+
+
+class ReleaseChecker:
+    """Cache release.json yang diperbarui oleh satu background thread.
+
+    `get_url` dipanggil setiap pengecekan, sehingga URL bisa diubah dari
+    halaman pengaturan (atau diarahkan ke server lokal saat pengujian).
+    """
+
+    def __init__(self, get_url, interval=CHECK_INTERVAL,
+                 min_backoff=MIN_BACKOFF, max_backoff=MAX_BACKOFF, timeout=TIMEOUT):
+        self.get_url = get_url
+        self.interval = interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._url = None
+        self._etag = None
+        self._last_modified = None
+        self._data = None
+        self._checked = 0.0
+        self._error = None
+        self._failures = 0
+        self._next_check = 0.0
+
+    # ---------------- fetch ----------------
+
+    def fetch(self, url):
+        """Satu conditional GET. Return dict release.json, atau None jika 304."""
+        req = urllib.request.Request(url)
+        with self._lock:
+            if url == self._url:
+                if self._etag:
+                    req.add_header("If-None-Match", self._etag)
+                if self._last_modified:
+                    req.add_header("If-Modified-Since", self._last_modified)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                data = json.loads(resp.read().decode())
+                etag = resp.headers.get("ETag")
+                last_modified = resp.headers.get("Last-Modified")
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return None
+            raise
+
+        with self._lock:
+            self._url = url
+            self._data = data
+            self._etag = etag
+            self._last_modified = last_modified
+        return data
+
+    def refresh(self):
+        """Cek sekarang (dipanggil dari thread background). Return True jika berhasil."""
+        url = self.get_url()
+        try:
+            if not url:
+                raise ValueError("API URL belum dikonfigurasi")
+            self.fetch(url)
+        except Exception as e:
+            with self._lock:
+                self._failures += 1
+                delay = min(self.max_backoff,
+                            self.min_backoff * 2 ** (self._failures - 1))
+                self._error = str(e)
+                self._next_check = time.time() + delay
+            return False
+
+        with self._lock:
+            self._failures = 0
+            self._error = None
+            self._checked = time.time()
+            self._next_check = self._checked + self.interval
+        return True
+
+    # ---------------- background ----------------
+
+    def _run(self):
+        while True:
+            with self._lock:
+                delay = self._next_check - time.time()
+            woken = delay > 0 and self._wake.wait(delay)
+            # Selalu dibersihkan: trigger() yang datang saat pengecekan sudah
+            # jatuh tempo tidak boleh memicu pengecekan kedua
+            self._wake.clear()
+            if woken:
+                with self._lock:
+                    # Permintaan manual tidak menembus backoff setelah gagal
+                    if self._failures and time.time() < self._next_check:
+                        continue
+            self.refresh()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def trigger(self):
+        """Minta pengecekan segera (tanpa menunggu hasilnya)."""
+        self._wake.set()
+
+    def snapshot(self):
+        """State cache: data (dict atau None), url, checked, error, failures, next_check."""
+        with self._lock:
+            return {
+                "data": self._data,
+                "url": self._url,
+                "checked": self._checked,
+                "error": self._error,
+                "failures": self._failures,
+                "next_check": self._next_check,
+            }
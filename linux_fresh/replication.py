@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""Replikasi jadwal dari satu controller (primary) ke banyak node (replica).
+
+Setiap perubahan pada tabel yang direplikasi dicatat trigger ke tabel
+`changes` (seq, tbl, row_key). Primary melayani
+
+    GET /api/replication/changes?since=<seq>&epoch=<epoch>
+    GET /api/replication/sounds/<sha256>
+
+Replica menarik perubahan setelah seq terakhirnya. Beberapa perubahan pada
+baris yang sama digabung menjadi satu (isi baris terbaru, atau hapus jika
+barisnya sudah tidak ada). Sync pertama, atau epoch yang berbeda (DB
+primary di-restore), menghasilkan snapshot penuh. File suara diambil
+berdasarkan sha256 dan hanya jika isinya berbeda. File ditulis (dan
+diverifikasi) sebelum transaksi DB, jadi jadwal tidak pernah menunjuk
+suara yang belum ada.
+
+Replica tetap berbunyi dari bell.db lokal jika controller tidak bisa
+dihubungi; penarikan berikutnya memakai backoff.
+
+Semua request memakai header `Authorization: Bearer <replication_token>`.
+"""
+import datetime
+import json
+import os
+import secrets
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import backup_store
+import sound_library
+
+# ================= CONFIG =================
+ROLES = ("standalone", "primary", "replica")
+DEFAULT_INTERVAL = 30
+MAX_BACKOFF = 30 * 60
+TIMEOUT = 15
+PAGE_SIZE = 500
+COMPACT_EVERY = 3600  # detik antar kompaksi tabel changes di primary
+
+# tabel: (primary key, kolom). Urutan = urutan penerapan di replica.
+# Tabel zones (device ALSA per mesin) tidak ikut; bell/profil hanya
+# membawa id zona, yang diabaikan jika tidak ada di node (lihat zones.py).
+TABLES = {
+    "profiles": ("id", ("id", "name", "is_active", "zones")),
+    "calendar_exceptions": ("id", ("id", "start_date", "end_date", "action",
+                                   "profile_id", "note")),
+    "bell": ("id", ("id", "jam", "hari", "suara", "aktif", "profile_id",
+                    "hari_mask", "prioritas", "zones")),
+    "settings": ("key", ("key", "value")),
+    "sounds": ("filename", ("filename", "sha256")),
+}
+
+# Setting yang ikut controller; sisanya (audio_output, time_offset, NTP,
+# peran replikasi, versi) milik masing-masing node
+REPLICATED_SETTINGS = ("missed_bell_policy", "missed_bell_grace",
+                       "playback_mode", "normalize_volume", "target_db")
+
+# ================= SCHEMA =================
+
+
+def ensure_schema(conn):
+    """Tabel changes + trigger pada semua tabel yang direplikasi."""
+    sound_library.ensure_table(conn)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tbl TEXT NOT NULL,
+            row_key TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_changes_row ON changes (tbl, row_key)")
+    keys = ", ".join(f"'{k}'" for k in REPLICATED_SETTINGS)
+    for table, (pk, _) in TABLES.items():
+        for event, ref in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            when = f"WHEN {ref}.key IN ({keys})" if table == "settings" else ""
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS repl_{table}_{event.lower()}
+                AFTER {event} ON {table} {when}
+                BEGIN
+                    INSERT INTO changes (tbl, row_key) VALUES ('{table}', {ref}.{pk});
+                END
+            """)
+    conn.commit()
+
+
+def local_setting(conn, key, default=None):
+    row = conn.execute("SELECT value FROM settings WHERE key=?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def set_local_setting(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                 (key, str(value)))
+
+
+def new_epoch(conn):
+    """Tandai isi DB sebagai riwayat baru (mis. setelah restore):
+    replica akan mengambil snapshot penuh."""
+    epoch = secrets.token_hex(8)
+    set_local_setting(conn, "replication_epoch", epoch)
+    conn.commit()
+    return epoch
+
+
+def epoch(conn):
+    return local_setting(conn, "replication_epoch") or new_epoch(conn)
+
+# ================= PRIMARY =================
+
+
+_last_compact = 0.0
+
+
+def compact(conn):
+    """Sisakan satu baris changes per (tbl, row_key): yang terbaru."""
+    removed = conn.execute("""
+        DELETE FROM changes WHERE seq NOT IN (
+            SELECT MAX(seq) FROM changes GROUP BY tbl, row_key)
+    """).rowcount
+    conn.commit()
+    return removed
+
+
+def maybe_compact(conn):
+    global _last_compact
+    if time.time() - _last_compact > COMPACT_EVERY:
+        compact(conn)
+        _last_compact = time.time()
+
+
+def _select(conn, table, where="", args=()):
+    pk, cols = TABLES[table]
+    sql = f"SELECT {', '.join(cols)} FROM {table}"
+    if table == "settings":
+        sql += f" WHERE key IN ({', '.join('?' * len(REPLICATED_SETTINGS))})"
+        args = REPLICATED_SETTINGS + tuple(args)
+        if where:
+            sql += " AND " + where
+    elif where:
+        sql += " WHERE " + where
+    return conn.execute(sql, args).fetchall()
+
+
+def _key(table, value):
+    return int(value) if TABLES[table][0] == "id" else value
+
+
+def changes_since(conn, since, client_epoch=None, limit=PAGE_SIZE):
+    """Payload untuk replica: snapshot penuh atau perubahan setelah `since`."""
+    maybe_compact(conn)
+    current_epoch = epoch(conn)
+    # Satu transaksi baca: semua baris dari snapshot DB yang sama
+    conn.execute("BEGIN")
+    try:
+        top = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+        if since <= 0 or since > top or client_epoch != current_epoch:
+            return {
+                "epoch": current_epoch,
+                "seq": top,
+                "full": True,
+                "more": False,
+                "tables": {t: [list(r) for r in _select(conn, t)] for t in TABLES},
+            }
+
+        rows = conn.execute("""
+            SELECT tbl, row_key, MAX(seq) AS s FROM changes
+            WHERE seq > ? GROUP BY tbl, row_key ORDER BY s LIMIT ?
+        """, (since, limit)).fetchall()
+        more = len(rows) == limit
+        changes = []
+        for table, key, _ in rows:
+            if table not in TABLES:
+                continue
+            found = _select(conn, table, f"{TABLES[table][0]}=?", (_key(table, key),))
+            changes.append({"table": table, "key": _key(table, key),
+                            "row": list(found[0]) if found else None})
+        return {
+            "epoch": current_epoch,
+            "seq": rows[-1][2] if more else top,
+            "full": False,
+            "more": more,
+            "changes": changes,
+        }
+    finally:
+        conn.rollback()
+
+
+def sound_path(conn, sha):
+    """Path file suara dengan hash `sha`, atau None."""
+    row = conn.execute("SELECT filename FROM sounds WHERE sha256=?", (sha,)).fetchone()
+    if not row:
+        return None
+    path = os.path.join(sound_library.SOUND_DIR, row[0])
+    return path if os.path.isfile(path) else None
+
+# ================= REPLICA =================
+
+
+def apply_changes(conn, data, open_sound):
+    """Terapkan satu payload changes_since() ke DB lokal.
+
+    `open_sound(sha)` mengembalikan file object isi suara dari primary.
+    Return dict ringkasan (rows, sounds, removed_sounds).
+    """
+    # 1. Kumpulkan perubahan per tabel
+    upserts = {t: [] for t in TABLES}
+    deletes = {t: [] for t in TABLES}
+    if data["full"]:
+        for table in TABLES:
+            upserts[table] = data["tables"].get(table, [])
+    else:
+        for change in data["changes"]:
+            table = change["table"]
+            if table not in TABLES:
+                continue
+            if change["row"] is None:
+                deletes[table].append(change["key"])
+            else:
+                upserts[table].append(change["row"])
+
+    # 2. File suara dulu (di luar transaksi), diverifikasi dengan sha256
+    current = dict(conn.execute("SELECT filename, sha256 FROM sounds"))
+    # Snapshot penuh tidak menghapus suara lokal yang tidak ada di primary;
+    # hanya penghapusan yang tercatat di changes yang diikuti
+    wanted = {name: sha for name, sha in upserts["sounds"]
+              if name and os.path.basename(name) == name}
+    os.makedirs(sound_library.SOUND_DIR, exist_ok=True)
+    fetched = []
+    for name, sha in sorted(wanted.items()):
+        dest = os.path.join(sound_library.SOUND_DIR, name)
+        if current.get(name) == sha and os.path.isfile(dest):
+            continue
+        with open_sound(sha) as src:
+            backup_store.copy_atomic(src, dest, expected=sha)
+        fetched.append(name)
+
+    # 3. Satu transaksi untuk semua baris + posisi seq
+    count = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for table, (pk, cols) in TABLES.items():
+            if table == "sounds":
+                continue
+            if data["full"]:
+                if table == "settings":
+                    conn.execute(
+                        f"DELETE FROM settings WHERE key IN "
+                        f"({', '.join('?' * len(REPLICATED_SETTINGS))})",
+                        REPLICATED_SETTINGS)
+                else:
+                    conn.execute(f"DELETE FROM {table}")
+            elif deletes[table]:
+                conn.executemany(f"DELETE FROM {table} WHERE {pk}=?",
+                                 [(k,) for k in deletes[table]])
+            rows = upserts[table]
+            if table == "settings":
+                rows = [r for r in rows if r[0] in REPLICATED_SETTINGS]
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(cols)}) "
+                f"VALUES ({', '.join('?' * len(cols))})", rows)
+            count += len(rows) + len(deletes[table])
+        set_local_setting(conn, "replication_seq", data["seq"])
+        set_local_setting(conn, "replication_epoch_seen", data["epoch"])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    # 4. File suara yang dihapus di primary, lalu index suara lokal
+    removed = []
+    for name in deletes["sounds"]:
+        path = os.path.join(sound_library.SOUND_DIR, str(name))
+        if os.path.basename(str(name)) == name and os.path.isfile(path):
+            os.remove(path)
+            removed.append(name)
+    if fetched or removed:
+        sound_library.sync(conn, fetched + removed)
+    return {"rows": count, "sounds": fetched, "removed_sounds": removed}
+
+
+class ReplicaPuller:
+    """Thread penarik perubahan dari primary (mode replica).
+
+    `get_config()` -> (role, primary_url, token, interval) dibaca setiap
+    siklus; `connect()` membuka koneksi SQLite; `on_applied(summary)`
+    dipanggil setelah ada perubahan yang diterapkan.
+    """
+
+    def __init__(self, get_config, connect, on_applied=None, log=print):
+        self.get_config = get_config
+        self.connect = connect
+        self.on_applied = on_applied
+        self.log = log
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._failures = 0
+        self._state = {"last_ok": None, "last_error": None, "seq": None,
+                       "next_check": 0.0, "last_summary": None}
+
+    # ---------------- http ----------------
+
+    def _request(self, url, token, path, params=None):
+        full = url.rstrip("/") + path
+        if params:
+            full += "?" + urllib.parse.urlencode(params)
+        req = urllib.request.Request(full, headers={"Authorization": f"Bearer {token}"})
+        return urllib.request.urlopen(req, timeout=TIMEOUT)
+
+    # ---------------- sync ----------------
+
+    def pull_once(self):
+        """Tarik semua halaman perubahan sampai habis. Return ringkasan total."""
+        role, url, token, _ = self.get_config()
+        if role != "replica" or not url:
+            raise ValueError("Node ini bukan replica atau URL controller kosong")
+
+        with self._run_lock:
+            conn = self.connect()
+            try:
+                total = {"rows": 0, "sounds": [], "removed_sounds": [], "full": False}
+                while True:
+                    since = int(local_setting(conn, "replication_seq", "0") or 0)
+                    seen = local_setting(conn, "replication_epoch_seen", "")
+                    with self._request(url, token, "/api/replication/changes",
+                                       {"since": since, "epoch": seen}) as resp:
+                        data = json.loads(resp.read().decode())
+                    if data["full"] or data["changes"]:
+                        summary = apply_changes(
+                            conn, data,
+                            lambda sha: self._request(url, token, f"/api/replication/sounds/{sha}"))
+                        total["rows"] += summary["rows"]
+                        total["sounds"] += summary["sounds"]
+                        total["removed_sounds"] += summary["removed_sounds"]
+                        total["full"] = total["full"] or data["full"]
+                    elif data["seq"] != since:
+                        set_local_setting(conn, "replication_seq", data["seq"])
+                        conn.commit()
+                    if not data.get("more"):
+                        break
+                maybe_compact(conn)
+            finally:
+                conn.close()
+
+        with self._lock:
+            self._state["seq"] = data["seq"]
+        if total["rows"] or total["sounds"] or total["removed_sounds"]:
+            self.log(f"Replication: {total['rows']} rows, "
+                     f"{len(total['sounds'])} sounds fetched"
+                     f"{' (full snapshot)' if total['full'] else ''}, seq {data['seq']}")
+            if self.on_applied:
+                self.on_applied(total)
+        return total
+
+    def refresh(self):
+        role, _, _, interval = self.get_config()
+        if role != "replica":
+            with self._lock:
+                self._state["next_check"] = time.time() + 60
+            return False
+        try:
+            summary = self.pull_once()
+        except Exception as e:
+            if isinstance(e, urllib.error.HTTPError) and e.code in (401, 403):
+                message = "Token replikasi ditolak controller"
+            else:
+                message = str(e)
+            with self._lock:
+                self._failures += 1
+                delay = min(MAX_BACKOFF, interval * 2 ** (self._failures - 1))
+                self._state.update(last_error=message, next_check=time.time() + delay)
+            self.log(f"Replication error: {message} (retry in {delay:.0f}s)")
+            return False
+
+        with self._lock:
+            self._failures = 0
+            self._state.update(
+                last_ok=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                last_error=None, next_check=time.time() + interval,
+                last_summary={"rows": summary["rows"], "sounds": len(summary["sounds"])})
+        return True
+
+    # ---------------- background ----------------
+
+    def _run(self):
+        while True:
+            with self._lock:
+                delay = self._state["next_check"] - time.time()
+            if delay > 0 and self._wake.wait(delay):
+                self._wake.clear()
+            self.refresh()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def trigger(self):
+        """Tarik sekarang (tanpa menunggu interval)."""
+        with self._lock:
+            self._state["next_check"] = 0.0
+        self._wake.set()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._state, failures=self._failures)
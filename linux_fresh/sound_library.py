@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""Index library suara (tabel `sounds`) untuk app.py dan play_bell.py.
+
+Setiap file di static/sounds dicatat beserta hash isi, durasi, codec,
+sample rate dan ukurannya. Index diperbarui secara inkremental: file hanya
+di-hash/di-probe ulang jika ukuran atau mtime-nya berubah. Halaman web
+membaca daftar suara dari tabel ini, bukan os.listdir() setiap request.
+"""
+import datetime
+import hashlib
+import json
+import os
+import subprocess
+
+# ================= CONFIG =================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.environ.get("BELL_DATA_DIR", BASE_DIR)
+SOUND_DIR = os.path.join(DATA_DIR, "static/sounds")
+SOUND_EXTS = (".wav", ".mp3")
+
+IS_WINDOWS = os.name == 'nt'
+
+# ================= SCHEMA =================
+
+
+def ensure_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sounds (
+            filename TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime_ns INTEGER,
+            sha256 TEXT,
+            duration REAL,
+            codec TEXT,
+            sample_rate INTEGER,
+            channels INTEGER,
+            valid INTEGER,
+            error TEXT,
+            updated_at TEXT
+        )
+    """)
+    conn.commit()
+
+# ================= PROBE =================
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def probe(path):
+    """Metadata audio via ffprobe.
+
+    Return dict (duration, codec, sample_rate, channels, valid, error).
+    valid=None jika ffprobe tidak tersedia (tidak bisa dipastikan).
+    """
+    info = {"duration": None, "codec": None, "sample_rate": None,
+            "channels": None, "valid": None, "error": None}
+    cmd = [
+        "ffprobe", "-v", "error", "-select_streams", "a:0",
+        "-show_entries", "stream=codec_name,sample_rate,channels:format=duration",
+        "-of", "json", path
+    ]
+    try:
+        result = subprocess.run(
+            cmd, capture_output=True, text=True, timeout=30,
+            creationflags=subprocess.CREATE_NO_WINDOW if IS_WINDOWS and hasattr(
+                subprocess, 'CREATE_NO_WINDOW') else 0
+        )
+    except FileNotFoundError:
+        info["error"] = "ffprobe tidak ditemukan"
+        return info
+    except Exception as e:
+        info["error"] = str(e)
+        return info
+
+    try:
+        data = json.loads(result.stdout or "{}")
+    except ValueError:
+        data = {}
+    streams = data.get("streams") or []
+    if result.returncode != 0 or not streams:
+        info["valid"] = 0
+        info["error"] = (result.stderr or "tidak ada stream audio").strip()[-200:]
+        return info
+
+    stream = streams[0]
+    info.update({
+        "codec": stream.get("codec_name"),
+        "sample_rate": int(stream["sample_rate"]) if stream.get("sample_rate") else None,
+        "channels": stream.get("channels"),
+        "valid": 1,
+    })
+    duration = (data.get("format") or {}).get("duration")
+    if duration:
+        info["duration"] = float(duration)
+    return info
+
+# ================= SYNC =================
+
+
+def sync(conn, names=None):
+    """Perbarui index untuk `names` (list nama file) atau seluruh SOUND_DIR.
+
+    Return jumlah file yang di-(re)index + dihapus dari index.
+    """
+    ensure_table(conn)
+    known = {
+        row[0]: (row[1], row[2])
+        for row in conn.execute("SELECT filename, size, mtime_ns FROM sounds")
+    }
+
+    if names is None:
+        on_disk = []
+        if os.path.isdir(SOUND_DIR):
+            on_disk = [f for f in os.listdir(SOUND_DIR)
+                       if f.lower().endswith(SOUND_EXTS)]
+        names = set(on_disk) | set(known)
+
+    changed = 0
+    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for name in names:
+        path = os.path.join(SOUND_DIR, name)
+        if not name.lower().endswith(SOUND_EXTS) or not os.path.isfile(path):
+            if name in known:
+                conn.execute("DELETE FROM sounds WHERE filename=?", (name,))
+                changed += 1
+            continue
+
+        st = os.stat(path)
+        if known.get(name) == (st.st_size, st.st_mtime_ns):
+            continue
+
+        info = probe(path)
+        conn.execute("""
+            INSERT OR REPLACE INTO sounds
+                (filename, size, mtime_ns, sha256, duration, codec,
+                 sample_rate, channels, valid, error, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (name, st.st_size, st.st_mtime_ns, file_sha256(path),
+              info["duration"], info["codec"], info["sample_rate"],
+              info["channels"], info["valid"], info["error"], now))
+        changed += 1
+
+    conn.commit()
+    return changed
+
+
+def list_sounds(conn):
+    """Nama file suara (urut) dari index."""
+    return [row[0] for row in conn.execute(
+        "SELECT filename FROM sounds ORDER BY filename")]
+
+
+def check_referenced(conn, names):
+    """Cek suara yang dipakai jadwal. Return list (nama, alasan) yang bermasalah."""
+    problems = []
+    for name in sorted(set(names)):
+        row = conn.execute(
+            "SELECT valid, error FROM sounds WHERE filename=?", (name,)).fetchone()
+        if row is None or not os.path.isfile(os.path.join(SOUND_DIR, name)):
+            problems.append((name, "file tidak ditemukan"))
+        elif row[0] == 0:
+            problems.append((name, f"tidak bisa di-decode: {row[1]}"))
+    return problems
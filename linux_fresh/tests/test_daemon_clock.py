@@ -0,0 +1,102 @@
+"""Simulasi run_daemon() dengan ManualClock: bunyi tepat waktu, jam maju
+(missed_bell_policy) dan jam mundur (tidak bunyi ulang)."""
+import datetime
+import sqlite3
+
+import pytest
+
+import play_bell
+from clock import ManualClock, SimulationEnd
+
+# Senin
+START = datetime.datetime(2026, 10, 12, 7, 59, 0)
+
+
+class StubQueue:
+    """Pengganti PlaybackQueue: hanya mencatat job yang masuk."""
+
+    def __init__(self):
+        self.mode = "sequential"
+        self.jobs = []
+
+    def submit(self, jobs):
+        self.jobs.extend(jobs)
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    db = str(tmp_path / "bell.db")
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE settings (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute("CREATE TABLE profiles (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                 "name TEXT NOT NULL, is_active INTEGER DEFAULT 0)")
+    conn.execute("CREATE TABLE bell (id INTEGER PRIMARY KEY AUTOINCREMENT, jam TEXT, "
+                 "hari TEXT, suara TEXT, aktif INTEGER, profile_id INTEGER)")
+    play_bell.migrate_schema(conn)
+    conn.execute("INSERT INTO profiles (id, name, is_active) VALUES (1, 'Normal', 1)")
+    conn.executemany(
+        "INSERT INTO bell (id, jam, hari, hari_mask, suara, aktif, profile_id) "
+        "VALUES (?, ?, '', 127, 'bell.wav', 1, 1)",
+        [(1, "08:00"), (2, "08:05"), (3, "08:10")])
+    conn.commit()
+    conn.close()
+
+    events = []
+    monkeypatch.setattr(play_bell, "DB", db)
+    monkeypatch.setattr(play_bell, "SOUND_DIR", str(tmp_path / "sounds"))
+    monkeypatch.setattr(play_bell, "LOG_FILE", str(tmp_path / "bell.log"))
+    monkeypatch.setattr(play_bell, "notify", lambda event, **data: events.append((event, data)))
+    monkeypatch.setenv("BELL_EVENT_PORT", "0")
+
+    def run(until, steps=(), **settings):
+        with sqlite3.connect(db) as conn:
+            conn.executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                             [(k, str(v)) for k, v in settings.items()])
+        clock = ManualClock(START, until=until, events=[
+            (at, lambda c, s=seconds: c.step(s)) for at, seconds in steps])
+        queue = StubQueue()
+        with pytest.raises(SimulationEnd):
+            play_bell.run_daemon(clock=clock, queue=queue)
+        with sqlite3.connect(db) as conn:
+            fired = conn.execute(
+                "SELECT bell_id, menit, fired_at FROM bell_fired ORDER BY menit, bell_id").fetchall()
+        return queue.jobs, fired, events
+
+    return run
+
+
+def at(hour, minute, second=0):
+    return START.replace(hour=hour, minute=minute, second=second)
+
+
+def test_on_time_fire(daemon):
+    jobs, fired, _ = daemon(until=at(8, 1))
+    assert [(job.bell_id, job.when) for job in jobs] == [(1, at(8, 0))]
+    # fired_at berasal dari jam scheduler, bukan jam sistem
+    assert fired == [(1, "20261012_0800", "2026-10-12 08:00:00")]
+
+
+@pytest.mark.parametrize("policy, expected", [
+    ("skip", []),
+    ("latest", [3]),
+    ("all", [2, 3]),
+])
+def test_forward_step_follows_policy(daemon, policy, expected):
+    # 07:59:30 -> 08:11:30: 08:00 di luar grace, 08:05 dan 08:10 di dalamnya
+    jobs, fired, events = daemon(until=at(8, 12), steps=[(at(7, 59, 30), 12 * 60)],
+                                 missed_bell_policy=policy, missed_bell_grace=600)
+    assert [job.bell_id for job in jobs] == expected
+    assert [row[0] for row in fired] == expected
+    skipped = sorted(bell for event, data in events if event == "skipped"
+                     for bell in data["bells"])
+    assert skipped == sorted({1, 2, 3} - set(expected))
+
+
+def test_backward_step_does_not_ring_again(daemon):
+    # Bunyi 08:00, lalu jam mundur 2 menit ke 07:58:30
+    jobs, fired, events = daemon(until=at(8, 3), steps=[(at(8, 0, 30), -120)])
+    assert [(job.bell_id, job.when) for job in jobs] == [(1, at(8, 0))]
+    assert [row[:2] for row in fired] == [(1, "20261012_0800")]
+    # Tidak dicegah oleh ledger: scheduler sama sekali tidak mencoba bunyi ulang
+    assert not [data for event, data in events
+                if event == "skipped" and data.get("reason") == "already_played"]
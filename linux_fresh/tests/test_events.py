@@ -0,0 +1,56 @@
+"""EventHub: stream hanya untuk token sah, CORS hanya untuk host yang sama."""
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+import events
+
+SECRET = "rahasia"
+
+
+@pytest.fixture
+def hub():
+    hub = events.EventHub(host="127.0.0.1", port=0, secret=SECRET)
+    hub.start()
+    hub.publish("status", now="x")
+    return hub
+
+
+def open_stream(hub, token, origin=None):
+    req = urllib.request.Request(f"http://127.0.0.1:{hub.port}/events?token={token}")
+    if origin:
+        req.add_header("Origin", origin)
+    return urllib.request.urlopen(req, timeout=3)
+
+
+def test_valid_token_streams_events(hub):
+    with open_stream(hub, events.make_token(SECRET, 60), origin="http://127.0.0.1:5000") as resp:
+        assert resp.headers["Access-Control-Allow-Origin"] == "http://127.0.0.1:5000"
+        lines = [resp.readline() for _ in range(5)]
+    assert b"event: status\n" in lines
+
+
+@pytest.mark.parametrize("token", [
+    "",
+    "garbage",
+    events.make_token("kunci-lain", 60),
+    f"{int(time.time()) - 1}.{events._sign(SECRET, int(time.time()) - 1)}",
+])
+def test_bad_or_expired_token_is_rejected(hub, token):
+    with pytest.raises(urllib.error.HTTPError) as e:
+        open_stream(hub, token)
+    assert e.value.code == 401
+
+
+def test_other_origin_gets_no_cors_header(hub):
+    with open_stream(hub, events.make_token(SECRET, 60), origin="http://evil.example") as resp:
+        assert resp.headers["Access-Control-Allow-Origin"] is None
+
+
+def test_stream_closes_when_token_expires(hub):
+    with open_stream(hub, events.make_token(SECRET, 1)) as resp:
+        start = time.monotonic()
+        while resp.readline():
+            assert time.monotonic() - start < 5
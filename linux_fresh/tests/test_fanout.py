@@ -0,0 +1,68 @@
+"""Fan-out satu buffer PCM ke beberapa zona lewat sink file: (tanpa soundcard)."""
+import datetime
+import threading
+
+import pcm_player
+import playback
+
+# ~1 detik PCM dengan pola yang tidak berulang per chunk
+PCM = bytes(i * 7 % 251 for i in range(pcm_player.RATE * pcm_player.FRAME_BYTES))
+
+
+def test_sink_pool_writes_identical_streams_with_aligned_start(tmp_path):
+    devices = [f"file:{tmp_path / name}" for name in ("zona1.raw", "zona2.raw")]
+    first = []
+    pool = pcm_player.SinkPool()
+    try:
+        starts, errors = pool.write([(d, PCM) for d in devices], on_first_write=first.append)
+    finally:
+        pool.close()
+
+    assert errors == {}
+    assert sorted(starts) == sorted(devices)
+    # Chunk pertama semua zona ditulis berturut-turut dari satu thread
+    assert max(starts.values()) - min(starts.values()) < 0.05
+    assert first == [min(starts.values())]
+    for name in ("zona1.raw", "zona2.raw"):
+        assert (tmp_path / name).read_bytes() == PCM
+
+
+def test_failed_zone_does_not_stop_the_others(tmp_path):
+    good = f"file:{tmp_path / 'zona1.raw'}"
+    bad = f"file:{tmp_path / 'tidak-ada' / 'zona2.raw'}"
+    pool = pcm_player.SinkPool()
+    starts, errors = pool.write([(good, PCM), (bad, PCM)])
+    pool.close()
+
+    assert list(starts) == [good]
+    assert list(errors) == [bad]
+    assert (tmp_path / "zona1.raw").read_bytes() == PCM
+
+
+class StubBank:
+    def get(self, path):
+        return PCM
+
+
+def test_queue_fans_out_multi_zone_job(tmp_path):
+    sound = tmp_path / "bell.wav"
+    sound.write_bytes(b"RIFF")
+    devices = tuple(f"file:{tmp_path / name}" for name in ("zona1.raw", "zona2.raw"))
+    events = []
+    done = threading.Event()
+
+    def notify(event, **data):
+        events.append((event, data))
+        if event in ("finished", "error"):
+            done.set()
+
+    queue = playback.PlaybackQueue(lambda msg: None, notify=notify)
+    queue.submit([playback.Job(bell_id=1, path=str(sound), priority=0, devices=devices,
+                               when=datetime.datetime.now(), offset=0, bank=StubBank())])
+    assert done.wait(5)
+    assert queue.join(5)
+
+    assert [event for event, _ in events] == ["playing", "finished"]
+    assert events[0][1]["devices"] == list(devices)
+    for name in ("zona1.raw", "zona2.raw"):
+        assert (tmp_path / name).read_bytes() == PCM
@@ -0,0 +1,131 @@
+"""ReleaseChecker terhadap server release.json lokal (http.server)."""
+import http.server
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import release_check
+
+RELEASE = {"version": "2.1.0", "download_url": "http://127.0.0.1/bell.zip"}
+
+
+class ReleaseServer(http.server.ThreadingHTTPServer):
+    """release.json dengan ETag; `fail` = jawab 500."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), ReleaseHandler)
+        self.fail = False
+        self.hits = []  # (status, If-None-Match)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/release.json"
+
+
+class ReleaseHandler(http.server.BaseHTTPRequestHandler):
+    ETAG = '"v2.1.0"'
+
+    def do_GET(self):
+        if_none_match = self.headers.get("If-None-Match")
+        if self.server.fail:
+            status = 500
+        elif if_none_match == self.ETAG:
+            status = 304
+        else:
+            status = 200
+        self.server.hits.append((status, if_none_match))
+        self.send_response(status)
+        if status == 200:
+            body = json.dumps(RELEASE).encode()
+            self.send_header("ETag", self.ETAG)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = ReleaseServer()
+    monkeypatch.setenv("BELL_RELEASE_URL", server.url)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_checker(**kwargs):
+    # Sama seperti app.release_url(): BELL_RELEASE_URL mengarah ke server lokal
+    return release_check.ReleaseChecker(lambda: os.environ.get("BELL_RELEASE_URL"),
+                                        timeout=2, **kwargs)
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_etag_is_reused_and_304_keeps_cache(server):
+    checker = make_checker()
+    assert checker.refresh()
+    assert checker.refresh()
+    assert server.hits == [(200, None), (304, ReleaseHandler.ETAG)]
+    cache = checker.snapshot()
+    assert cache["data"] == RELEASE
+    assert cache["url"] == server.url
+    assert cache["error"] is None
+
+
+def test_failures_back_off_exponentially(server):
+    server.fail = True
+    checker = make_checker(min_backoff=60, max_backoff=150)
+    delays = []
+    for _ in range(3):
+        before = time.time()
+        assert not checker.refresh()
+        delays.append(round(checker.snapshot()["next_check"] - before))
+    assert delays == [60, 120, 150]
+    assert checker.snapshot()["failures"] == 3
+    assert "500" in checker.snapshot()["error"]
+
+    server.fail = False
+    assert checker.refresh()
+    cache = checker.snapshot()
+    assert (cache["failures"], cache["error"], cache["data"]) == (0, None, RELEASE)
+
+
+def test_trigger_does_not_break_through_backoff(server):
+    server.fail = True
+    checker = make_checker(min_backoff=60)
+    checker.start()
+    assert wait_for(lambda: checker.snapshot()["failures"] == 1)
+    server.fail = False
+    checker.trigger()
+    time.sleep(0.3)
+    assert len(server.hits) == 1
+    assert checker.snapshot()["data"] is None
+
+
+def test_first_check_is_pending_then_fills_cache(server):
+    checker = make_checker()
+    # Belum pernah dicek: /check_update menjawab "pending" dan memicu cek
+    cache = checker.snapshot()
+    assert (cache["data"], cache["error"]) == (None, None)
+    checker.trigger()
+    checker.start()
+    assert wait_for(lambda: checker.snapshot()["data"] == RELEASE)
+    time.sleep(0.3)
+    # trigger() yang sudah jatuh tempo hanya menghasilkan satu pengecekan
+    assert server.hits == [(200, None)]
@@ -0,0 +1,142 @@
+"""Replikasi primary -> replica antara dua bell.db lokal:
+changes_since() -> apply_changes() tanpa HTTP."""
+import hashlib
+import io
+import sqlite3
+
+import pytest
+
+import play_bell
+import replication
+import sound_library
+
+
+def make_db(path):
+    conn = sqlite3.connect(str(path))
+    conn.execute("CREATE TABLE settings (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute("CREATE TABLE profiles (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                 "name TEXT NOT NULL, is_active INTEGER DEFAULT 0)")
+    conn.execute("CREATE TABLE bell (id INTEGER PRIMARY KEY AUTOINCREMENT, jam TEXT, "
+                 "hari TEXT, suara TEXT, aktif INTEGER, profile_id INTEGER)")
+    play_bell.migrate_schema(conn)
+    replication.ensure_schema(conn)
+    return conn
+
+
+def bells(conn):
+    return conn.execute("SELECT id, jam, suara, aktif FROM bell ORDER BY id").fetchall()
+
+
+def pull(primary, replica, open_sound):
+    since = int(replication.local_setting(replica, "replication_seq", "0"))
+    seen = replication.local_setting(replica, "replication_epoch_seen", "")
+    data = replication.changes_since(primary, since, seen)
+    return data, replication.apply_changes(replica, data, open_sound)
+
+
+@pytest.fixture
+def nodes(tmp_path, monkeypatch):
+    monkeypatch.setattr(sound_library, "SOUND_DIR", str(tmp_path / "replica_sounds"))
+    primary = make_db(tmp_path / "primary.db")
+    replica = make_db(tmp_path / "replica.db")
+
+    # Isi suara di primary, dilayani berdasarkan sha256
+    store = {}
+
+    def add_sound(name, content):
+        sha = hashlib.sha256(content).hexdigest()
+        store[sha] = content
+        primary.execute("INSERT OR REPLACE INTO sounds (filename, sha256) VALUES (?, ?)",
+                        (name, sha))
+        return sha
+
+    fetched = []
+
+    def open_sound(sha):
+        fetched.append(sha)
+        return io.BytesIO(store[sha])
+
+    primary.execute("INSERT INTO profiles (id, name, is_active) VALUES (1, 'Normal', 1)")
+    primary.executemany(
+        "INSERT INTO bell (id, jam, hari, hari_mask, suara, aktif, profile_id) "
+        "VALUES (?, ?, 'Monday', 1, ?, 1, 1)",
+        [(1, "07:00", "masuk.wav"), (2, "12:00", "istirahat.wav")])
+    primary.executemany("INSERT INTO settings (key, value) VALUES (?, ?)",
+                        [("missed_bell_policy", "all"), ("audio_output", "hw:0,0")])
+    add_sound("masuk.wav", b"RIFF masuk")
+    add_sound("istirahat.wav", b"RIFF istirahat")
+    primary.commit()
+    replica.execute("INSERT INTO settings (key, value) VALUES ('audio_output', 'hw:1,0')")
+    replica.commit()
+    return primary, replica, add_sound, store, open_sound, fetched, tmp_path / "replica_sounds"
+
+
+def test_first_pull_is_full_snapshot(nodes):
+    primary, replica, _, _, open_sound, _, sound_dir = nodes
+    data, summary = pull(primary, replica, open_sound)
+
+    assert data["full"] is True
+    assert bells(replica) == bells(primary)
+    assert sorted(summary["sounds"]) == ["istirahat.wav", "masuk.wav"]
+    assert (sound_dir / "masuk.wav").read_bytes() == b"RIFF masuk"
+    # Setting replikasi ikut controller, setting per-node tidak
+    assert replication.local_setting(replica, "missed_bell_policy") == "all"
+    assert replication.local_setting(replica, "audio_output") == "hw:1,0"
+    assert int(replication.local_setting(replica, "replication_seq")) == data["seq"]
+
+
+def test_later_pull_is_delta(nodes):
+    primary, replica, add_sound, _, open_sound, fetched, _ = nodes
+    pull(primary, replica, open_sound)
+    fetched.clear()
+
+    primary.execute("UPDATE bell SET jam='07:15' WHERE id=1")
+    primary.execute("UPDATE bell SET jam='07:30' WHERE id=1")  # digabung jadi satu
+    primary.execute("DELETE FROM bell WHERE id=2")
+    primary.execute("INSERT INTO bell (id, jam, hari, hari_mask, suara, aktif, profile_id) "
+                    "VALUES (3, '15:00', 'Monday', 1, 'pulang.wav', 1, 1)")
+    primary.execute("UPDATE settings SET value='hw:9,9' WHERE key='audio_output'")
+    add_sound("pulang.wav", b"RIFF pulang")
+    primary.commit()
+
+    data, summary = pull(primary, replica, open_sound)
+    assert data["full"] is False
+    changed = sorted((c["table"], c["key"]) for c in data["changes"])
+    assert changed == [("bell", 1), ("bell", 2), ("bell", 3), ("sounds", "pulang.wav")]
+    assert bells(replica) == bells(primary)
+    # Hanya suara baru yang diambil
+    assert summary["sounds"] == ["pulang.wav"]
+    assert fetched == [hashlib.sha256(b"RIFF pulang").hexdigest()]
+
+    # Tidak ada perubahan: delta kosong
+    data, summary = pull(primary, replica, open_sound)
+    assert data["full"] is False and data["changes"] == []
+
+
+def test_new_epoch_after_restore_forces_full_snapshot(nodes):
+    primary, replica, _, _, open_sound, _, _ = nodes
+    pull(primary, replica, open_sound)
+    # Baris yang hanya ada di replica harus hilang setelah snapshot penuh
+    replica.execute("INSERT INTO bell (id, jam, suara, aktif, profile_id) "
+                    "VALUES (99, '09:00', 'lokal.wav', 1, 1)")
+    replica.commit()
+
+    replication.new_epoch(primary)
+    data, _ = pull(primary, replica, open_sound)
+    assert data["full"] is True
+    assert bells(replica) == bells(primary)
+    assert (replication.local_setting(replica, "replication_epoch_seen")
+            == replication.epoch(primary))
+
+
+def test_sound_with_wrong_hash_is_rejected(nodes):
+    primary, replica, _, store, open_sound, _, sound_dir = nodes
+    sha = hashlib.sha256(b"RIFF masuk").hexdigest()
+    store[sha] = b"corrupted"
+
+    with pytest.raises(ValueError):
+        pull(primary, replica, open_sound)
+    assert not (sound_dir / "masuk.wav").exists()
+    # Tidak ada baris yang diterapkan; pull berikutnya mengulang snapshot penuh
+    assert bells(replica) == []
+    assert replication.local_setting(replica, "replication_seq") is None
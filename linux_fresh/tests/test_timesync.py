@@ -0,0 +1,118 @@
+"""timesync dengan responder SNTP palsu di localhost (offset dan delay diketahui)."""
+import socket
+import sqlite3
+import struct
+import threading
+import time
+
+import pytest
+
+import timesync
+
+
+class FakeNtpServer:
+    """Server SNTP di 127.0.0.1 yang jamnya `offset` detik di depan.
+
+    `delays` adalah list (delay_masuk, delay_keluar) per request (diulang
+    dari awal jika habis); delay ditiru dengan sleep sebelum t2 dan setelah t3.
+    """
+
+    def __init__(self, offset, delays=((0.0, 0.0),), processing=0.02):
+        self.offset = offset
+        self.delays = list(delays)
+        self.processing = processing
+        self.requests = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(512)
+            except OSError:
+                return
+            d_in, d_out = self.delays[self.requests % len(self.delays)]
+            self.requests += 1
+            words = struct.unpack("!B3x11I", data[:48])
+            time.sleep(d_in)
+            t2 = timesync._to_ntp(time.time() + self.offset)
+            time.sleep(self.processing)  # dikurangkan dari delay oleh klien
+            t3 = timesync._to_ntp(time.time() + self.offset)
+            time.sleep(d_out)
+            # LI=0, VN=4, mode=4 (server), stratum 1; originate = transmit klien
+            reply = struct.pack("!BBbb11I", 0x24, 1, 0, 0, 0, 0, 0, 0, 0,
+                                words[10], words[11], *t2, *t3)
+            self.sock.sendto(reply, addr)
+
+    def close(self):
+        self.sock.close()
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(*args, **kwargs):
+        server = FakeNtpServer(*args, **kwargs)
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.close()
+
+
+def test_query_corrects_for_delay(servers):
+    server = servers(offset=5.0, delays=[(0.03, 0.03)])
+    offset, delay = timesync.query("127.0.0.1", server.port)
+    assert offset == pytest.approx(5.0, abs=0.01)
+    # Waktu proses di server (t3 - t2) tidak dihitung sebagai delay
+    assert delay == pytest.approx(0.06, abs=0.02)
+
+
+def test_best_sample_picks_lowest_delay(servers):
+    # Sampel pertama asimetris (0.1 masuk, 0 keluar): offset meleset +0.05 s
+    server = servers(offset=-2.0, delays=[(0.1, 0.0), (0.005, 0.005)])
+    offset, delay = timesync.best_sample("127.0.0.1", server.port, samples=3)
+    assert server.requests == 3
+    assert offset == pytest.approx(-2.0, abs=0.01)
+    assert delay < 0.05
+
+
+def test_measure_takes_median_and_reports_failures(servers):
+    fast = [servers(offset=o, delays=[(0.005, 0.005)]) for o in (1.0, 2.0, 10.0)]
+    dead = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    dead.bind(("127.0.0.1", 0))  # tidak pernah menjawab
+    try:
+        result = timesync.measure(
+            [("127.0.0.1", s.port) for s in fast] + [("127.0.0.1", dead.getsockname()[1])],
+            samples=2, timeout=0.3)
+    finally:
+        dead.close()
+    assert result["ok"] == 3
+    assert result["offset"] == pytest.approx(2.0, abs=0.01)
+    assert result["delay"] < 0.05
+    assert sum("error" in r for r in result["servers"]) == 1
+
+
+def test_measure_raises_when_no_server_answers():
+    dead = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    dead.bind(("127.0.0.1", 0))
+    try:
+        with pytest.raises(OSError):
+            timesync.measure([("127.0.0.1", dead.getsockname()[1])], samples=1, timeout=0.2)
+    finally:
+        dead.close()
+
+
+def test_record_computes_drift():
+    conn = sqlite3.connect(":memory:")
+    timesync.ensure_table(conn)
+    conn.execute("INSERT INTO time_sync_log (unix, offset) VALUES (?, ?)",
+                 (time.time() - 3600, 0.0))
+    drift = timesync.record(conn, {"offset": 0.036, "delay": 0.01, "ok": 2})
+    # 36 ms dalam satu jam = 10 ppm
+    assert drift == pytest.approx(10.0, rel=0.01)
+    assert timesync.history(conn, 1)[0][1:5] == (0.036, 0.01, pytest.approx(drift), 2)
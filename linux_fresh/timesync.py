@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""Sinkronisasi waktu (SNTP) untuk app.py.
+
+Beberapa server NTP ditanya bersamaan (satu thread per server), masing-masing
+beberapa kali. Offset tiap sampel dikoreksi dengan round-trip delay:
+
+    offset = ((t2 - t1) + (t3 - t4)) / 2
+    delay  = (t4 - t1) - (t3 - t2)
+
+Dari tiap server diambil sampel dengan delay terkecil, lalu median offset
+antar server menjadi `time_offset` (detik, presisi milidetik). Setiap hasil
+dicatat di tabel time_sync_log beserta drift (ppm) terhadap sinkron
+sebelumnya.
+"""
+import datetime
+import json
+import socket
+import statistics
+import struct
+import threading
+import time
+import urllib.request
+
+# ================= CONFIG =================
+NTP_PORT = 123
+NTP_EPOCH = 2208988800  # detik antara 1900-01-01 dan 1970-01-01
+SAMPLES = 4
+TIMEOUT = 2.0
+DEFAULT_INTERVAL = 3600  # detik antar sinkron otomatis
+# Perubahan offset lebih kecil dari ini tidak ditulis ke settings
+MIN_CHANGE = 0.005
+HISTORY_DAYS = 30
+
+# ================= SNTP =================
+
+
+def parse_servers(value):
+    """'a.ntp.org, b.ntp.org:1123' -> [('a.ntp.org', 123), ('b.ntp.org', 1123)]"""
+    servers = []
+    for item in (value or "").replace(";", ",").replace(" ", ",").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, port = item, NTP_PORT
+        if item.count(":") == 1:
+            host, _, p = item.partition(":")
+            port = int(p) if p.isdigit() else NTP_PORT
+        elif item.startswith("[") and "]:" in item:  # [ipv6]:port
+            host, _, p = item[1:].partition("]:")
+            port = int(p) if p.isdigit() else NTP_PORT
+        servers.append((host, port))
+    return servers
+
+
+def _to_ntp(t):
+    t += NTP_EPOCH
+    sec = int(t)
+    return sec, int((t - sec) * 2 ** 32)
+
+
+def _from_ntp(sec, frac):
+    return sec - NTP_EPOCH + frac / 2 ** 32
+
+
+def query(host, port=NTP_PORT, timeout=TIMEOUT):
+    """Satu request SNTP. Return (offset, delay) dalam detik."""
+    family = socket.getaddrinfo(host, port, 0, socket.SOCK_DGRAM)[0]
+    sock = socket.socket(family[0], socket.SOCK_DGRAM)
+    sock.settimeout(timeout)
+    try:
+        t1 = time.time()
+        sec, frac = _to_ntp(t1)
+        # LI=0, VN=4, mode=3 (client); transmit timestamp = t1
+        packet = struct.pack("!B3x11I", 0x23, *([0] * 9), sec, frac)
+        sock.sendto(packet, family[4])
+        while True:
+            data, _ = sock.recvfrom(512)
+            t4 = time.time()
+            if len(data) < 48:
+                continue
+            words = struct.unpack("!B3x11I", data[:48])
+            # Balasan untuk request ini: originate == transmit kita
+            if (words[6], words[7]) == (sec, frac):
+                break
+    finally:
+        sock.close()
+
+    mode = words[0] & 0x7
+    leap = words[0] >> 6
+    stratum = data[1]
+    if mode != 4 or leap == 3 or not 1 <= stratum <= 15:
+        raise ValueError(f"Balasan NTP tidak valid dari {host} "
+                         f"(mode={mode}, leap={leap}, stratum={stratum})")
+
+    t2 = _from_ntp(words[8], words[9])
+    t3 = _from_ntp(words[10], words[11])
+    offset = ((t2 - t1) + (t3 - t4)) / 2
+    delay = (t4 - t1) - (t3 - t2)
+    return offset, delay
+
+
+def best_sample(host, port=NTP_PORT, samples=SAMPLES, timeout=TIMEOUT):
+    """Sampel dengan delay terkecil dari `samples` request ke satu server."""
+    best = None
+    error = None
+    for _ in range(samples):
+        try:
+            offset, delay = query(host, port, timeout)
+        except (OSError, ValueError) as e:
+            error = e
+            continue
+        if best is None or delay < best[1]:
+            best = (offset, delay)
+    if best is None:
+        raise error or OSError(f"Tidak ada balasan dari {host}")
+    return best
+
+
+def measure(servers, samples=SAMPLES, timeout=TIMEOUT):
+    """Tanya semua server bersamaan.
+
+    Return dict: offset (median), delay (server terpilih), servers (list
+    per-server offset/delay/error), ok (jumlah server yang menjawab).
+    Raise OSError jika tidak ada server yang menjawab.
+    """
+    results = [None] * len(servers)
+
+    def worker(i, host, port):
+        try:
+            offset, delay = best_sample(host, port, samples, timeout)
+            results[i] = {"server": f"{host}:{port}", "offset": offset, "delay": delay}
+        except Exception as e:
+            results[i] = {"server": f"{host}:{port}", "error": str(e)}
+
+    threads = [threading.Thread(target=worker, args=(i, host, port), daemon=True)
+               for i, (host, port) in enumerate(servers)]
+    for t in threads:
+        t.start()
+    deadline = time.time() + samples * timeout + 1
+    for t in threads:
+        t.join(max(0, deadline - time.time()))
+
+    good = [r for r in results if r and "offset" in r]
+    if not good:
+        errors = "; ".join(r["error"] for r in results if r and "error" in r)
+        raise OSError(f"Semua server NTP gagal: {errors or 'timeout'}")
+
+    offset = statistics.median(r["offset"] for r in good)
+    return {
+        "offset": offset,
+        "delay": min(r["delay"] for r in good),
+        "servers": [r for r in results if r],
+        "ok": len(good),
+    }
+
+
+def http_offset(timezone_region, timeout=5):
+    """Cadangan jika NTP diblok: worldtimeapi.org (presisi detik).
+    Delay dikoreksi dengan titik tengah request."""
+    url = f"http://worldtimeapi.org/api/timezone/{timezone_region}"
+    req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+    t1 = time.time()
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        data = json.loads(response.read().decode())
+    t4 = time.time()
+    return {
+        "offset": data['unixtime'] + 0.5 - (t1 + t4) / 2,
+        "delay": t4 - t1,
+        "servers": [{"server": "worldtimeapi.org", "offset": None, "delay": t4 - t1}],
+        "ok": 1,
+    }
+
+# ================= HISTORY =================
+
+
+def ensure_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS time_sync_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            checked_at TEXT,
+            unix REAL,
+            offset REAL,
+            delay REAL,
+            drift_ppm REAL,
+            servers INTEGER,
+            source TEXT
+        )
+    """)
+    conn.commit()
+
+
+def record(conn, result, source="ntp"):
+    """Simpan hasil measure() dan hitung drift terhadap catatan sebelumnya."""
+    ensure_table(conn)
+    now = time.time()
+    prev = conn.execute(
+        "SELECT unix, offset FROM time_sync_log ORDER BY id DESC LIMIT 1").fetchone()
+    drift = None
+    if prev and now - prev[0] > 60:
+        # Offset yang berubah terhadap waktu = laju jam lokal (ppm)
+        drift = (result["offset"] - prev[1]) / (now - prev[0]) * 1e6
+    conn.execute(
+        "INSERT INTO time_sync_log (checked_at, unix, offset, delay, drift_ppm, servers, source) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), now,
+         result["offset"], result["delay"], drift, result["ok"], source))
+    conn.execute("DELETE FROM time_sync_log WHERE unix < ?",
+                 (now - HISTORY_DAYS * 86400,))
+    conn.commit()
+    return drift
+
+
+def history(conn, limit=10):
+    return conn.execute(
+        "SELECT checked_at, offset, delay, drift_ppm, servers, source "
+        "FROM time_sync_log ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+
+# ================= SERVICE =================
+
+
+class TimeSyncService:
+    """Sinkron berkala di background thread.
+
+    `get_config()` -> (servers, timezone_region, interval) dibaca ulang
+    setiap siklus; `apply(result, source)` menyimpan hasil (mis. ke DB).
+    """
+
+    def __init__(self, get_config, apply):
+        self.get_config = get_config
+        self.apply = apply
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.last_error = None
+
+    def sync_once(self):
+        """Satu sinkron (NTP, lalu HTTP jika semua NTP gagal). Return hasil."""
+        servers, timezone_region, _ = self.get_config()
+        with self._lock:
+            try:
+                result, source = measure(parse_servers(servers)), "ntp"
+            except OSError as e:
+                if not timezone_region:
+                    self.last_error = str(e)
+                    raise
+                result, source = http_offset(timezone_region), "http"
+            self.apply(result, source)
+            self.last_error = None
+            return result
+
+    def _run(self):
+        while True:
+            interval = self.get_config()[2]
+            try:
+                if interval > 0:
+                    self.sync_once()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Time sync error: {e}")
+            # interval 0 = sinkron otomatis mati; cek ulang konfigurasi tiap menit
+            self._wake.wait(interval if interval > 0 else 60)
+            self._wake.clear()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def trigger(self):
+        self._wake.set()
+
+    def sync_async(self):
+        """Satu sinkron di thread terpisah (untuk route). False jika sedang berjalan."""
+        if self._lock.locked():
+            return False
+
+        def worker():
+            try:
+                self.sync_once()
+            except Exception as e:
+                print(f"Time sync error: {e}")
+
+        threading.Thread(target=worker, daemon=True).start()
+        return True
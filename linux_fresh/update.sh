@@ -20,7 +20,7 @@ cp bell.db bell_backup_$(date +%Y%m%d_%H%M%S).db
 echo "Step 2: Memeriksa dan menginstall dependensi..."
 sudo apt update
 sudo apt install -y python3 python3-pip sqlite3 mpg123 alsa-utils ffmpeg
-pip3 install flask --break-system-packages 2>/dev/null || pip3 install flask
+pip3 install flask gunicorn --break-system-packages 2>/dev/null || pip3 install flask gunicorn
 
 # 4. Download Update Baru
 echo "Step 3: Mengunduh paket pembaruan v1.4.1..."
@@ -55,10 +55,22 @@ if id "www" >/dev/null 2>&1; then
 fi
 
 # 9. Restart (Jika pakai systemd)
+# Unit lama menjalankan server development Flask (app.py); pindahkan ke gunicorn
+SERVICE_FILE="/etc/systemd/system/bell.service"
+if [ -f "$SERVICE_FILE" ] && grep -q "ExecStart=.*app.py" "$SERVICE_FILE"; then
+    echo "Memindahkan bell.service ke gunicorn..."
+    sudo sed -i "s|^ExecStart=.*app.py.*|ExecStart=/usr/bin/python3 -m gunicorn -c $PWD/gunicorn_conf.py app:app\nExecReload=/bin/kill -s HUP \$MAINPID\nKillMode=mixed\nTimeoutStopSec=35|" "$SERVICE_FILE"
+    sudo systemctl daemon-reload
+fi
+
 echo "Step 8: Mencoba merestart layanan (bell.service)..."
 if systemctl is-active --quiet bell; then
     sudo systemctl restart bell
     echo "Service 'bell.service' berhasil direstart."
+    if systemctl is-active --quiet bell-player; then
+        sudo systemctl restart bell-player
+        echo "Service 'bell-player.service' berhasil direstart."
+    fi
 else
     echo "Info: Service 'bell.service' tidak aktif atau tidak ditemukan."
     echo "Mencoba restart manual jika app.py sedang berjalan..."
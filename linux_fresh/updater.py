@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""Updater berbasis manifest untuk app.py.
+
+Manifest rilis (JSON), dibuat dengan `python updater.py manifest <dir> <versi> <base_url>`:
+
+    {"version": "1.8.0",
+     "base_url": "https://.../linux_fresh/",
+     "files": {"app.py": {"sha256": "...", "size": 1234}, ...}}
+
+Hanya file yang hash-nya berbeda dari file lokal yang diunduh (streaming)
+ke direktori staging lalu diverifikasi. Setelah semua lolos, file ditukar
+satu per satu dengan os.replace; file lama disalin ke direktori rollback
+dan dikembalikan jika penukaran gagal, atau saat start berikutnya jika
+proses mati di tengah penukaran (lihat recover()).
+
+Bundle ZIP lama (download_url / upload manual) lewat jalur yang sama:
+diekstrak ke staging, lalu hanya file yang berubah yang ditukar.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import urllib.parse
+import urllib.request
+import zipfile
+
+# ================= CONFIG =================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGING_DIR = os.path.join(BASE_DIR, ".update_staging")
+ROLLBACK_DIR = os.path.join(BASE_DIR, ".update_rollback")
+SWAP_JOURNAL = os.path.join(ROLLBACK_DIR, "journal.json")
+
+# Data milik perangkat, tidak pernah ditimpa update
+PROTECTED = ("bell.db", "bell.db-wal", "bell.db-shm")
+PROTECTED_DIRS = ("backups", ".update_staging", ".update_rollback",
+                  "__pycache__", ".git")
+
+CHUNK = 64 * 1024
+TIMEOUT = 30
+RUNNING_STATES = ("fetching", "downloading", "verifying", "swapping")
+
+# ================= HELPERS =================
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def safe_relpath(rel):
+    """Normalisasi path dari manifest/ZIP. Return None jika path keluar dari
+    BASE_DIR atau menunjuk data yang dilindungi."""
+    rel = os.path.normpath(rel.replace("\\", "/"))
+    if os.path.isabs(rel) or rel.startswith(".."):
+        return None
+    parts = rel.split(os.sep)
+    if rel in PROTECTED or parts[0] in PROTECTED_DIRS:
+        return None
+    return rel
+
+
+def local_sha256(rel):
+    path = os.path.join(BASE_DIR, rel)
+    return file_sha256(path) if os.path.isfile(path) else None
+
+
+def build_manifest(root, version, base_url):
+    """Buat manifest untuk seluruh file di `root` (dipakai saat rilis)."""
+    files = {}
+    for dirpath, dirs, names in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in PROTECTED_DIRS]
+        for name in sorted(names):
+            path = os.path.join(dirpath, name)
+            rel = safe_relpath(os.path.relpath(path, root))
+            if rel is None:
+                continue
+            files[rel.replace(os.sep, "/")] = {
+                "sha256": file_sha256(path), "size": os.path.getsize(path)}
+    return {"version": version, "base_url": base_url, "files": files}
+
+# ================= JOB STATUS =================
+
+_status_lock = threading.Lock()
+_status = {"state": "idle", "message": "", "version": None,
+           "files_total": 0, "files_done": 0,
+           "bytes_total": 0, "bytes_done": 0}
+
+
+def status():
+    with _status_lock:
+        return dict(_status)
+
+
+def _set_status(**fields):
+    with _status_lock:
+        _status.update(fields)
+
+
+def is_running():
+    return status()["state"] in RUNNING_STATES
+
+# ================= DOWNLOAD =================
+
+
+def _download(url, dest, expected_sha=None, expected_size=None):
+    """Unduh `url` ke `dest` secara streaming sambil menghitung sha256."""
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    h = hashlib.sha256()
+    size = 0
+    with urllib.request.urlopen(url, timeout=TIMEOUT) as resp, open(dest, "wb") as out:
+        if expected_size is None:
+            length = resp.headers.get("Content-Length")
+            if length and length.isdigit():
+                with _status_lock:
+                    _status["bytes_total"] += int(length)
+        for chunk in iter(lambda: resp.read(CHUNK), b""):
+            h.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+            with _status_lock:
+                _status["bytes_done"] += len(chunk)
+
+    if expected_size is not None and size != expected_size:
+        raise ValueError(f"Ukuran {url} tidak sesuai ({size} != {expected_size})")
+    if expected_sha is not None and h.hexdigest() != expected_sha:
+        raise ValueError(f"Hash {url} tidak sesuai manifest")
+    return h.hexdigest()
+
+
+def fetch_manifest(url):
+    with urllib.request.urlopen(url, timeout=TIMEOUT) as resp:
+        manifest = json.loads(resp.read().decode())
+    if not isinstance(manifest.get("files"), dict):
+        raise ValueError("Manifest tidak berisi daftar file")
+    return manifest
+
+# ================= SWAP / ROLLBACK =================
+
+
+def swap_in(staged):
+    """Tukar file staging ke BASE_DIR. `staged` = {relpath: path staging}.
+
+    File lama disalin ke ROLLBACK_DIR dan journal ditulis sebelum file
+    pertama ditukar; jika ada yang gagal semua file dikembalikan.
+    """
+    if os.path.exists(ROLLBACK_DIR):
+        shutil.rmtree(ROLLBACK_DIR)
+    os.makedirs(ROLLBACK_DIR)
+    journal = {
+        "files": sorted(staged),
+        "new": sorted(rel for rel in staged
+                      if not os.path.exists(os.path.join(BASE_DIR, rel))),
+    }
+    with open(SWAP_JOURNAL, "w") as f:
+        json.dump(journal, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    try:
+        for rel in journal["files"]:
+            dest = os.path.join(BASE_DIR, rel)
+            if rel not in journal["new"]:
+                backup = os.path.join(ROLLBACK_DIR, "files", rel)
+                os.makedirs(os.path.dirname(backup), exist_ok=True)
+                shutil.copy2(dest, backup)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            # Staging ada di filesystem yang sama: os.replace atomik per file
+            os.replace(staged[rel], dest)
+    except BaseException:
+        rollback()
+        raise
+
+    # Journal dihapus dulu: titik commit penukaran
+    os.remove(SWAP_JOURNAL)
+    shutil.rmtree(ROLLBACK_DIR)
+
+
+def rollback():
+    """Kembalikan file dari ROLLBACK_DIR sesuai journal. Return jumlah file."""
+    try:
+        with open(SWAP_JOURNAL) as f:
+            journal = json.load(f)
+    except (OSError, ValueError):
+        return 0
+
+    restored = 0
+    for rel in journal["files"]:
+        dest = os.path.join(BASE_DIR, rel)
+        backup = os.path.join(ROLLBACK_DIR, "files", rel)
+        if os.path.exists(backup):
+            os.replace(backup, dest)
+            restored += 1
+        elif rel in journal["new"] and os.path.exists(dest):
+            os.remove(dest)
+            restored += 1
+    shutil.rmtree(ROLLBACK_DIR)
+    return restored
+
+
+def recover():
+    """Dipanggil saat start: batalkan penukaran yang terputus di tengah."""
+    if os.path.exists(SWAP_JOURNAL):
+        return rollback()
+    if os.path.exists(ROLLBACK_DIR):
+        shutil.rmtree(ROLLBACK_DIR)
+    return 0
+
+# ================= UPDATE =================
+
+
+def _fresh_staging():
+    if os.path.exists(STAGING_DIR):
+        shutil.rmtree(STAGING_DIR)
+    os.makedirs(STAGING_DIR)
+
+
+def update_from_manifest(manifest_url):
+    """Delta update: hanya file yang berbeda yang diunduh. Return versi baru."""
+    _set_status(state="fetching", message="Mengambil manifest...")
+    manifest = fetch_manifest(manifest_url)
+    base_url = manifest.get("base_url") or manifest_url.rsplit("/", 1)[0] + "/"
+
+    todo = {}
+    for rel, info in manifest["files"].items():
+        safe = safe_relpath(rel)
+        if safe is None:
+            continue
+        if local_sha256(safe) != info["sha256"]:
+            todo[safe] = (rel, info)
+
+    _fresh_staging()
+    _set_status(state="downloading", version=manifest.get("version"),
+                files_total=len(todo), files_done=0, bytes_done=0,
+                bytes_total=sum(info.get("size") or 0 for _, info in todo.values()),
+                message=f"Mengunduh {len(todo)} file yang berubah...")
+    staged = {}
+    for safe, (rel, info) in sorted(todo.items()):
+        url = info.get("url") or urllib.parse.urljoin(
+            base_url, urllib.parse.quote(rel))
+        dest = os.path.join(STAGING_DIR, safe)
+        _download(url, dest, expected_sha=info["sha256"],
+                  expected_size=info.get("size"))
+        staged[safe] = dest
+        with _status_lock:
+            _status["files_done"] += 1
+
+    if staged:
+        _set_status(state="swapping", message="Memasang file baru...")
+        swap_in(staged)
+    return manifest.get("version")
+
+
+def update_from_zip(zip_path, version=None):
+    """Pasang bundle ZIP lewat staging; hanya file yang berubah yang ditukar."""
+    _set_status(state="verifying", message="Memeriksa isi ZIP...")
+    extract_dir = os.path.join(STAGING_DIR, "files")
+    staged = {}
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        members = [m for m in zip_ref.infolist() if not m.is_dir()]
+        _set_status(files_total=len(members), files_done=0)
+        for member in members:
+            safe = safe_relpath(member.filename)
+            if safe is None:
+                continue
+            dest = os.path.join(extract_dir, safe)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            h = hashlib.sha256()
+            # zipfile memeriksa CRC setiap entry saat dibaca sampai habis
+            with zip_ref.open(member) as src, open(dest, "wb") as out:
+                for chunk in iter(lambda: src.read(CHUNK), b""):
+                    h.update(chunk)
+                    out.write(chunk)
+            if local_sha256(safe) != h.hexdigest():
+                staged[safe] = dest
+            with _status_lock:
+                _status["files_done"] += 1
+
+    if staged:
+        _set_status(state="swapping", message=f"Memasang {len(staged)} file baru...")
+        swap_in(staged)
+    return version
+
+
+def _run(target, on_done):
+    try:
+        version = target()
+        _set_status(state="done", message="Update selesai.")
+        if on_done:
+            on_done(version)
+    except Exception as e:
+        _set_status(state="error", message=f"Update Gagal: {e}")
+    finally:
+        if os.path.exists(STAGING_DIR):
+            shutil.rmtree(STAGING_DIR, ignore_errors=True)
+
+
+def start(manifest_url=None, zip_url=None, version=None, on_done=None):
+    """Jalankan update di background thread. Return False jika sudah berjalan.
+
+    `on_done(versi)` dipanggil dari thread tersebut setelah file terpasang.
+    """
+    with _status_lock:
+        if _status["state"] in RUNNING_STATES:
+            return False
+        _status.update(state="fetching", message="Memulai update...", version=version,
+                       files_total=0, files_done=0, bytes_total=0, bytes_done=0)
+
+    if manifest_url:
+        def target():
+            return update_from_manifest(manifest_url)
+    else:
+        def target():
+            _fresh_staging()
+            bundle = os.path.join(STAGING_DIR, "bundle.zip")
+            _set_status(state="downloading", message="Mengunduh bundle update...")
+            _download(zip_url, bundle)
+            return update_from_zip(bundle, version)
+
+    threading.Thread(target=_run, args=(target, on_done), daemon=True).start()
+    return True
+
+
+def apply_zip(zip_path, version=None):
+    """Update sinkron dari ZIP lokal (upload manual)."""
+    with _status_lock:
+        if _status["state"] in RUNNING_STATES:
+            raise RuntimeError("Update lain sedang berjalan")
+        _status.update(state="verifying", files_total=0, files_done=0,
+                       bytes_total=0, bytes_done=0)
+    try:
+        _fresh_staging()
+        result = update_from_zip(zip_path, version)
+        _set_status(state="done", message="Update selesai.")
+        return result
+    except Exception as e:
+        _set_status(state="error", message=f"Update Gagal: {e}")
+        raise
+    finally:
+        shutil.rmtree(STAGING_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "manifest":
+        print(json.dumps(build_manifest(sys.argv[2], sys.argv[3], sys.argv[4]), indent=1))
+    else:
+        print("Usage: python updater.py manifest <dir> <versi> <base_url>")
+        sys.exit(1)
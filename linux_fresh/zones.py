@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Zona audio: satu zona = satu device ALSA (mis. soundcard USB per gedung).
+
+Bell dan profil menyimpan id zona tujuan di kolom `zones` ("1,3"). Device
+untuk satu bell ditentukan sekali saat playlist dikompilasi:
+
+  bell.zones       jika diisi
+  profiles.zones   jika zona bell kosong
+  audio_output     jika keduanya kosong (perilaku lama, satu device)
+
+Bell dengan beberapa zona diputar sekali (satu buffer PCM) ke semua device
+secara paralel, lihat pcm_player.SinkPool.
+
+Tabel zones milik node (soundcard berbeda per mesin) dan tidak ikut
+direplikasi; id zona yang tidak dikenal di node ini diabaikan.
+"""
+
+# ================= SCHEMA =================
+
+
+def ensure_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS zones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            device TEXT NOT NULL
+        )
+    """)
+
+# ================= FORMAT =================
+
+
+def parse(value):
+    """'1,3' / [1, '3'] / None -> [1, 3]. ValueError jika bukan angka."""
+    if value is None:
+        return []
+    items = value.split(",") if isinstance(value, str) else list(value)
+    ids = []
+    for item in items:
+        item = str(item).strip()
+        if not item:
+            continue
+        try:
+            zone_id = int(item)
+        except ValueError:
+            raise ValueError(f"ID zona tidak valid: {item}")
+        if zone_id not in ids:
+            ids.append(zone_id)
+    return ids
+
+
+def to_text(ids):
+    """[1, 3] -> '1,3'; list kosong -> None (ikut profil / audio_output)."""
+    return ",".join(str(i) for i in ids) or None
+
+# ================= RESOLVE =================
+
+
+def load(conn):
+    """{id zona: device} untuk semua zona di node ini."""
+    return dict(conn.execute("SELECT id, device FROM zones").fetchall())
+
+
+def list_zones(conn):
+    return conn.execute("SELECT id, name, device FROM zones ORDER BY name, id").fetchall()
+
+
+def devices(value, zone_map, default):
+    """Tuple device (unik, urutan tetap) untuk kolom zones `value`.
+    Jika tidak ada zona yang dikenal, kembali ke (default,)."""
+    found = []
+    try:
+        ids = parse(value)
+    except ValueError:
+        ids = []
+    for zone_id in ids:
+        device = zone_map.get(zone_id)
+        if device and device not in found:
+            found.append(device)
+    return tuple(found) or (default,)